@@ -145,6 +145,16 @@ REST_FRAMEWORK = {
     ],
     # ← Agregar esto para drf-spectacular
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON con orjson (formularios/renderers.py); cae al de DRF si no está instalado
+    'DEFAULT_RENDERER_CLASSES': [
+        'formularios.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'formularios.renderers.OrjsonParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -265,5 +275,21 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Caché del esquema renderizado de formularios (formularios/schema_cache.py):
+# LRU en proceso + caché compartida de Django (alias de CACHES)
+FORM_SCHEMA_CACHE_SIZE = int(os.getenv("FORM_SCHEMA_CACHE_SIZE", "256"))
+FORM_SCHEMA_CACHE_ALIAS = os.getenv("FORM_SCHEMA_CACHE_ALIAS", "default")
+# False: los campos dataset del árbol solo llevan items_ref/items_total y los
+# items se paginan en /api/campos/{id}/items/. True: formato anterior (embebidos)
+FORM_DATASET_ITEMS_INLINE = os.getenv("FORM_DATASET_ITEMS_INLINE", "0") == "1"
+# Máximo de items por catálogo dataset en /api/formularios/sync/
+SYNC_CATALOGO_MAX_ITEMS = int(os.getenv("SYNC_CATALOGO_MAX_ITEMS", "5000"))
+# Máximo de operaciones por lote en /api/formularios/{id}/cambios/
+FORM_CHANGESET_MAX_OPS = int(os.getenv("FORM_CHANGESET_MAX_OPS", "500"))
+# Retención (días) de versiones sin referencias para `manage.py purgar_versiones`
+FORM_VERSION_RETENTION_DAYS = int(os.getenv("FORM_VERSION_RETENTION_DAYS", "90"))
+# Retención (días) de versiones CON snapshot (historial y base de /diff); por defecto la misma
+FORM_SNAPSHOT_RETENTION_DAYS = int(os.getenv("FORM_SNAPSHOT_RETENTION_DAYS", str(FORM_VERSION_RETENTION_DAYS)))
+
 MIDDLEWARE.insert(0, "backend.middlewares.DebugJSONMiddleware")  # ajusta ruta real
 DEBUG = True
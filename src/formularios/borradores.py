@@ -0,0 +1,82 @@
+# borradores.py
+"""
+Borrador por formulario: las ediciones del diseñador se acumulan como
+operaciones de changeset (changeset.py) en FormularioBorrador, sin crear
+FormularioIndexVersion ni tocar páginas/campos. Los dispositivos siguen
+viendo la versión publicada hasta que alguien publica el borrador.
+
+  - agregar:   valida el borrador COMPLETO (solo lecturas) y lo guarda
+  - publicar:  aplica todas las operaciones como UNA versión nueva
+               (versioning.publicar_version: historial, punteros, snapshot e
+               invalidación de caché) y elimina el borrador
+  - descartar: elimina el borrador
+
+Como se re-valida contra la versión vigente, un borrador sobrevive a
+publicaciones en vivo mientras sus operaciones sigan siendo aplicables.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import transaction
+
+from . import changeset, versioning
+from .models import Formulario, FormularioBorrador
+
+
+class SinBorrador(LookupError):
+    """El formulario no tiene borrador abierto."""
+
+
+def obtener(formulario: Formulario) -> Optional[FormularioBorrador]:
+    return FormularioBorrador.objects.filter(pk=formulario.pk).first()
+
+
+@transaction.atomic
+def agregar(formulario: Formulario, operaciones: List[dict]) -> Tuple[FormularioBorrador, Dict[str, Any]]:
+    """
+    Suma `operaciones` al borrador (lo abre si no existe). Lanza
+    CambioInvalido con el índice dentro del borrador completo; si no, nada
+    cambia.
+    """
+    versioning.bloquear([formulario.pk])
+    borrador = FormularioBorrador.objects.filter(pk=formulario.pk).first()
+    if borrador is None:
+        borrador = FormularioBorrador(id_formulario=formulario,
+                                      version_base_id=formulario.current_index_version_id)
+    todas = list(borrador.operaciones) + list(operaciones)
+    if len(todas) > changeset.max_operaciones():
+        raise changeset.CambioInvalido(
+            len(borrador.operaciones),
+            f"El borrador no puede superar {changeset.max_operaciones()} operaciones; publíquelo primero.",
+        )
+    resumen = changeset.validar(formulario, todas)
+    borrador.operaciones = todas
+    borrador.save()
+    return borrador, resumen
+
+
+def leer_fuentes(formulario: Formulario) -> Dict[str, Any]:
+    """Fuentes de los campos dataset del borrador (changeset.leer_fuentes), para leerlas antes del lock."""
+    borrador = obtener(formulario)
+    return changeset.leer_fuentes(borrador.operaciones) if borrador else {}
+
+
+def publicar(formulario: Formulario, tablas: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Aplica el borrador como una sola versión nueva y lo elimina. Las fuentes
+    (`tablas`, ver leer_fuentes) se descargan antes de bloquear el formulario.
+    """
+    if tablas is None:
+        tablas = leer_fuentes(formulario)
+    with transaction.atomic():
+        versioning.bloquear([formulario.pk])
+        borrador = FormularioBorrador.objects.filter(pk=formulario.pk).first()
+        if borrador is None:
+            raise SinBorrador(formulario.pk)
+        out = changeset.aplicar(formulario, borrador.operaciones, tablas=tablas)
+        borrador.delete()
+    return out
+
+
+def descartar(formulario: Formulario) -> bool:
+    borrados, _ = FormularioBorrador.objects.filter(pk=formulario.pk).delete()
+    return bool(borrados)
@@ -0,0 +1,528 @@
+# changeset.py
+"""
+Lote de cambios de una sesión de edición del diseñador, aplicado en UNA
+transacción y publicado como UNA sola versión nueva del formulario.
+
+Operaciones (`op`):
+  - agregar_pagina   {nombre, descripcion?, ref?}
+  - agregar_campo    {pagina, clase, nombre_campo, etiqueta, ayuda?, requerido?,
+                      config?, sequence?, grupo?, ref?}
+  - actualizar_campo {campo, etiqueta?, ayuda?, requerido?, config?, replace_config?}
+  - reordenar        {pagina, campos: [id_campo, ...]}  |  {paginas: [id_pagina, ...]},
+                     completo? (exige la lista entera)
+  - eliminar_campo   {campo}
+
+`pagina`, `campo` y `grupo` aceptan el id real o el `ref` de algo agregado
+antes en el mismo lote (en `grupo`, el ref de un campo de clase group).
+
+Primero se validan TODAS las operaciones en memoria; después se escribe por
+tipo (bulk_create / bulk_update / un solo UPDATE para mover los PaginaCampo y
+otro para las secuencias), así que la cantidad de sentencias depende de los
+tipos de operación y no de cuántas vienen. Se crea una PaginaVersion por página tocada y una sola
+FormularioIndexVersion para todo el lote.
+"""
+import json
+import uuid
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from . import services, versioning
+from .models import (
+    Campo,
+    CampoGrupo,
+    ClaseCampo,
+    Formulario,
+    FuenteDatos,
+    Grupo,
+    Pagina,
+    Pagina_Index_Version,
+    PaginaCampo,
+)
+from .serializers import CampoUpdateSerializer, CrearCampoEnPaginaSerializer
+
+OPERACIONES = ("agregar_pagina", "agregar_campo", "actualizar_campo", "reordenar", "eliminar_campo")
+
+
+class CambioInvalido(ValueError):
+    def __init__(self, indice: int, mensaje):
+        super().__init__(mensaje)
+        self.indice = indice
+        self.mensaje = mensaje
+
+
+def max_operaciones() -> int:
+    return getattr(settings, "FORM_CHANGESET_MAX_OPS", 500)
+
+
+def _uuid_o_none(valor) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(valor)))
+    except ValueError:
+        return None
+
+
+def _config_dict(raw) -> dict:
+    if isinstance(raw, dict):
+        return raw
+    try:
+        cfg = json.loads(raw) if raw else {}
+    except (TypeError, ValueError):
+        cfg = {}
+    return cfg if isinstance(cfg, dict) else {}
+
+
+def _fuente_de(config) -> Optional[str]:
+    ds = _config_dict(config).get("dataset")
+    return _uuid_o_none(ds.get("fuente_id")) if isinstance(ds, dict) else None
+
+
+def leer_fuentes(operaciones: List[dict]) -> Dict[str, Any]:
+    """
+    Descarga y parsea (services.leer_fuentes) las fuentes de los agregar_campo
+    dataset del lote. Se llama ANTES de bloquear el formulario y se pasa a
+    aplicar(..., tablas=...): bajo el lock ya no se descarga nada.
+    """
+    ids = {
+        _fuente_de(op.get("config")) for op in operaciones
+        if isinstance(op, dict) and op.get("op") == "agregar_campo"
+        and str(op.get("clase") or "").strip().lower() == "dataset"
+    }
+    ids.discard(None)
+    return services.leer_fuentes(ids) if ids else {}
+
+
+class _Lote:
+    """Estado en memoria del lote mientras se validan las operaciones."""
+
+    def __init__(self, formulario: Formulario):
+        self.formulario = formulario
+        self.anterior = versioning.version_vigente(formulario)
+        self.refs: Dict[str, str] = {}
+
+        # Páginas del formulario en la versión vigente y su PaginaVersion actual
+        self.paginas: Dict[str, Pagina] = {}
+        if self.anterior is not None:
+            self.paginas = {
+                str(p.pk): p for p in Pagina.objects.filter(puntero_version__id_index_version=self.anterior)
+            }
+        self.pv_actual: Dict[str, Optional[str]] = {}
+        for pid, p in self.paginas.items():
+            if p.current_pagina_version_id:
+                self.pv_actual[pid] = p.current_pagina_version_id
+            else:
+                pv = versioning.pagina_version_vigente(p)
+                self.pv_actual[pid] = pv.pk if pv else None
+
+        # Campos del formulario → página y sequence (una consulta)
+        self.pagina_de_campo: Dict[str, str] = {}
+        self.secuencias: Dict[str, int] = {}          # id_campo → sequence vigente
+        self.ultima_secuencia: Dict[str, int] = {pid: 0 for pid in self.paginas}
+        for cid, pid, seq in (PaginaCampo.objects
+                              .filter(id_pagina_version_id__in=[v for v in self.pv_actual.values() if v])
+                              .values_list("id_campo_id", "id_pagina_version__id_pagina_id", "sequence")):
+            cid, pid = str(cid), str(pid)
+            self.pagina_de_campo[cid] = pid
+            self.secuencias[cid] = seq or 0
+            self.ultima_secuencia[pid] = max(self.ultima_secuencia.get(pid, 0), seq or 0)
+
+        self.existentes: Dict[str, Campo] = {}
+        self.paginas_nuevas: List[Pagina] = []
+        self.campos_nuevos: Dict[str, Dict[str, Any]] = {}
+        self.actualizados: Dict[str, Campo] = {}
+        self.campos_actualizados: set = set()
+        self.eliminados: set = set()
+        self.reordenados: set = set()                  # id_campo existentes con sequence nueva
+        self.paginas_reordenadas: set = set()
+        self.tocadas: set = set()                      # páginas con cambios en sus campos
+        self.grupos_nuevos: Dict[str, str] = {}        # id_campo (clase group) → id_grupo
+        self.clases = set(ClaseCampo.objects.values_list("clase", flat=True))
+        self.siguiente_secuencia_pagina = max((p.secuencia for p in self.paginas.values()), default=0) + 1
+
+    def precargar(self, operaciones: List[dict]) -> None:
+        """Campos existentes que el lote modifica, en una sola consulta."""
+        ids = []
+        for op in operaciones:
+            if isinstance(op, dict) and op.get("op") == "actualizar_campo":
+                cid = _uuid_o_none(op.get("campo"))
+                if cid in self.pagina_de_campo:
+                    ids.append(cid)
+        if ids:
+            self.existentes = {str(c.pk): c for c in Campo.objects.filter(pk__in=ids)}
+
+    def resolver(self, valor) -> str:
+        valor = str(valor or "")
+        return self.refs.get(valor, valor)
+
+    def pagina(self, i: int, valor) -> str:
+        pid = self.resolver(valor)
+        pid = _uuid_o_none(pid) or pid
+        if pid not in self.paginas:
+            raise CambioInvalido(i, f"La página '{valor}' no pertenece al formulario.")
+        return pid
+
+    def campo(self, i: int, valor) -> str:
+        cid = self.resolver(valor)
+        if cid in self.campos_nuevos:
+            return cid
+        cid = _uuid_o_none(cid)
+        if cid not in self.pagina_de_campo or cid in self.eliminados:
+            raise CambioInvalido(i, f"El campo '{valor}' no pertenece al formulario.")
+        return cid
+
+    def registrar_ref(self, i: int, op: dict, real_id: str) -> None:
+        ref = op.get("ref")
+        if ref is None:
+            return
+        ref = str(ref)
+        if ref in self.refs:
+            raise CambioInvalido(i, f"El ref '{ref}' está repetido en el lote.")
+        self.refs[ref] = real_id
+
+
+def _agregar_pagina(lote: _Lote, i: int, op: dict) -> None:
+    nombre = (op.get("nombre") or "Nueva página").strip()[:120]
+    pagina = Pagina(
+        id_pagina=uuid.uuid4(),
+        secuencia=lote.siguiente_secuencia_pagina,
+        nombre=nombre,
+        descripcion=op.get("descripcion") or "",
+    )
+    lote.siguiente_secuencia_pagina += 1
+    pid = str(pagina.pk)
+    lote.paginas[pid] = pagina
+    lote.pv_actual[pid] = None
+    lote.ultima_secuencia[pid] = 0
+    lote.paginas_nuevas.append(pagina)
+    lote.tocadas.add(pid)
+    lote.registrar_ref(i, op, pid)
+
+
+def _agregar_campo(lote: _Lote, i: int, op: dict) -> None:
+    pid = lote.pagina(i, op.get("pagina"))
+    ser = CrearCampoEnPaginaSerializer(data=op)
+    if not ser.is_valid():
+        raise CambioInvalido(i, ser.errors)
+    data = ser.validated_data
+
+    clase = data["clase"].strip().lower()
+    if clase not in lote.clases:
+        raise CambioInvalido(i, f"La clase '{clase}' no existe en formularios_clase_campo.")
+
+    cfg = _config_dict(data.get("config"))
+    campo = Campo(
+        id_campo=uuid.uuid4(),
+        tipo=services.TIPO_POR_CLASE.get(clase, clase),
+        clase=clase,
+        nombre_campo=data["nombre_campo"],
+        etiqueta=data.get("etiqueta") or "",
+        ayuda=(data.get("ayuda") or "").strip(),
+        requerido=data.get("requerido"),
+    )
+    cid = str(campo.pk)
+    sequence = data.get("sequence")
+    if sequence is None:
+        sequence = lote.ultima_secuencia[pid] + 1
+    lote.ultima_secuencia[pid] = max(lote.ultima_secuencia[pid], sequence)
+    lote.campos_nuevos[cid] = {
+        "campo": campo,
+        "config": cfg,
+        "pagina": pid,
+        "sequence": sequence,
+        "grupo": op.get("grupo") or op.get("id_grupo"),
+        "indice": i,
+    }
+    lote.tocadas.add(pid)
+    lote.registrar_ref(i, op, cid)
+
+
+def _actualizar_campo(lote: _Lote, i: int, op: dict) -> None:
+    cid = lote.campo(i, op.get("campo"))
+    datos = {k: v for k, v in op.items() if k in CampoUpdateSerializer.Meta.fields}
+    ser = CampoUpdateSerializer(data=datos, partial=True)
+    if not ser.is_valid():
+        raise CambioInvalido(i, ser.errors)
+    data = dict(ser.validated_data)
+
+    nuevo = lote.campos_nuevos.get(cid)
+    if nuevo is not None:
+        campo, cfg_actual = nuevo["campo"], nuevo["config"]
+    else:
+        campo = lote.actualizados[cid] = lote.existentes[cid]
+        cfg_actual = _config_dict(campo.config)
+
+    cfg_patch = data.pop("config", None)
+    for k, v in data.items():
+        setattr(campo, k, v)
+    if cfg_patch is not None:
+        replace_all = str(op.get("replace_config") or "").lower() in ("1", "true", "yes")
+        if replace_all:
+            cfg_actual = cfg_patch or {}
+        elif not isinstance(cfg_patch, dict):
+            raise CambioInvalido(i, {"config": "Debe ser un objeto JSON"})
+        else:
+            cfg_actual = ser._deep_merge(cfg_actual, cfg_patch)
+
+    if nuevo is not None:
+        nuevo["config"] = cfg_actual
+        return
+    lote.campos_actualizados.update(data.keys())
+    if cfg_patch is not None:
+        campo.config = json.dumps(cfg_actual, ensure_ascii=False)
+        lote.campos_actualizados.add("config")
+    lote.tocadas.add(lote.pagina_de_campo[cid])
+
+
+def _sin_repetidos(i: int, ids: List[str], que: str) -> None:
+    vistos = set()
+    for x in ids:
+        if x in vistos:
+            raise CambioInvalido(i, f"{que} '{x}' está repetido en el orden.")
+        vistos.add(x)
+
+
+def _reordenar(lote: _Lote, i: int, op: dict) -> None:
+    """
+    Los listados quedan en ese orden (1..n); el resto de la página va después,
+    en su orden actual. Con `completo` la lista debe traerlos a todos.
+    """
+    if op.get("paginas") is not None:
+        listadas = [lote.pagina(i, p) for p in op["paginas"]]
+        _sin_repetidos(i, listadas, "La página")
+        resto = sorted((pid for pid in lote.paginas if pid not in listadas),
+                       key=lambda pid: lote.paginas[pid].secuencia)
+        if resto and op.get("completo"):
+            raise CambioInvalido(i, {"paginas": f"Faltan páginas del formulario: {', '.join(resto)}."})
+        for pos, pid in enumerate(listadas + resto, start=1):
+            if lote.paginas[pid].secuencia != pos:
+                lote.paginas[pid].secuencia = pos
+                lote.paginas_reordenadas.add(pid)
+        return
+
+    pid = lote.pagina(i, op.get("pagina"))
+    listados = []
+    for valor in op.get("campos") or []:
+        cid = lote.campo(i, valor)
+        nuevo = lote.campos_nuevos.get(cid)
+        if (nuevo["pagina"] if nuevo else lote.pagina_de_campo[cid]) != pid:
+            raise CambioInvalido(i, f"El campo '{valor}' no está en la página '{op.get('pagina')}'.")
+        listados.append(cid)
+    _sin_repetidos(i, listados, "El campo")
+
+    def _seq(cid):
+        nuevo = lote.campos_nuevos.get(cid)
+        return nuevo["sequence"] if nuevo else lote.secuencias[cid]
+
+    en_pagina = [c for c, p in lote.pagina_de_campo.items() if p == pid and c not in lote.eliminados]
+    en_pagina += [c for c, n in lote.campos_nuevos.items() if n["pagina"] == pid]
+    resto = sorted((c for c in en_pagina if c not in listados), key=_seq)
+    if resto and op.get("completo"):
+        raise CambioInvalido(i, {"campos": f"Faltan campos de la página: {', '.join(resto)}."})
+    for pos, cid in enumerate(listados + resto, start=1):
+        nuevo = lote.campos_nuevos.get(cid)
+        if nuevo:
+            nuevo["sequence"] = pos
+        elif lote.secuencias[cid] != pos:
+            lote.secuencias[cid] = pos
+            lote.reordenados.add(cid)
+    lote.ultima_secuencia[pid] = len(en_pagina)
+    lote.tocadas.add(pid)
+
+
+def _eliminar_campo(lote: _Lote, i: int, op: dict) -> None:
+    cid = lote.campo(i, op.get("campo"))
+    if lote.campos_nuevos.pop(cid, None) is not None:
+        return
+    lote.eliminados.add(cid)
+    lote.actualizados.pop(cid, None)
+    lote.reordenados.discard(cid)
+    lote.tocadas.add(lote.pagina_de_campo[cid])
+
+
+_APLICAR = {
+    "agregar_pagina": _agregar_pagina,
+    "agregar_campo": _agregar_campo,
+    "actualizar_campo": _actualizar_campo,
+    "reordenar": _reordenar,
+    "eliminar_campo": _eliminar_campo,
+}
+
+
+def _validar_fuentes(lote: _Lote) -> None:
+    """Las FuenteDatos de todos los campos dataset nuevos deben existir (una consulta)."""
+    pedidas = {}
+    for n in lote.campos_nuevos.values():
+        if n["campo"].clase == "dataset":
+            fuente = _uuid_o_none((n["config"].get("dataset") or {}).get("fuente_id"))
+            pedidas.setdefault(fuente, n["indice"])
+    if not pedidas:
+        return
+    existentes = {str(f) for f in FuenteDatos.objects.filter(pk__in=[f for f in pedidas if f]).values_list("pk", flat=True)}
+    for fuente, indice in pedidas.items():
+        if fuente not in existentes:
+            raise CambioInvalido(indice, {"config": {"dataset.fuente_id": "La fuente de datos no existe."}})
+
+
+def _resolver_grupos(lote: _Lote) -> Dict[str, str]:
+    """{id_campo nuevo: id_grupo} validando los grupos existentes en una consulta."""
+    grupos_nuevos = {cid: str(uuid.uuid4()) for cid, n in lote.campos_nuevos.items() if n["campo"].clase == "group"}
+    pedidos = {}
+    for cid, n in lote.campos_nuevos.items():
+        if n["grupo"] and n["campo"].clase != "group":
+            gid = lote.resolver(n["grupo"])
+            pedidos[cid] = grupos_nuevos.get(gid, gid)
+
+    externos = {_uuid_o_none(g) for g in pedidos.values()} - set(grupos_nuevos.values()) - {None}
+    validos = {str(g) for g in Grupo.objects.filter(pk__in=externos).values_list("pk", flat=True)} if externos else set()
+    validos |= set(grupos_nuevos.values())
+    for cid, gid in pedidos.items():
+        gid = _uuid_o_none(gid)
+        if gid not in validos:
+            raise CambioInvalido(lote.campos_nuevos[cid]["indice"], "El id_grupo no existe o no es válido.")
+        pedidos[cid] = gid
+    lote.grupos_nuevos = grupos_nuevos
+    return pedidos
+
+
+def _validar(formulario: Formulario, operaciones: List[dict]):
+    versioning.bloquear([formulario.pk])
+    lote = _Lote(formulario)
+    lote.precargar(operaciones)
+    for i, op in enumerate(operaciones):
+        if not isinstance(op, dict) or op.get("op") not in _APLICAR:
+            raise CambioInvalido(i, f"'op' debe ser una de: {', '.join(OPERACIONES)}.")
+        _APLICAR[op["op"]](lote, i, op)
+    _validar_fuentes(lote)
+    return lote, _resolver_grupos(lote)
+
+
+@transaction.atomic
+def validar(formulario: Formulario, operaciones: List[dict]) -> Dict[str, Any]:
+    """
+    Solo el paso 1 de aplicar (lecturas, sin escrituras ni versión nueva):
+    lanza CambioInvalido igual que aplicar y devuelve qué cambiaría.
+    """
+    lote, _ = _validar(formulario, operaciones)
+    return {
+        "operaciones": len(operaciones),
+        "paginas_nuevas": len(lote.paginas_nuevas),
+        "campos_nuevos": len(lote.campos_nuevos),
+        "campos_actualizados": len(lote.actualizados),
+        "campos_eliminados": len(lote.eliminados),
+        "paginas_versionadas": sorted(lote.tocadas),
+    }
+
+
+@transaction.atomic
+def aplicar(formulario: Formulario, operaciones: List[dict], publicar: bool = True,
+            tablas: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Valida y aplica el lote. Lanza CambioInvalido (con el índice de la operación)
+    sin escribir nada si alguna operación no es válida.
+
+    `tablas` son las fuentes ya leídas con leer_fuentes; si no se pasan se leen
+    aquí, antes de tomar el lock (un llamador que ya bloqueó el formulario
+    debe pasarlas).
+
+    publicar=False aplica el lote sobre la versión vigente sin crear otra (solo
+    sube revision_contenido); lo usa la importación, que ya creó la v1.
+    """
+    if tablas is None:
+        tablas = leer_fuentes(operaciones)
+
+    # 1) Validar todo en memoria (bajo el lock del formulario)
+    lote, membresias = _validar(formulario, operaciones)
+
+    # 2) Una sola versión nueva: historial + punteros de las páginas existentes
+    if publicar or lote.anterior is None:
+        nueva = versioning.publicar_version(formulario, lote.anterior)
+    else:
+        nueva = lote.anterior
+        services.marcar_contenido_modificado([formulario.pk])
+
+    # 3) Páginas nuevas + su puntero a la versión nueva
+    if lote.paginas_nuevas:
+        Pagina.objects.bulk_create(lote.paginas_nuevas)
+        Pagina_Index_Version.objects.bulk_create([
+            Pagina_Index_Version(id_pagina=p, id_index_version=nueva) for p in lote.paginas_nuevas
+        ])
+
+    # 4) Bajas (PaginaCampo, CampoGrupo, Grupo y catálogos caen en cascada)
+    if lote.eliminados:
+        Campo.objects.filter(pk__in=list(lote.eliminados)).delete()
+
+    # 5) Una PaginaVersion nueva por página tocada; los PaginaCampo se MUEVEN en un UPDATE
+    nuevas_pv = versioning.crear_paginas_version([lote.paginas[pid] for pid in lote.tocadas])
+    versioning.mover_campos({lote.pv_actual[pid]: pv.pk for pid, pv in nuevas_pv.items() if lote.pv_actual.get(pid)})
+    # las páginas nuevas ya se insertaron con su secuencia final
+    nuevas_ids = {str(p.pk) for p in lote.paginas_nuevas}
+    versioning.reescribir_secuencias(Pagina, "secuencia", {
+        pid: lote.paginas[pid].secuencia for pid in lote.paginas_reordenadas if pid not in nuevas_ids
+    })
+
+    # 6) Altas de campos (+ grupos y catálogos dataset)
+    if lote.campos_nuevos:
+        campos = []
+        for cid, n in lote.campos_nuevos.items():
+            campo, cfg = n["campo"], n["config"]
+            if campo.clase == "group":
+                cfg["id_group"] = lote.grupos_nuevos[cid]
+                cfg.setdefault("name", (campo.etiqueta or campo.nombre_campo or "Grupo")[:150])
+                cfg.setdefault("fieldCondition", "")
+            campo.config = json.dumps(cfg, ensure_ascii=False) if cfg else None
+            campos.append(campo)
+        Campo.objects.bulk_create(campos)
+
+        Grupo.objects.bulk_create([
+            Grupo(id_grupo=lote.grupos_nuevos[cid], id_campo_group=n["campo"],
+                  nombre=(n["campo"].etiqueta or n["campo"].nombre_campo or "Grupo")[:150])
+            for cid, n in lote.campos_nuevos.items() if cid in lote.grupos_nuevos
+        ])
+        CampoGrupo.objects.bulk_create([
+            CampoGrupo(id_campo_id=cid, id_grupo_id=gid) for cid, gid in membresias.items()
+        ])
+
+        PaginaCampo.objects.bulk_create([
+            PaginaCampo(id_campo=n["campo"], id_pagina_version=nuevas_pv[n["pagina"]], sequence=n["sequence"])
+            for n in lote.campos_nuevos.values()
+        ])
+
+        # el catálogo necesita el Campo ya insertado; es trabajo por campo
+        datasets = [n for n in lote.campos_nuevos.values() if n["campo"].clase == "dataset"]
+        for n in datasets:
+            services._materializar_dataset_para_campo(n["config"], n["campo"], tablas)
+            if isinstance(n["config"].get("dataset"), dict):
+                n["config"]["dataset"].pop("version", None)
+            n["campo"].config = json.dumps(n["config"], ensure_ascii=False)
+        if datasets:
+            Campo.objects.bulk_update([n["campo"] for n in datasets], ["config"])
+
+    # 7) Modificaciones y reordenamientos de campos existentes
+    if lote.actualizados and lote.campos_actualizados:
+        Campo.objects.bulk_update(lote.actualizados.values(), sorted(lote.campos_actualizados))
+    versioning.reescribir_secuencias(PaginaCampo, "sequence", {cid: lote.secuencias[cid] for cid in lote.reordenados})
+
+    return {
+        "formulario_id": str(formulario.pk),
+        "version_anterior": str(lote.anterior.pk) if lote.anterior else None,
+        "nueva_version_id": str(nueva.pk),
+        "operaciones": len(operaciones),
+        "refs": lote.refs,
+        "paginas_versionadas": sorted(lote.tocadas),
+        "campos_creados": [
+            {
+                "id_campo": cid,
+                "id_grupo": lote.grupos_nuevos.get(cid) or membresias.get(cid) or "",
+                "tipo": n["campo"].tipo,
+                "clase": n["campo"].clase,
+                "nombre_campo": n["campo"].nombre_campo,
+                "etiqueta": n["campo"].etiqueta,
+                "id_pagina": n["pagina"],
+                "id_pagina_version": nuevas_pv[n["pagina"]].pk,
+                "sequence": n["sequence"],
+            }
+            for cid, n in lote.campos_nuevos.items()
+        ],
+        "campos_eliminados": sorted(lote.eliminados),
+    }
@@ -0,0 +1,85 @@
+# dataset_items.py
+"""
+Items {key, label} de un campo dataset, paginados por keyset sobre
+(label_text, id) dentro del campo y con búsqueda por prefijo.
+
+Cada página es una consulta indexada (campo, label_text, id) que arranca
+justo después del último item entregado: el costo no crece con la
+profundidad de la paginación, así que sirve para catálogos de 100k filas.
+
+Los items se acotan a la fuente y columna configuradas en el campo
+(filtro_catalogo), igual que los catálogos embebidos en el árbol: filas de
+una fuente o columna anterior que aún no se rematerializaron no se sirven.
+"""
+import base64
+import binascii
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Q
+
+from .models import FuenteDatosValor
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _codificar(label: str, pk) -> str:
+    raw = json.dumps([label, str(pk)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decodificar(cursor: str) -> Tuple[str, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        label, pk = json.loads(raw)
+        pk = uuid.UUID(str(pk))
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorInvalido("Cursor inválido.")
+    return str(label), pk
+
+
+def filtro_catalogo(campo_id, ds: Optional[dict]) -> Q:
+    """
+    Filas FuenteDatosValor del catálogo de un campo: las del campo, acotadas a
+    `fuente_id` y a la columna de label (`label_column` o `column`) de su
+    config["dataset"] cuando están configuradas.
+    """
+    ds = ds or {}
+    q = Q(campo_id=campo_id)
+    if ds.get("fuente_id"):
+        q &= Q(fuente_id=str(ds["fuente_id"]))
+    columna = ds.get("label_column") or ds.get("column")
+    if columna:
+        q &= Q(columna=columna)
+    return q
+
+
+def pagina_de_items(campo_id, q: str = "", cursor: Optional[str] = None, limite: int = 50,
+                    ds: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    Devuelve {"results": [{key, label}], "cursor": <siguiente> | None}.
+    `q` filtra por prefijo de label (sin distinguir mayúsculas); `ds` es el
+    config["dataset"] del campo (ver filtro_catalogo).
+    """
+    qs = FuenteDatosValor.objects.filter(filtro_catalogo(campo_id, ds))
+    if q:
+        qs = qs.filter(label_text__istartswith=q)
+    if cursor:
+        label, pk = _decodificar(cursor)
+        qs = qs.filter(Q(label_text__gt=label) | Q(label_text=label, id__gt=pk))
+
+    # un item extra para saber si hay más
+    filas: List[Tuple[Any, ...]] = list(qs.order_by("label_text", "id")
+                                        .values_list("id", "key_text", "label_text")[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = _codificar(filas[-1][2], filas[-1][0])
+
+    return {
+        "results": [{"key": key, "label": label} for _, key, label in filas],
+        "cursor": siguiente,
+    }
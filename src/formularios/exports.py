@@ -6,6 +6,7 @@ from django.utils.timezone import localtime
 from zipfile import ZipFile, ZIP_DEFLATED
 from django.utils import timezone
 from .models import FormularioEntry, Grupo, CampoGrupo, Campo
+from .renderers import dumps
 import json
 
 
@@ -449,7 +450,7 @@ def content_bytes_para_un_form(form_id, fmt: str = "xlsx"):
             "grupos": df_grupos.to_dict(orient="records") if not df_grupos.empty else []
         }
         
-        out = json.dumps(resultado, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+        out = dumps(resultado, indent=True, default=str)
         return (f"{safe_name}__{form_id}.json", out, "application/json")
 
     else:
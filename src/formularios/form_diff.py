@@ -0,0 +1,75 @@
+# form_diff.py
+"""
+Diferencias entre dos versiones de un formulario (páginas y campos agregados,
+eliminados y modificados), para que un dispositivo que ya tiene la versión N
+descargue solo el delta hacia N+1.
+
+Como PaginaCampo se MUEVE entre versiones (no se copia), las versiones viejas
+ya no se pueden reconstruir desde las tablas; el diff se calcula sobre los
+snapshots (FormularioSnapshot), que son el PaginaCampo + Campo de cada versión
+materializado al publicarla.
+
+El resultado se cachea por par de contenidos (sha256 de ambos snapshots):
+si alguno cambia, la clave cambia y no hace falta invalidar.
+"""
+from typing import Any, Dict, List, Tuple
+
+from . import schema_cache
+from .renderers import loads
+
+_KEY_PREFIX = "form_diff"
+_ATRIBUTOS_PAGINA = ("secuencia", "nombre", "descripcion")
+
+
+def _aplanar_campos(paginas: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """{id_campo: campo} de todas las páginas, incluidos los hijos de grupos."""
+    out = {}
+
+    def _visitar(campos, id_pagina, grupo):
+        for c in campos:
+            plano = {k: v for k, v in c.items() if k != "children"}
+            plano["id_pagina"] = id_pagina
+            plano["id_grupo_campo"] = grupo
+            out[c["id_campo"]] = plano
+            _visitar(c.get("children") or [], id_pagina, c["id_campo"])
+
+    for p in paginas:
+        _visitar(p.get("campos") or [], p["id_pagina"], None)
+    return out
+
+
+def _separar(antes: Dict[str, Any], despues: Dict[str, Any]) -> Tuple[list, list, list]:
+    agregados = [v for k, v in despues.items() if k not in antes]
+    eliminados = [k for k in antes if k not in despues]
+    modificados = [v for k, v in despues.items() if k in antes and antes[k] != v]
+    return agregados, eliminados, modificados
+
+
+def calcular(paginas_desde: List[Dict[str, Any]], paginas_hasta: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Diff puro entre dos árboles de páginas (formato de PaginaConCamposSerializer)."""
+    pag_antes = {p["id_pagina"]: {k: p.get(k) for k in ("id_pagina",) + _ATRIBUTOS_PAGINA} for p in paginas_desde}
+    pag_despues = {p["id_pagina"]: {k: p.get(k) for k in ("id_pagina",) + _ATRIBUTOS_PAGINA} for p in paginas_hasta}
+    p_agregadas, p_eliminadas, p_modificadas = _separar(pag_antes, pag_despues)
+    c_agregados, c_eliminados, c_modificados = _separar(
+        _aplanar_campos(paginas_desde), _aplanar_campos(paginas_hasta),
+    )
+    return {
+        "paginas": {"agregadas": p_agregadas, "eliminadas": p_eliminadas, "modificadas": p_modificadas},
+        "campos": {"agregados": c_agregados, "eliminados": c_eliminados, "modificados": c_modificados},
+    }
+
+
+def diff_snapshots(snap_desde, snap_hasta) -> Dict[str, Any]:
+    """Diff entre dos FormularioSnapshot, cacheado por el par de contenidos."""
+    key = f"{_KEY_PREFIX}:{snap_desde.sha256}:{snap_hasta.sha256}"
+    cache = schema_cache._shared_cache()
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    cambios = calcular(
+        loads(snap_desde.contenido)["paginas"],
+        loads(snap_hasta.contenido)["paginas"],
+    )
+    cache.set(key, cambios, schema_cache._shared_timeout())
+    return cambios
@@ -0,0 +1,153 @@
+# form_import.py
+"""
+Importación de un formulario completo desde el JSON que emite
+FormularioSerializer (?expand=paginas) o el snapshot de /esquema/: páginas →
+campos → hijos de grupo, con sus configs de dataset.
+
+El formulario se inserta con bulk_create (sin la señal que crea la página
+"General") y con su v1; el árbol se traduce a operaciones de changeset
+(agregar_pagina / agregar_campo) y se aplica sobre esa misma v1 en lote.
+Los ids de origen se usan como `ref`, así que los grupos se reenlazan solos y
+todo recibe ids nuevos: se puede importar varias veces en el mismo entorno.
+Categoría y fuentes de datos se resuelven por id y, si no existen en este
+entorno, por nombre (`categoria_nombre`, `dataset.fuente_nombre`).
+"""
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import transaction
+
+from . import changeset, versioning
+from .models import Categoria, Formulario, FuenteDatos
+
+# Claves que agrega el render del árbol y no forman parte de la definición
+_CONFIG_RENDER = ("items", "items_ref", "items_total")
+
+
+class ImportacionInvalida(ValueError):
+    def __init__(self, ruta: str, mensaje):
+        super().__init__(mensaje)
+        self.ruta = ruta
+        self.mensaje = mensaje
+
+
+def _config_limpio(campo: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(campo.get("config") or {}) if isinstance(campo.get("config"), dict) else {}
+    for k in _CONFIG_RENDER:
+        cfg.pop(k, None)
+    if (campo.get("clase") or "").lower() == "group":
+        cfg.pop("id_group", None)  # el grupo nuevo lo asigna el changeset
+    if isinstance(cfg.get("dataset"), dict):
+        cfg["dataset"] = dict(cfg["dataset"])  # _resolver_fuentes lo reescribe
+    return cfg
+
+
+def operaciones_desde_arbol(paginas: List[Dict[str, Any]]) -> Tuple[List[dict], List[str]]:
+    """
+    Traduce el árbol a operaciones de changeset. Devuelve (operaciones, rutas),
+    donde rutas[i] ubica la operación i en el JSON de entrada (para errores).
+    """
+    ops, rutas = [], []
+
+    def _campo(d, ruta, ref_pagina, grupo=None):
+        op = {
+            "op": "agregar_campo",
+            "pagina": ref_pagina,
+            "ref": str(d.get("id_campo") or ruta),
+            "clase": d.get("clase"),
+            "nombre_campo": d.get("nombre_campo"),
+            "etiqueta": d.get("etiqueta"),
+            "ayuda": d.get("ayuda"),
+            "requerido": d.get("requerido"),
+            "config": _config_limpio(d),
+        }
+        if d.get("sequence") is not None:
+            op["sequence"] = d["sequence"]
+        if grupo is not None:
+            op["grupo"] = grupo
+        ops.append({k: v for k, v in op.items() if v is not None})
+        rutas.append(ruta)
+        for j, hijo in enumerate(d.get("children") or []):
+            _campo(hijo, f"{ruta}.children[{j}]", ref_pagina, grupo=op["ref"])
+
+    # se ordena por secuencia, pero la ruta es la posición en el JSON de entrada
+    for i, p in sorted(enumerate(paginas), key=lambda ip: ip[1].get("secuencia") or 0):
+        ref = str(p.get("id_pagina") or f"paginas[{i}]")
+        ops.append({"op": "agregar_pagina", "ref": ref, "nombre": p.get("nombre"), "descripcion": p.get("descripcion")})
+        rutas.append(f"paginas[{i}]")
+        for j, d in enumerate(p.get("campos") or []):
+            _campo(d, f"paginas[{i}].campos[{j}]", ref)
+    return ops, rutas
+
+
+def _categoria(data: Dict[str, Any]) -> Optional[Categoria]:
+    """La misma categoría por id si existe en este entorno; si no, por nombre."""
+    cid = data.get("categoria")
+    if cid:
+        cat = Categoria.objects.filter(pk=cid).first()
+        if cat:
+            return cat
+    nombre = data.get("categoria_nombre")
+    return Categoria.objects.filter(nombre=nombre).first() if nombre else None
+
+
+def _uuid_o_none(valor) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(valor))
+    except ValueError:
+        return None
+
+
+def _resolver_fuentes(ops: List[dict]) -> None:
+    """
+    dataset.fuente_id de cada campo: la misma fuente por id si existe en este
+    entorno; si no, la activa más reciente con `dataset.fuente_nombre` (como
+    _categoria). Dos consultas para todo el árbol; quita `fuente_nombre`.
+    """
+    datasets = [op["config"]["dataset"] for op in ops
+                if op["op"] == "agregar_campo" and isinstance(op["config"].get("dataset"), dict)]
+    if not datasets:
+        return
+    ids = {_uuid_o_none(ds.get("fuente_id")) for ds in datasets} - {None}
+    existentes = set(FuenteDatos.objects.filter(pk__in=ids).values_list("pk", flat=True))
+    faltantes = [ds for ds in datasets if _uuid_o_none(ds.get("fuente_id")) not in existentes]
+    nombres = {ds.get("fuente_nombre") for ds in faltantes} - {None, ""}
+    por_nombre = {}
+    if nombres:
+        for pk, nombre in (FuenteDatos.objects.filter(nombre__in=nombres, activo=True)
+                           .order_by("-fecha_subida").values_list("pk", "nombre")):
+            por_nombre.setdefault(nombre, str(pk))
+    for ds in faltantes:
+        if ds.get("fuente_nombre") in por_nombre:
+            ds["fuente_id"] = por_nombre[ds["fuente_nombre"]]
+    for ds in datasets:
+        ds.pop("fuente_nombre", None)
+
+
+@transaction.atomic
+def importar(data: Dict[str, Any], paginas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    `data` son las columnas validadas del formulario (FormularioImportSerializer)
+    y `paginas` el árbol. Lanza ImportacionInvalida sin dejar nada escrito.
+    """
+    datos = {k: v for k, v in data.items() if k not in ("categoria", "categoria_nombre")}
+    formulario = Formulario(categoria=_categoria(data), **datos)
+    Formulario.objects.bulk_create([formulario])
+    version = versioning.registrar_version(formulario, snapshot=False)
+
+    ops, rutas = operaciones_desde_arbol(paginas)
+    if not ops:
+        raise ImportacionInvalida("paginas", "El formulario debe traer al menos una página.")
+    _resolver_fuentes(ops)
+    try:
+        out = changeset.aplicar(formulario, ops, publicar=False)
+    except changeset.CambioInvalido as e:
+        raise ImportacionInvalida(rutas[e.indice], e.mensaje)
+
+    return {
+        "id": str(formulario.pk),
+        "nombre": formulario.nombre,
+        "version_id": str(version.pk),
+        "paginas": sum(1 for op in ops if op["op"] == "agregar_pagina"),
+        "campos": len(out["campos_creados"]),
+    }
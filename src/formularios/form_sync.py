@@ -0,0 +1,108 @@
+# form_sync.py
+"""
+Paquete de sincronización móvil: todos los formularios asignados a un usuario
+(UserFormulario) en una sola respuesta, con esquema, versión y catálogos de
+los campos dataset.
+
+El cursor `since` es opaco para el cliente: base64 de {id_formulario: huella}
+(ver services.huella_formulario). Los formularios cuya huella no cambió se
+omiten; los que ya no están asignados (o quedaron suspendidos) se informan
+en `eliminados`.
+
+Consultas (constantes respecto a la cantidad de formularios):
+  1) Formularios asignados + categoría + versión vigente
+  2) Árboles de páginas: schema_cache → snapshot (uno por formulario SOLO en fallo de caché)
+  3) Items de todos los campos dataset de los formularios cambiados
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+
+from .form_tree import _items_por_campo, subquery_version_actual
+from .models import Formulario, UserFormulario
+from .services import huella_formulario
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(huellas: Dict[str, str]) -> str:
+    raw = json.dumps(huellas, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Dict[str, str]:
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        huellas = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise CursorInvalido("Cursor 'since' inválido.")
+    if not isinstance(huellas, dict):
+        raise CursorInvalido("Cursor 'since' inválido.")
+    return {str(k): str(v) for k, v in huellas.items()}
+
+
+def formularios_asignados(usuario):
+    """
+    Formularios asignados (no suspendidos), anotados con su versión vigente.
+    Por subconsulta y no por JOIN: un formulario asignado más de una vez
+    aparece una sola vez (ni duplicado en el bundle ni en la huella del cursor).
+    """
+    asignados = UserFormulario.objects.filter(id_usuario=usuario).values("id_formulario_id")
+    return (Formulario.objects
+            .filter(pk__in=asignados)
+            .exclude(estado__iexact="suspendida")
+            .select_related("categoria")
+            .annotate(version_actual_id=subquery_version_actual())
+            .order_by("nombre", "id"))
+
+
+def _campos_dataset(paginas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+
+    def _visitar(campos):
+        for c in campos:
+            if (c.get("clase") or "").lower() == "dataset":
+                out.append(c)
+            _visitar(c.get("children") or [])
+
+    for p in paginas:
+        _visitar(p.get("campos") or [])
+    return out
+
+
+def catalogos(paginas_por_form: Iterable[List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    {id_campo: {"fuente_id", "items": [{key, label}], "truncado"}} para todos
+    los campos dataset, en UNA consulta. Cada catálogo se corta en
+    SYNC_CATALOGO_MAX_ITEMS.
+    """
+    limite = int(getattr(settings, "SYNC_CATALOGO_MAX_ITEMS", 5000))
+    specs = []
+    for paginas in paginas_por_form:
+        for c in _campos_dataset(paginas):
+            ds = (c.get("config") or {}).get("dataset") or {}
+            specs.append({
+                "campo_id": c["id_campo"],
+                "fuente_id": ds.get("fuente_id"),
+                "label_column": ds.get("label_column") or ds.get("column"),
+                # un item extra para saber si se truncó
+                "limit": limite + 1,
+            })
+    items = _items_por_campo(specs)
+
+    out = {}
+    for s in specs:
+        lista = items.get(s["campo_id"], [])
+        out[s["campo_id"]] = {
+            "fuente_id": s["fuente_id"],
+            "items": lista[:limite],
+            "truncado": len(lista) > limite,
+        }
+    return out
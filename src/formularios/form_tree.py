@@ -0,0 +1,317 @@
+# form_tree.py
+"""
+Carga del árbol completo de un formulario (páginas → campos → hijos de grupo
+→ items de dataset) con un número FIJO de consultas, sin importar cuántas
+páginas o campos tenga.
+
+Produce exactamente la misma estructura que antes armaba
+PaginaConCamposSerializer.get_campos página por página.
+"""
+import json
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, OuterRef, Q, Subquery, UUIDField, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.urls import reverse
+
+from .dataset_items import filtro_catalogo
+from .models import CampoGrupo, Formulario_Index_Version, FuenteDatos, FuenteDatosValor, Pagina, PaginaCampo, PaginaVersion
+
+
+def _cfg_dict(cfg) -> dict:
+    if isinstance(cfg, dict):
+        return cfg
+    # si es str, intenta parsear, si falla -> {}
+    if isinstance(cfg, str):
+        try:
+            return json.loads(cfg)
+        except Exception:
+            return {}
+    return {}
+
+
+def _limite(valor):
+    try:
+        valor = int(valor) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+    return valor if valor and valor > 0 else None
+
+
+def items_inline() -> bool:
+    """
+    True = formato anterior: los items de cada dataset van embebidos en el
+    campo (hasta max_items_inline). False = el campo solo lleva `items_ref` e
+    `items_total`, y los items se paginan en /api/campos/{id}/items/.
+    """
+    return bool(getattr(settings, "FORM_DATASET_ITEMS_INLINE", False))
+
+
+def formato_esquema() -> int:
+    """Versión del formato del árbol; forma parte de la clave de caché y del snapshot."""
+    return 1 if items_inline() else 2
+
+
+def subquery_version_actual():
+    """
+    Id de la FormularioIndexVersion vigente del formulario externo, para anotar
+    querysets de Formulario. Usa el puntero current_index_version y solo cae al
+    historial ordenado por fecha si aún no está poblado.
+    """
+    return Coalesce(
+        F("current_index_version"),
+        Subquery(Formulario_Index_Version.objects
+                 .filter(id_formulario=OuterRef("pk"))
+                 .order_by("-id_index_version__fecha_creacion")
+                 .values("id_index_version")[:1]),
+        output_field=UUIDField(),
+    )
+
+
+def _pagina_version_actual():
+    # Puntero current_pagina_version; el orden por fecha solo cubre filas sin backfill
+    return Coalesce(
+        F("current_pagina_version"),
+        Subquery(PaginaVersion.objects
+                 .filter(id_pagina=OuterRef("pk"))
+                 .order_by("-fecha_creacion")
+                 .values("id_pagina_version")[:1]),
+        output_field=CharField(),
+    )
+
+
+def paginas_de_version(index_version):
+    """
+    Páginas apuntadas a una FormularioIndexVersion, ordenadas por secuencia y
+    anotadas con `pv_actual` (id de su PaginaVersion vigente).
+    Una sola consulta.
+    """
+    return (Pagina.objects
+            .filter(puntero_version__id_index_version=index_version)
+            .annotate(pv_actual=_pagina_version_actual())
+            .order_by("secuencia"))
+
+
+def _pv_por_pagina(paginas: List[Pagina]) -> Dict[Any, str]:
+    """Resuelve la PaginaVersion actual de cada página (usa la anotación si existe)."""
+    out = {}
+    faltantes = []
+    for p in paginas:
+        if hasattr(p, "pv_actual"):
+            if p.pv_actual:
+                out[p.pk] = p.pv_actual
+        else:
+            faltantes.append(p.pk)
+
+    if faltantes:
+        filas = (Pagina.objects
+                 .filter(pk__in=faltantes)
+                 .annotate(pv_actual=_pagina_version_actual())
+                 .values_list("pk", "pv_actual"))
+        out.update({pk: pv for pk, pv in filas if pv})
+    return out
+
+
+def _items_por_campo(specs: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Trae los items {key, label} de TODOS los campos dataset en una sola consulta.
+    El límite por campo se aplica con ROW_NUMBER() particionado por campo.
+    """
+    if not specs:
+        return {}
+
+    filtro = Q()
+    for s in specs:
+        filtro |= filtro_catalogo(s["campo_id"], {"fuente_id": s["fuente_id"], "label_column": s["label_column"]})
+
+    qs = FuenteDatosValor.objects.filter(filtro)
+
+    limites = [s["limit"] for s in specs]
+    if all(limites):
+        qs = (qs
+              .annotate(rn=Window(
+                  expression=RowNumber(),
+                  partition_by=[F("campo_id")],
+                  order_by=[F("label_text").asc(), F("key_text").asc()],
+              ))
+              .filter(rn__lte=max(limites)))
+
+    filas = qs.order_by("campo_id", "label_text", "key_text").values_list("campo_id", "key_text", "label_text")
+
+    limite_por_campo = {s["campo_id"]: s["limit"] for s in specs}
+    out = defaultdict(list)
+    for campo_id, key, label in filas:
+        cid = str(campo_id)
+        lim = limite_por_campo.get(cid)
+        if lim and len(out[cid]) >= lim:
+            continue
+        out[cid].append({"key": key, "label": label})
+    return out
+
+
+def _totales_por_campo(datasets: Dict[str, dict]) -> Dict[str, int]:
+    """
+    {id_campo: cantidad de items} en una sola consulta; `datasets` es
+    {id_campo: config["dataset"]} y acota igual que /campos/{id}/items/.
+    """
+    if not datasets:
+        return {}
+    filtro = Q()
+    for campo_id, ds in datasets.items():
+        filtro |= filtro_catalogo(campo_id, ds)
+    filas = (FuenteDatosValor.objects
+             .filter(filtro)
+             .values("campo_id")
+             .annotate(n=Count("id"))
+             .values_list("campo_id", "n"))
+    return {str(cid): n for cid, n in filas}
+
+
+def _agregar_nombres_de_fuentes(datasets: List[dict]) -> None:
+    """Agrega `fuente_nombre` a cada config["dataset"] en una sola consulta (ids inválidos se ignoran)."""
+    por_fuente = defaultdict(list)
+    for ds in datasets:
+        try:
+            por_fuente[uuid.UUID(str(ds.get("fuente_id")))].append(ds)
+        except ValueError:
+            continue
+    if not por_fuente:
+        return
+    for pk, nombre in FuenteDatos.objects.filter(pk__in=list(por_fuente)).values_list("pk", "nombre"):
+        for ds in por_fuente[pk]:
+            ds["fuente_nombre"] = nombre
+
+
+def _hijos_por_grupo(group_campo_ids: List[str]) -> Dict[str, List[str]]:
+    """{id_campo del group: [id_campo miembros]} en una sola consulta."""
+    if not group_campo_ids:
+        return {}
+    out = defaultdict(list)
+    filas = (CampoGrupo.objects
+             .filter(id_grupo__id_campo_group_id__in=group_campo_ids)
+             .values_list("id_grupo__id_campo_group_id", "id_campo_id"))
+    for gid, cid in filas:
+        out[str(gid)].append(str(cid))
+    return out
+
+
+def cargar_campos_por_pagina(paginas: Iterable[Pagina]) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    Devuelve {id_pagina: [campos serializados]} para todas las páginas dadas.
+
+    Consultas (constantes):
+      1) PaginaVersion actual de cada página (0 si vienen anotadas)
+      2) PaginaCampo + Campo de todas las versiones
+      3) Miembros de todos los grupos
+      4) Items de todos los campos dataset (o solo sus totales, ver items_inline)
+      5) Nombres de sus fuentes (dataset.fuente_nombre: form_import resuelve
+         por nombre la fuente que no existe con el mismo id en otro entorno)
+    """
+    paginas = list(paginas)
+    if not paginas:
+        return {}
+
+    pv_por_pagina = _pv_por_pagina(paginas)
+    if not pv_por_pagina:
+        return {p.pk: [] for p in paginas}
+
+    pagina_por_pv = {pv: pid for pid, pv in pv_por_pagina.items()}
+    links = (PaginaCampo.objects
+             .filter(id_pagina_version_id__in=list(pagina_por_pv))
+             .select_related("id_campo")
+             .order_by("sequence"))
+
+    # 1) Campos planos por página (sin items todavía)
+    inline = items_inline()
+    campos_por_pagina = defaultdict(list)
+    dataset_specs = []
+    dataset_refs = []
+    dataset_cfgs = []
+    for l in links:
+        c = l.id_campo
+        cfg = _cfg_dict(c.config)
+        d = {
+            "id_campo": str(c.id_campo),
+            "sequence": l.sequence,
+            "nombre_campo": c.nombre_campo,
+            "etiqueta": c.etiqueta,
+            "clase": c.clase,
+            "tipo": c.tipo,
+            "requerido": c.requerido,
+            "config": cfg,
+        }
+        if (c.clase or "").lower() == "dataset":
+            # Soporta tanto config plano como anidado bajo 'dataset'
+            ds = cfg.get("dataset") or {}
+            dataset_cfgs.append(ds)
+            if not inline:
+                dataset_refs.append(d)
+                cfg["items_ref"] = reverse("campos-items", kwargs={"id_campo": d["id_campo"]})
+                cfg["dataset"] = ds
+            elif bool(ds.get("cache_inline", True)):
+                dataset_specs.append({
+                    "campo_id": d["id_campo"],
+                    "fuente_id": ds.get("fuente_id"),
+                    "label_column": ds.get("label_column") or ds.get("column"),
+                    "mode": (ds.get("mode") or "pair").lower(),
+                    "limit": _limite(ds.get("max_items_inline", 300)),
+                    "ds": ds,
+                })
+            else:
+                cfg["dataset"] = ds
+        campos_por_pagina[pagina_por_pv[l.id_pagina_version_id]].append(d)
+
+    # 2) Items de dataset (una consulta para todos los campos); en formato
+    #    por referencia, solo el total de cada catálogo
+    totales = _totales_por_campo({d["id_campo"]: d["config"]["dataset"] for d in dataset_refs})
+    for d in dataset_refs:
+        d["config"]["items_total"] = totales.get(d["id_campo"], 0)
+
+    items = _items_por_campo(dataset_specs)
+    spec_por_campo = {s["campo_id"]: s for s in dataset_specs}
+    for lista in campos_por_pagina.values():
+        for d in lista:
+            spec = spec_por_campo.get(d["id_campo"])
+            if spec is None:
+                continue
+            items_pair = items.get(d["id_campo"], [])
+            if spec["mode"] == "pair":
+                # [{"key": "...", "label": "..."}]
+                d["config"]["items"] = items_pair
+            else:
+                # ["label1", "label2", ...]
+                d["config"]["items"] = [it["label"] for it in items_pair if it.get("label")]
+            # reinyecta dataset normalizado (por si hiciste cambios)
+            d["config"]["dataset"] = spec["ds"]
+
+    # nombre de la fuente junto a su id (como categoria_nombre en el formulario)
+    _agregar_nombres_de_fuentes(dataset_cfgs)
+
+    # 3) Grupos: anidar hijos (una consulta para todos los grupos)
+    group_ids = [d["id_campo"] for lista in campos_por_pagina.values()
+                 for d in lista if (d.get("clase") or "").lower() == "group"]
+    miembros = _hijos_por_grupo(group_ids)
+
+    out = {}
+    for p in paginas:
+        lista = campos_por_pagina.get(p.pk, [])
+        index = {d["id_campo"]: d for d in lista}
+        seq_by_campo = {d["id_campo"]: d.get("sequence", 10**9) for d in lista}
+        child_ids = set()
+
+        for d in lista:
+            if (d.get("clase") or "").lower() != "group":
+                continue
+            hijos = [index[cid] for cid in miembros.get(d["id_campo"], []) if cid in index]
+            hijos.sort(key=lambda h: seq_by_campo.get(h["id_campo"], 10**9))
+            d["children"] = hijos
+            child_ids.update([h["id_campo"] for h in hijos])
+
+        if child_ids:
+            lista = [d for d in lista if d["id_campo"] not in child_ids]
+        out[p.pk] = lista
+
+    return out
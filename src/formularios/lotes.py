@@ -0,0 +1,26 @@
+# lotes.py
+"""
+Iteración en lotes para los comandos de mantenimiento (backfill, purgas,
+barridos): cada lote se procesa en su propia transacción corta.
+"""
+from typing import Iterator, List, Sequence
+
+
+def pks_en_lotes(qs, batch_size: int) -> Iterator[List]:
+    """Itera los PKs de `qs` en lotes, paginando por PK (sin OFFSET)."""
+    ultimo = None
+    while True:
+        page = qs.order_by("pk")
+        if ultimo is not None:
+            page = page.filter(pk__gt=ultimo)
+        ids = list(page.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        ultimo = ids[-1]
+
+
+def trozos(ids: Sequence, batch_size: int) -> Iterator[Sequence]:
+    """Parte una lista de ids ya materializada en trozos de `batch_size`."""
+    for i in range(0, len(ids), batch_size):
+        yield ids[i:i + batch_size]
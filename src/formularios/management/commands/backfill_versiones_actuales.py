@@ -0,0 +1,68 @@
+# backfill_versiones_actuales.py
+"""
+Puebla los punteros desnormalizados Formulario.current_index_version y
+Pagina.current_pagina_version a partir del historial (la versión más reciente
+por fecha_creacion).
+
+Uso:
+    python manage.py backfill_versiones_actuales
+    python manage.py backfill_versiones_actuales --todos --batch-size 500
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from formularios.lotes import pks_en_lotes
+from formularios.models import Formulario, Formulario_Index_Version, Pagina, PaginaVersion
+
+
+class Command(BaseCommand):
+    help = "Puebla current_index_version (Formulario) y current_pagina_version (Pagina) desde el historial."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--todos",
+            action="store_true",
+            help="Recalcula también los punteros ya poblados (por defecto solo los NULL).",
+        )
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, opts["batch_size"])
+        todos = opts["todos"]
+
+        # 1) Formularios: última FormularioIndexVersion del historial
+        ultima_fiv = Subquery(Formulario_Index_Version.objects
+                              .filter(id_formulario=OuterRef("pk"))
+                              .order_by("-id_index_version__fecha_creacion")
+                              .values("id_index_version")[:1])
+        forms = Formulario.objects.all()
+        if not todos:
+            forms = forms.filter(current_index_version__isnull=True)
+
+        total_forms = 0
+        for ids in pks_en_lotes(forms, batch_size):
+            with transaction.atomic():
+                total_forms += (Formulario.objects
+                                .filter(pk__in=ids)
+                                .update(current_index_version=ultima_fiv))
+
+        # 2) Páginas: última PaginaVersion por fecha
+        ultima_pv = Subquery(PaginaVersion.objects
+                             .filter(id_pagina=OuterRef("pk"))
+                             .order_by("-fecha_creacion")
+                             .values("id_pagina_version")[:1])
+        paginas = Pagina.objects.all()
+        if not todos:
+            paginas = paginas.filter(current_pagina_version__isnull=True)
+
+        total_paginas = 0
+        for ids in pks_en_lotes(paginas, batch_size):
+            with transaction.atomic():
+                total_paginas += (Pagina.objects
+                                  .filter(pk__in=ids)
+                                  .update(current_pagina_version=ultima_pv))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Punteros actualizados: {total_forms} formularios, {total_paginas} páginas."
+        ))
@@ -0,0 +1,58 @@
+# barrer_campos_huerfanos.py
+"""
+Elimina campos huérfanos históricos: Campo sin ningún PaginaCampo (quedaron
+de borrados de formularios anteriores al borrado acotado, o de procesos
+interrumpidos). Con cada campo caen su Grupo, sus CampoGrupo y su catálogo
+dataset (FuenteDatosValor).
+
+Trabaja en lotes por PK, cada uno en su propia transacción y re-aplicando el
+filtro al borrar: se puede correr en segundo plano o volver a ejecutar si se
+interrumpe.
+
+Uso:
+    python manage.py barrer_campos_huerfanos --dry-run
+    python manage.py barrer_campos_huerfanos --batch-size 500
+"""
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from formularios import services
+from formularios.lotes import pks_en_lotes
+from formularios.models import Campo, CampoGrupo, FuenteDatosValor, Grupo, PaginaCampo
+
+
+def campos_huerfanos():
+    return Campo.objects.exclude(Exists(PaginaCampo.objects.filter(id_campo=OuterRef("pk"))))
+
+
+class Command(BaseCommand):
+    help = "Elimina en lotes los Campo sin PaginaCampo, con sus grupos, membresías y catálogos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta lo que se borraría.")
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, opts["batch_size"])
+        dry_run = opts["dry_run"]
+        filas = Counter()
+
+        for ids in pks_en_lotes(campos_huerfanos(), batch_size):
+            if dry_run:
+                filas[Campo._meta.label] += len(ids)
+                filas[Grupo._meta.label] += Grupo.objects.filter(id_campo_group_id__in=ids).count()
+                filas[CampoGrupo._meta.label] += CampoGrupo.objects.filter(id_campo_id__in=ids).count()
+                filas[FuenteDatosValor._meta.label] += FuenteDatosValor.objects.filter(campo_id__in=ids).count()
+                continue
+            with transaction.atomic():
+                # el filtro se re-aplica por si algún campo volvió a enlazarse
+                vigentes = campos_huerfanos().filter(pk__in=ids).values_list("pk", flat=True)
+                filas.update(services.eliminar_campos(vigentes))
+
+        verbo = "Se borrarían" if dry_run else "Borradas"
+        for m in (Campo, Grupo, CampoGrupo, FuenteDatosValor):
+            self.stdout.write(f"{verbo}: {filas[m._meta.label]} filas de {m._meta.db_table}")
+        self.stdout.write(self.style.SUCCESS(f"Campos huérfanos {'encontrados' if dry_run else 'eliminados'}: {filas[Campo._meta.label]}"))
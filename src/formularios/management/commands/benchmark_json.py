@@ -0,0 +1,121 @@
+# benchmark_json.py
+"""
+Compara el JSONRenderer/JSONParser de DRF contra OrjsonRenderer/OrjsonParser
+(formularios/renderers.py) sobre un árbol de formulario representativo.
+
+Uso:
+    python manage.py benchmark_json
+    python manage.py benchmark_json --paginas 20 --campos 50 --items 300 --repeticiones 100
+    python manage.py benchmark_json --formulario <uuid>   # árbol real desde la BD
+"""
+import datetime
+import io
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from formularios.renderers import HAS_ORJSON, OrjsonParser, OrjsonRenderer
+
+
+def _arbol_sintetico(n_paginas: int, n_campos: int, n_items: int) -> dict:
+    """Mismo formato que FormularioSerializer con ?expand=paginas (items embebidos)."""
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    paginas = []
+    for p in range(n_paginas):
+        campos = []
+        for c in range(n_campos):
+            clase = "dataset" if c % 10 == 0 else "text"
+            config = {"placeholder": f"Campo {c}", "max": Decimal("99.50")}
+            if clase == "dataset":
+                config["dataset"] = {"fuente_id": uuid.uuid4(), "mode": "pair", "label_column": "nombre"}
+                config["items"] = [{"key": str(i), "label": f"Opción {i} ñandú"} for i in range(n_items)]
+            campos.append({
+                "id_campo": uuid.uuid4(),
+                "sequence": c + 1,
+                "nombre_campo": f"campo_{p}_{c}",
+                "etiqueta": f"Campo {c}",
+                "clase": clase,
+                "tipo": "texto",
+                "requerido": c % 3 == 0,
+                "config": config,
+            })
+        paginas.append({
+            "id_pagina": uuid.uuid4(),
+            "secuencia": p + 1,
+            "nombre": f"Página {p}",
+            "descripcion": "",
+            "campos": campos,
+        })
+    return {
+        "id": uuid.uuid4(),
+        "nombre": "Benchmark",
+        "disponible_desde_fecha": ahora.date(),
+        "disponible_hasta_fecha": ahora.date(),
+        "fecha_creacion": ahora,
+        "paginas": paginas,
+    }
+
+
+def _arbol_real(formulario_id) -> dict:
+    from formularios.form_tree import subquery_version_actual
+    from formularios.models import Formulario
+    from formularios.serializers import FormularioSerializer
+
+    form = (Formulario.objects
+            .select_related("categoria")
+            .annotate(version_actual_id=subquery_version_actual())
+            .filter(pk=formulario_id)
+            .first())
+    if form is None:
+        raise CommandError(f"Formulario {formulario_id} no existe.")
+    return FormularioSerializer(form).data
+
+
+def _medir(fn, repeticiones: int) -> float:
+    """Mejor tiempo (ms) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000
+
+
+class Command(BaseCommand):
+    help = "Compara el renderer/parser JSON de DRF contra el de orjson sobre un árbol de formulario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paginas", type=int, default=10)
+        parser.add_argument("--campos", type=int, default=40)
+        parser.add_argument("--items", type=int, default=300)
+        parser.add_argument("--repeticiones", type=int, default=50)
+        parser.add_argument("--formulario", help="UUID de un formulario real (ignora el árbol sintético)")
+
+    def handle(self, *args, **opts):
+        if not HAS_ORJSON:
+            raise CommandError("orjson no está instalado: no hay nada que comparar.")
+
+        if opts["formulario"]:
+            data = _arbol_real(opts["formulario"])
+        else:
+            data = _arbol_sintetico(opts["paginas"], opts["campos"], opts["items"])
+        rep = max(1, opts["repeticiones"])
+
+        # 1) Render
+        drf_bytes = JSONRenderer().render(data)
+        orj_bytes = OrjsonRenderer().render(data)
+        t_drf = _medir(lambda: JSONRenderer().render(data), rep)
+        t_orj = _medir(lambda: OrjsonRenderer().render(data), rep)
+
+        # 2) Parse (del mismo payload)
+        p_drf = _medir(lambda: JSONParser().parse(io.BytesIO(drf_bytes)), rep)
+        p_orj = _medir(lambda: OrjsonParser().parse(io.BytesIO(drf_bytes)), rep)
+
+        self.stdout.write(f"Payload: {len(drf_bytes) / 1024:.1f} KiB (DRF) / {len(orj_bytes) / 1024:.1f} KiB (orjson)")
+        self.stdout.write(f"{'':10}{'DRF (ms)':>12}{'orjson (ms)':>14}{'x':>8}")
+        for nombre, a, b in (("render", t_drf, t_orj), ("parse", p_drf, p_orj)):
+            self.stdout.write(f"{nombre:10}{a:12.2f}{b:14.2f}{a / b if b else 0:8.1f}")
@@ -0,0 +1,167 @@
+# purgar_eliminados.py
+"""
+Purga en segundo plano lo que los DELETE de la API solo marcaron con
+borrado lógico (eliminado_en):
+
+  - Formulario: campos (con grupos, membresías y catálogos), PaginaVersion,
+    páginas y sus punteros, versiones (historial y snapshots) y al final la
+    fila del formulario (asignaciones y borrador en cascada). Si entre el
+    DELETE y la purga llegaron respuestas (dispositivos con el formulario ya
+    descargado) no se toca: sus versiones siguen referenciadas y se reporta.
+  - FuenteDatos: catálogos que aún la referencien, el blob en Azure y la
+    fila. Si el blob no se puede borrar se anota el intento y la fuente se
+    reintenta en la próxima ejecución (hasta --max-intentos).
+
+Cada lote es su propia transacción corta, acotada por --batch-size, así que
+nunca se sostienen locks largos. El formulario se borra al final: si se
+interrumpe, basta con volver a ejecutarlo.
+
+Uso:
+    python manage.py purgar_eliminados --dry-run
+    python manage.py purgar_eliminados --batch-size 500 --max-intentos 5
+"""
+from collections import Counter
+from typing import Optional
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from formularios import services
+from formularios.azure_storage import AzureBlobStorageService
+from formularios.lotes import pks_en_lotes, trozos
+from formularios.models import (
+    Formulario,
+    Formulario_Index_Version,
+    FormularioEntry,
+    FormularioIndexVersion,
+    FuenteDatos,
+    FuenteDatosValor,
+    Pagina,
+    Pagina_Index_Version,
+    PaginaCampo,
+    PaginaVersion,
+)
+
+
+def _borrar(qs, filas: Counter) -> None:
+    with transaction.atomic():
+        _, por_modelo = qs.delete()
+    filas.update(por_modelo)
+
+
+def purgar_formulario(formulario_id, batch_size: int) -> Optional[Counter]:
+    """
+    Borra un formulario con borrado lógico, tabla por tabla y en lotes.
+    Devuelve None (sin borrar nada) si tiene respuestas.
+    """
+    if FormularioEntry.objects.filter(form_id=formulario_id).exists():
+        return None
+    filas = Counter()
+    fiv_ids = list(Formulario_Index_Version.objects
+                   .filter(id_formulario_id=formulario_id)
+                   .values_list("id_index_version_id", flat=True))
+    page_ids = list(Pagina_Index_Version.objects
+                    .filter(id_index_version_id__in=fiv_ids)
+                    .values_list("id_pagina_id", flat=True))
+    pv_ids = list(PaginaVersion.objects
+                  .filter(id_pagina_id__in=page_ids)
+                  .values_list("pk", flat=True))
+    campo_ids = list(PaginaCampo.objects
+                     .filter(id_pagina_version_id__in=pv_ids)
+                     .values_list("id_campo_id", flat=True))
+
+    # 1) Campos de sus PaginaVersion (+ PaginaCampo, Grupo, CampoGrupo y catálogos)
+    for ids in trozos(campo_ids, batch_size):
+        with transaction.atomic():
+            filas.update(services.eliminar_campos(ids))
+    # 2) PaginaVersion
+    for ids in trozos(pv_ids, batch_size):
+        _borrar(PaginaVersion.objects.filter(pk__in=ids), filas)
+    # 3) Punteros página ↔ versión y páginas
+    for ids in trozos(page_ids, batch_size):
+        _borrar(Pagina_Index_Version.objects.filter(id_pagina_id__in=ids), filas)
+        _borrar(Pagina.objects.filter(pk__in=ids), filas)
+    # 4) Versiones (historial y snapshots en cascada)
+    for ids in trozos(fiv_ids, batch_size):
+        _borrar(FormularioIndexVersion.objects.filter(pk__in=ids), filas)
+    # 5) El formulario, solo si sigue marcado
+    _borrar(Formulario.todos.filter(pk=formulario_id, eliminado_en__isnull=False), filas)
+    return filas
+
+
+def purgar_fuente(fuente: FuenteDatos, batch_size: int, storage) -> bool:
+    """Catálogos → blob → fila. Devuelve False si el blob no se pudo borrar."""
+    filas = Counter()
+    for ids in pks_en_lotes(FuenteDatosValor.objects.filter(fuente_id=fuente.pk), batch_size):
+        _borrar(FuenteDatosValor.objects.filter(pk__in=ids), filas)
+    if fuente.blob_name and not storage.delete_file(fuente.blob_name):
+        FuenteDatos.todos.filter(pk=fuente.pk).update(
+            purga_intentos=F("purga_intentos") + 1,
+            purga_error=f"No se pudo eliminar el blob '{fuente.blob_name}'.",
+        )
+        return False
+    _borrar(FuenteDatos.todos.filter(pk=fuente.pk, eliminado_en__isnull=False), filas)
+    return True
+
+
+class Command(BaseCommand):
+    help = "Purga en lotes los formularios y fuentes de datos con borrado lógico (reintenta los blobs fallidos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-intentos", type=int, default=10,
+            help="Fuentes cuyo blob falló esta cantidad de veces se dejan de reintentar.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Solo lista lo pendiente.")
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, opts["batch_size"])
+        formularios = Formulario.todos.filter(eliminado_en__isnull=False).order_by("eliminado_en")
+        fuentes = (FuenteDatos.todos
+                   .filter(eliminado_en__isnull=False, purga_intentos__lt=opts["max_intentos"])
+                   .order_by("eliminado_en"))
+
+        if opts["dry_run"]:
+            con_respuestas = formularios.filter(
+                pk__in=FormularioEntry.objects.values("form_id")
+            ).count()
+            self.stdout.write(f"Formularios por purgar: {formularios.count() - con_respuestas}")
+            self.stdout.write(f"Formularios con respuestas (no se purgan): {con_respuestas}")
+            self.stdout.write(f"Fuentes de datos por purgar: {fuentes.count()}")
+            return
+
+        # 1) Formularios
+        filas = Counter()
+        n_formularios = n_con_respuestas = 0
+        for fid in list(formularios.values_list("pk", flat=True)):
+            borradas = purgar_formulario(fid, batch_size)
+            if borradas is None:
+                n_con_respuestas += 1
+                self.stderr.write(f"Formulario {fid}: tiene respuestas; no se purga.")
+                continue
+            filas.update(borradas)
+            n_formularios += 1
+        for label, n in sorted(filas.items()):
+            self.stdout.write(f"Borradas: {n} filas de {label}")
+
+        # 2) Fuentes de datos (el cliente de Azure solo si hay algo que borrar)
+        ok = fallidas = 0
+        pendientes = list(fuentes)
+        if pendientes:
+            storage = AzureBlobStorageService()
+            for fuente in pendientes:
+                if purgar_fuente(fuente, batch_size, storage):
+                    ok += 1
+                else:
+                    fallidas += 1
+                    self.stderr.write(f"Fuente {fuente.pk}: no se pudo eliminar el blob '{fuente.blob_name}'; se reintentará.")
+        agotadas = FuenteDatos.todos.filter(eliminado_en__isnull=False, purga_intentos__gte=opts["max_intentos"]).count()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Formularios purgados: {n_formularios}"
+            + (f" (con respuestas, sin purgar: {n_con_respuestas})" if n_con_respuestas else "")
+            + f". Fuentes purgadas: {ok}, con error: {fallidas}"
+            + (f", sin más reintentos: {agotadas}" if agotadas else "") + "."
+        ))
@@ -0,0 +1,183 @@
+# purgar_versiones.py
+"""
+Elimina versiones que ya no referencia nadie y que superan la ventana de
+retención:
+
+  - PaginaVersion sin PaginaCampo (los campos se MUEVEN a la versión nueva,
+    así que cada edición deja la anterior vacía) que no sea la vigente de su
+    página.
+  - FormularioIndexVersion que no sea la vigente de su formulario, sin páginas
+    apuntándole y sin respuestas (FormularioEntry.index_version_id). Arrastra
+    en cascada su fila de historial.
+
+Las versiones con FormularioSnapshot (historial de /versiones y base de
+/diff?desde=) tienen su propia retención, --dias-snapshots /
+FORM_SNAPSHOT_RETENTION_DAYS (por defecto igual a --dias y nunca menor):
+vencida, la versión se purga y su snapshot cae en cascada. Las referenciadas
+por respuestas o por el puntero vigente se conservan siempre.
+
+Trabaja en lotes por PK, cada uno en su propia transacción: si se interrumpe,
+basta con volver a ejecutarlo (lo ya borrado no vuelve a aparecer).
+
+Uso:
+    python manage.py purgar_versiones --dry-run
+    python manage.py purgar_versiones --dias 180 --batch-size 500
+    python manage.py purgar_versiones --dias 90 --dias-snapshots 365
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from formularios.lotes import pks_en_lotes
+from formularios.models import (
+    Formulario,
+    Formulario_Index_Version,
+    FormularioEntry,
+    FormularioIndexVersion,
+    FormularioSnapshot,
+    Pagina,
+    Pagina_Index_Version,
+    PaginaCampo,
+    PaginaVersion,
+)
+
+
+def paginas_version_purgables(corte):
+    return (PaginaVersion.objects
+            .filter(fecha_creacion__lt=corte)
+            .exclude(Exists(PaginaCampo.objects.filter(id_pagina_version=OuterRef("pk"))))
+            .exclude(Exists(Pagina.objects.filter(current_pagina_version=OuterRef("pk")))))
+
+
+def _versiones_sin_referencias(corte):
+    return (FormularioIndexVersion.objects
+            .filter(fecha_creacion__lt=corte)
+            .exclude(Exists(Formulario.todos.filter(current_index_version=OuterRef("pk"))))
+            .exclude(Exists(Pagina_Index_Version.objects.filter(id_index_version=OuterRef("pk"))))
+            .exclude(Exists(FormularioEntry.objects.filter(index_version_id=OuterRef("pk")))))
+
+
+def _snapshot_vigente(corte_snapshots):
+    """Condición 'tiene snapshot dentro de su retención'."""
+    return Q(Exists(FormularioSnapshot.objects.filter(id_index_version=OuterRef("pk"))),
+             fecha_creacion__gte=corte_snapshots)
+
+
+def versiones_purgables(corte, corte_snapshots=None):
+    """
+    Sin referencias y anteriores a `corte`. Las que tienen snapshot solo si
+    además son anteriores a `corte_snapshots` (por defecto, el mismo `corte`).
+    """
+    return _versiones_sin_referencias(corte).exclude(_snapshot_vigente(corte_snapshots or corte))
+
+
+def versiones_conservadas_por_snapshot(corte, corte_snapshots=None):
+    return _versiones_sin_referencias(corte).filter(_snapshot_vigente(corte_snapshots or corte))
+
+
+def _bytes_por_fila(model) -> float:
+    """Tamaño medio de fila (PostgreSQL: páginas de la tabla / filas estimadas); 0 en otros motores."""
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT pg_relation_size(c.oid)::float / GREATEST(c.reltuples, 1) FROM pg_class c WHERE c.oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cur.fetchone()
+    return row[0] if row and row[0] else 0.0
+
+
+def _formato_bytes(n: float) -> str:
+    for unidad in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024:
+            return f"{n:.1f} {unidad}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina PaginaVersion vacías y FormularioIndexVersion sin referencias más antiguas que la retención. "
+        "Las versiones con snapshot (historial y base de /diff) se purgan al vencer --dias-snapshots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias", type=int, default=getattr(settings, "FORM_VERSION_RETENTION_DAYS", 90),
+            help="Solo versiones creadas hace más de N días (por defecto FORM_VERSION_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--dias-snapshots", type=int, default=getattr(settings, "FORM_SNAPSHOT_RETENTION_DAYS", None),
+            help="Versiones con snapshot: se purgan (con su snapshot) las creadas hace más de N días; se pierde "
+                 "su entrada en /versiones y /diff?desde= responde 404 para ellas. Por defecto "
+                 "FORM_SNAPSHOT_RETENTION_DAYS o, si no está definido, --dias. Nunca menor que --dias.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta lo que se borraría.")
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, opts["batch_size"])
+        dry_run = opts["dry_run"]
+        dias = max(0, opts["dias"])
+        dias_snapshots = opts["dias_snapshots"] if opts["dias_snapshots"] is not None else dias
+        ahora = timezone.now()
+        corte = ahora - datetime.timedelta(days=dias)
+        corte_snapshots = ahora - datetime.timedelta(days=max(dias, dias_snapshots))
+
+        tamanos = {
+            m: _bytes_por_fila(m)
+            for m in (PaginaVersion, FormularioIndexVersion, Formulario_Index_Version)
+        }
+        filas = {m: 0 for m in tamanos}
+        bytes_snapshots = 0
+        n_snapshots = 0
+
+        # 1) PaginaVersion vacías
+        for ids in pks_en_lotes(paginas_version_purgables(corte), batch_size):
+            if dry_run:
+                filas[PaginaVersion] += len(ids)
+                continue
+            with transaction.atomic():
+                # el filtro se re-aplica al borrar por si alguna dejó de ser purgable
+                _, por_modelo = paginas_version_purgables(corte).filter(pk__in=ids).delete()
+            filas[PaginaVersion] += por_modelo.get(PaginaVersion._meta.label, 0)
+
+        # 2) FormularioIndexVersion sin referencias (+ historial, y snapshot si vence su retención)
+        for ids in pks_en_lotes(versiones_purgables(corte, corte_snapshots), batch_size):
+            snaps = (FormularioSnapshot.objects
+                     .filter(id_index_version_id__in=ids)
+                     .aggregate(n=Count("pk"), b=Sum(F("tamano") + F("tamano_gzip"))))
+            if dry_run:
+                filas[FormularioIndexVersion] += len(ids)
+                filas[Formulario_Index_Version] += Formulario_Index_Version.objects.filter(id_index_version_id__in=ids).count()
+                n_snapshots += snaps["n"] or 0
+                bytes_snapshots += snaps["b"] or 0
+                continue
+            with transaction.atomic():
+                _, por_modelo = versiones_purgables(corte, corte_snapshots).filter(pk__in=ids).delete()
+            filas[FormularioIndexVersion] += por_modelo.get(FormularioIndexVersion._meta.label, 0)
+            filas[Formulario_Index_Version] += por_modelo.get(Formulario_Index_Version._meta.label, 0)
+            n_snapshots += por_modelo.get(FormularioSnapshot._meta.label, 0)
+            bytes_snapshots += snaps["b"] or 0
+
+        # 3) Reporte
+        verbo = "Se borrarían" if dry_run else "Borradas"
+        total = bytes_snapshots
+        for m, n in filas.items():
+            estimado = n * tamanos[m]
+            total += estimado
+            extra = f" (~{_formato_bytes(estimado)})" if tamanos[m] else ""
+            self.stdout.write(f"{verbo}: {n} filas de {m._meta.db_table}{extra}")
+        self.stdout.write(f"{verbo}: {n_snapshots} snapshots ({_formato_bytes(bytes_snapshots)} de JSON)")
+        self.stdout.write(
+            f"Conservadas por snapshot aún en retención: {versiones_conservadas_por_snapshot(corte, corte_snapshots).count()} versiones"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Espacio {'recuperable' if dry_run else 'recuperado'}: ~{_formato_bytes(total)} "
+            f"(versiones anteriores a {corte:%Y-%m-%d})."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0006_remove_paginaversion_formularios_index_v_1e54e0_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="formulario",
+            name="revision_contenido",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0007_formulario_revision_contenido"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="formulario",
+            name="current_index_version",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="formularios.formularioindexversion"),
+        ),
+        migrations.AddField(
+            model_name="pagina",
+            name="current_pagina_version",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="formularios.paginaversion"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0008_current_version_pointers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FormularioSnapshot",
+            fields=[
+                ("id_index_version", models.OneToOneField(db_column="id_index_version", on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="snapshot", serialize=False, to="formularios.formularioindexversion")),
+                ("revision_contenido", models.PositiveIntegerField(default=0)),
+                ("contenido", models.BinaryField()),
+                ("contenido_gzip", models.BinaryField()),
+                ("sha256", models.CharField(max_length=64)),
+                ("tamano", models.PositiveIntegerField(default=0)),
+                ("tamano_gzip", models.PositiveIntegerField(default=0)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+                ("id_formulario", models.ForeignKey(db_column="id_formulario", on_delete=django.db.models.deletion.CASCADE, related_name="snapshots", to="formularios.formulario")),
+            ],
+            options={
+                "db_table": "formularios_formulario_snapshot",
+                "indexes": [models.Index(fields=["id_formulario", "-fecha_creacion"], name="formularios_id_form_b03553_idx")],
+            },
+        ),
+    ]
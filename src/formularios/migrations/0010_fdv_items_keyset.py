@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:00
+
+from django.db import migrations, models
+
+
+def _crear_indice_prefijo(apps, schema_editor):
+    # Búsqueda por prefijo sin distinguir mayúsculas (label_text__istartswith
+    # genera UPPER(label_text) LIKE 'Q%'); solo PostgreSQL soporta el opclass.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS fdv_campo_label_prefix_idx "
+        "ON formularios_fuente_datos_valor (campo_id, UPPER(label_text) text_pattern_ops)"
+    )
+
+
+def _borrar_indice_prefijo(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS fdv_campo_label_prefix_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0009_formulario_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="formulariosnapshot",
+            name="formato",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name="fuentedatosvalor",
+            index=models.Index(fields=["campo", "label_text", "id"], name="fdv_campo_label_id_idx"),
+        ),
+        migrations.RunPython(_crear_indice_prefijo, _borrar_indice_prefijo),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0010_fdv_items_keyset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FormularioBorrador",
+            fields=[
+                ("id_formulario", models.OneToOneField(db_column="id_formulario", on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="borrador", serialize=False, to="formularios.formulario")),
+                ("operaciones", models.JSONField(default=list)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+                ("fecha_modificacion", models.DateTimeField(auto_now=True)),
+                ("version_base", models.ForeignKey(blank=True, db_column="version_base", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="formularios.formularioindexversion")),
+            ],
+            options={
+                "db_table": "formularios_formulario_borrador",
+            },
+        ),
+    ]
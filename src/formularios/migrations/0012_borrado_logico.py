@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("formularios", "0011_formulario_borrador"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="formulario",
+            name="eliminado_en",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="fuentedatos",
+            name="eliminado_en",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="fuentedatos",
+            name="purga_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="fuentedatos",
+            name="purga_intentos",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -74,6 +74,13 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         from .services import verify_password
         return verify_password(self.password, raw_password)
 
+class NoEliminadosManager(models.Manager):
+    """Oculta las filas con borrado lógico (eliminado_en); las purga `manage.py purgar_eliminados`."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado_en__isnull=True)
+
+
 class Formulario(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, blank=True)
@@ -103,6 +110,23 @@ class Formulario(models.Model):
     forma_envio = models.CharField(max_length=30, choices=ENVIO_CHOICES)
     es_publico = models.BooleanField(default=False)
     auto_envio = models.BooleanField(default=False)
+    # Se incrementa cuando cambia el esquema renderizado SIN publicar una versión
+    # nueva (ver schema_cache). Forma parte de la clave de caché.
+    revision_contenido = models.PositiveIntegerField(default=0)
+    # Puntero desnormalizado a la versión vigente; lo mantienen los servicios de
+    # versionado (ver versioning.registrar_version)
+    current_index_version = models.ForeignKey(
+        "FormularioIndexVersion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # Borrado lógico: oculto al instante, las filas se purgan en segundo plano
+    eliminado_en = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = NoEliminadosManager()
+    todos = models.Manager()
 
     class Meta:
         # managed = False
@@ -146,6 +170,68 @@ class Formulario_Index_Version(models.Model):
         # managed = False
         db_table = "formularios_formularios_index_version"
 
+class FormularioSnapshot(models.Model):
+    """
+    Esquema renderizado (JSON de páginas → campos) de una FormularioIndexVersion,
+    materializado al publicar la versión. Se sirve tal cual (o pre-comprimido).
+    """
+    id_index_version = models.OneToOneField(
+        FormularioIndexVersion,
+        on_delete=models.CASCADE,
+        db_column="id_index_version",
+        primary_key=True,
+        related_name="snapshot",
+    )
+    id_formulario = models.ForeignKey(
+        Formulario,
+        on_delete=models.CASCADE,
+        db_column="id_formulario",
+        related_name="snapshots",
+    )
+    revision_contenido = models.PositiveIntegerField(default=0)
+    formato = models.PositiveSmallIntegerField(default=1)  # form_tree.formato_esquema()
+    contenido = models.BinaryField()            # JSON UTF-8
+    contenido_gzip = models.BinaryField()
+    sha256 = models.CharField(max_length=64)
+    tamano = models.PositiveIntegerField(default=0)
+    tamano_gzip = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "formularios_formulario_snapshot"
+        indexes = [
+            models.Index(fields=["id_formulario", "-fecha_creacion"]),
+        ]
+
+class FormularioBorrador(models.Model):
+    """
+    Espacio de trabajo del diseñador: operaciones de changeset (changeset.py)
+    acumuladas sin publicar. No crea FormularioIndexVersion; al publicar se
+    aplican todas juntas como UNA versión nueva y el borrador se elimina.
+    """
+    id_formulario = models.OneToOneField(
+        Formulario,
+        on_delete=models.CASCADE,
+        db_column="id_formulario",
+        primary_key=True,
+        related_name="borrador",
+    )
+    # Versión vigente cuando se abrió el borrador (para detectar publicaciones en vivo)
+    version_base = models.ForeignKey(
+        FormularioIndexVersion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column="version_base",
+        related_name="+",
+    )
+    operaciones = models.JSONField(default=list)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "formularios_formulario_borrador"
+
 class Pagina(models.Model):
     id_pagina = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     # formulario_id = models.ForeignKey(
@@ -157,6 +243,14 @@ class Pagina(models.Model):
     secuencia = models.PositiveIntegerField(default=1)
     nombre = models.CharField(max_length=120)
     descripcion = models.TextField(blank=True)
+    # Puntero desnormalizado a la PaginaVersion vigente (ver versioning.crear_pagina_version)
+    current_pagina_version = models.ForeignKey(
+        "PaginaVersion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
 
     class Meta:
         ordering = ["secuencia"]
@@ -256,6 +350,13 @@ class FuenteDatos(models.Model):
     fecha_subida = models.DateTimeField(auto_now_add=True)
     activo = models.BooleanField(default=True)
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='fuentes_datos')
+    # Borrado lógico; la purga borra el blob (con reintentos) y después la fila
+    eliminado_en = models.DateTimeField(null=True, blank=True, db_index=True)
+    purga_intentos = models.PositiveIntegerField(default=0)
+    purga_error = models.TextField(blank=True, default="")
+
+    objects = NoEliminadosManager()
+    todos = models.Manager()
 
     class Meta:
         db_table = 'formularios_fuente_datos'
@@ -281,6 +382,8 @@ class FuenteDatosValor(models.Model):
         indexes = [
             models.Index(fields=["campo", "label_text"]),
             models.Index(fields=["campo", "key_text"]),
+            # keyset de /api/campos/{id}/items/ (ver dataset_items.py)
+            models.Index(fields=["campo", "label_text", "id"], name="fdv_campo_label_id_idx"),
         ]
         unique_together = (("campo", "key_text"),)
 
@@ -0,0 +1,115 @@
+# pagination.py
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination con posición compuesta: el cursor guarda los valores de
+    TODAS las columnas de `ordering` (no solo la primera) y cada página filtra
+    por la tupla completa (a > x) OR (a = x AND b > y) ... Con un desempate
+    único al final (p.ej. "id") no hay filas repetidas ni salteadas en el
+    borde de una página aunque la primera columna tenga duplicados.
+    Las columnas de `ordering` no pueden ser NULL.
+    """
+
+    def _get_position_from_instance(self, instance, ordering):
+        valores = []
+        for campo in ordering:
+            valor = getattr(instance, campo.lstrip("-"))
+            valores.append(None if valor is None else str(valor))
+        return json.dumps(valores, ensure_ascii=False, separators=(",", ":"))
+
+    def _filtro_posterior(self, position, reverse):
+        try:
+            valores = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condiciones = []
+        iguales = {}
+        for campo, valor in zip(self.ordering, valores):
+            nombre = campo.lstrip("-")
+            # (cursor invertido) XOR (columna descendente) → menor que
+            lookup = "__lt" if reverse != campo.startswith("-") else "__gt"
+            condiciones.append(Q(**iguales, **{nombre + lookup: valor}))
+            iguales[nombre] = valor
+        return reduce(or_, condiciones)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Mismo flujo que CursorPagination.paginate_queryset, con el filtro por
+        # posición compuesta; el offset siempre queda en 0 (posiciones únicas)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*(c[1:] if c.startswith("-") else "-" + c for c in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._filtro_posterior(current_position, reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class FormularioCursorPagination(KeysetCursorPagination):
+    """
+    Paginación por cursor para el listado de formularios.
+    No ejecuta COUNT(*): cada página es una sola consulta indexada.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = ("nombre", "id")
+
+
+class SnapshotCursorPagination(KeysetCursorPagination):
+    """Historial de snapshots de un formulario, del más reciente al más antiguo."""
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-fecha_creacion", "-pk")
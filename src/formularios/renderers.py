@@ -0,0 +1,129 @@
+# renderers.py
+"""
+Renderer y parser JSON para DRF basados en orjson, con la misma salida que
+JSONRenderer: datetimes UTC con "Z" (OPT_UTC_Z) y el resto de tipos no
+nativos (timedelta, Decimal, textos lazy, QuerySet, `tolist()`, ...) por
+rest_framework.utils.encoders.JSONEncoder. Lo que orjson no puede reproducir
+igual (indent distinto de 2, UNICODE_JSON/COMPACT_JSON desactivados, NaN o
+infinitos, floats en notación exponencial, enteros de más de 64 bits) se
+delega al JSONRenderer de DRF.
+
+Se activan en REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES" / "DEFAULT_PARSER_CLASSES"].
+Si orjson no está instalado caen al JSONRenderer/JSONParser de DRF, así que
+el setting es seguro en cualquier entorno.
+
+`dumps` / `loads` son los mismos helpers para el código que genera JSON
+fuera de DRF (snapshots, exportaciones).
+"""
+import json
+import math
+import re
+from typing import Any, Callable, Optional
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+# Mismas conversiones que el JSONRenderer de DRF para lo que orjson no
+# serializa de forma nativa. Decimal sale como número: los DecimalField ya lo
+# convierten a string según COERCE_DECIMAL_TO_STRING antes de llegar aquí.
+_default = JSONEncoder().default
+
+_OPCIONES = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if HAS_ORJSON else 0
+
+
+# Número que Python escribiría en notación exponencial ("1e+16", "1e-05") y
+# orjson no ("1e16", "0.00001"). Puede coincidir dentro de un string: solo
+# dispara la verificación de _difiere_de_drf.
+_NUMERO_EXPONENCIAL = re.compile(rb"[:,\[]\s*-?(?:\d+(?:\.\d+)?e|0\.0000)")
+
+
+def _difiere_de_drf(data) -> bool:
+    """
+    True si hay algún float que orjson no escribe como DRF: NaN/±inf (null)
+    o los que repr() pone en notación exponencial.
+    """
+    pendientes = [data]
+    while pendientes:
+        x = pendientes.pop()
+        if isinstance(x, float):
+            if not math.isfinite(x) or (x and not 1e-4 <= abs(x) < 1e16):
+                return True
+        elif isinstance(x, dict):
+            pendientes.extend(x.values())
+        elif isinstance(x, (list, tuple)):
+            pendientes.extend(x)
+    return False
+
+
+def dumps(obj: Any, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Serializa a JSON UTF-8 (bytes). `indent` = 2 espacios; `default` reemplaza
+    la conversión de tipos no soportados (p.ej. `str` en exportaciones).
+    Los escalares de numpy/pandas salen como números.
+    """
+    if HAS_ORJSON:
+        opts = _OPCIONES | orjson.OPT_INDENT_2 if indent else _OPCIONES
+        return orjson.dumps(obj, default=default or _default, option=opts)
+    return json.dumps(
+        obj, cls=JSONEncoder, ensure_ascii=False, default=default,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def loads(data) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+class OrjsonRenderer(JSONRenderer):
+    """
+    JSONRenderer con orjson y la misma salida byte a byte. Respeta `indent`
+    del Accept (p.ej. ?format=json; indent=4): orjson solo indenta con 2, el
+    resto lo resuelve el renderer de DRF.
+    """
+
+    def render(self, data, accepted_media_type: Optional[str] = None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not HAS_ORJSON or self.ensure_ascii or not self.compact or indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = dumps(data, indent=bool(indent))
+        except orjson.JSONEncodeError:
+            # enteros > 64 bits, time con zona, tipos desconocidos: mismo
+            # resultado (o mismo error) que DRF
+            return super().render(data, accepted_media_type, renderer_context)
+        if (b"null" in ret or _NUMERO_EXPONENCIAL.search(ret)) and _difiere_de_drf(data):
+            # NaN/inf (DRF los rechaza con STRICT_JSON) o floats exponenciales
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que DRF: U+2028/U+2029 escapados (JSON subconjunto estricto de JS)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class OrjsonParser(JSONParser):
+    renderer_class = OrjsonRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not HAS_ORJSON:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,122 @@
+# schema_cache.py
+"""
+Caché del esquema renderizado de un formulario (árbol de páginas → campos),
+indexado por FormularioIndexVersion.
+
+Cada edición publica una versión nueva (UUID nuevo), así que el contenido de
+una versión no cambia. Las pocas modificaciones que NO crean versión (p.ej.
+agregar página con ?bump=0, eliminar campo, rematerializar un dataset)
+incrementan Formulario.revision_contenido; la revisión se guarda junto al
+árbol y una entrada con otra revisión se trata como fallo de caché. Así el
+LRU en proceso de cada worker nunca sirve datos viejos aunque otro worker
+haya hecho la modificación.
+
+Niveles:
+  1) LRU en proceso (FORM_SCHEMA_CACHE_SIZE entradas)
+  2) Caché compartida de Django (FORM_SCHEMA_CACHE_ALIAS)
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .form_tree import formato_esquema
+
+_KEY_PREFIX = "form_schema"
+
+
+def _lru_size() -> int:
+    return int(getattr(settings, "FORM_SCHEMA_CACHE_SIZE", 256))
+
+
+def _shared_cache():
+    return caches[getattr(settings, "FORM_SCHEMA_CACHE_ALIAS", "default")]
+
+
+def _shared_timeout() -> Optional[int]:
+    # None = sin expiración (la versión es inmutable)
+    return getattr(settings, "FORM_SCHEMA_CACHE_TIMEOUT", None)
+
+
+def _key(version_id) -> str:
+    # incluye el formato del árbol: cambiarlo (p.ej. FORM_DATASET_ITEMS_INLINE)
+    # no debe servir entradas armadas con el formato anterior
+    return f"{_KEY_PREFIX}:v{formato_esquema()}:{str(version_id).replace('-', '')}"
+
+
+class _LRU:
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > _lru_size():
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = _LRU()
+
+
+def obtener_paginas(version_id, revision: int, construir: Callable[[], List[Any]]) -> List[Any]:
+    """
+    Devuelve el árbol de páginas de `version_id` para la `revision` dada.
+    Si no está en ningún nivel, lo construye con `construir()` y lo guarda.
+    El resultado es compartido: no debe mutarse.
+    """
+    key = _key(version_id)
+    revision = int(revision or 0)
+
+    hit = _local.get(key)
+    if hit is not None and hit[0] == revision:
+        return hit[1]
+
+    shared = _shared_cache().get(key)
+    if shared is not None and shared.get("revision") == revision:
+        _local.set(key, (revision, shared["paginas"]))
+        return shared["paginas"]
+
+    paginas = list(construir())
+    _local.set(key, (revision, paginas))
+    _shared_cache().set(key, {"revision": revision, "paginas": paginas}, _shared_timeout())
+    return paginas
+
+
+def invalidar(version_id) -> None:
+    """Elimina la versión de ambos niveles (solo el LRU de ESTE proceso)."""
+    key = _key(version_id)
+    _local.pop(key)
+    _shared_cache().delete(key)
+
+
+def invalidar_al_confirmar(*version_ids) -> None:
+    """Invalida después del COMMIT, para no re-cachear datos previos a la transacción."""
+    ids = [v for v in version_ids if v]
+    if not ids:
+        return
+
+    def _do():
+        for v in ids:
+            invalidar(v)
+
+    transaction.on_commit(_do)
@@ -1,11 +1,14 @@
 # serializers.py
 import json
-from .services import _uuid32_no_dashes, fetch_items_from_fdv_by_campo, hash_password
+import logging
+from .services import _uuid32_no_dashes, hash_password
+from .form_tree import cargar_campos_por_pagina
+from . import schema_cache, snapshots
 from rest_framework import serializers
 from rest_framework.response import Response
 from rest_framework import status
 from .models import (
-    Campo, Categoria, Formulario, FormularioIndexVersion, 
+    Campo, Categoria, Formulario, FormularioBorrador, FormularioIndexVersion, FormularioSnapshot,
     FuenteDatos, FuenteDatosValor, Grupo, Pagina, 
     Pagina_Index_Version, PaginaCampo, PaginaVersion, 
     UserFormulario, Usuario, Formulario_Index_Version
@@ -13,6 +16,8 @@ from .models import (
 from django.db import models
 from django.db.models import Q
 
+logger = logging.getLogger(__name__)
+
 class GrupoSerializer(serializers.ModelSerializer):
     id_campo_group = serializers.CharField(source="id_campo_group_id", read_only=True)
 
@@ -200,144 +205,107 @@ class PaginaConCamposSerializer(PaginaSerializer):
         fields = PaginaSerializer.Meta.fields + ("campos",)
 
     def get_campos(self, obj):
-        # 1) Tomar la última versión de la página (por fecha)
-        pv = (PaginaVersion.objects
-            .filter(id_pagina=obj)
-            .order_by("-fecha_creacion")
-            .first())
-        if not pv:
-            return []
-
-        # 2) Traer links usando FK (puedes pasar el objeto o _id)
-        links = (PaginaCampo.objects
-                .filter(id_pagina_version=pv)
-                .select_related("id_campo")
-                .order_by("sequence"))
-
-        import json
-        from .models import Grupo, CampoGrupo
-
-        def _cfg_dict(cfg):
-            if isinstance(cfg, dict):
-                return cfg
-        # si es str, intenta parsear, si falla -> {}
-            if isinstance(cfg, str):
-                try:
-                    return json.loads(cfg)
-                except Exception:
-                    return {}
-            return {}
-
-        out = []
-        for l in links:
-            c = l.id_campo
-            cfg = _cfg_dict(c.config)
-            d = {
-                "id_campo": str(c.id_campo),
-                "sequence": l.sequence,
-                "nombre_campo": c.nombre_campo,
-                "etiqueta": c.etiqueta,
-                "clase": c.clase,
-                "tipo": c.tipo,
-                "requerido": c.requerido,
-                "config": cfg,
-            }
-            if (c.clase or "").lower() == "dataset":
-                # Soporta tanto config plano como anidado bajo 'dataset'
-                ds = cfg.get("dataset") or {}
-                # parámetros opcionales
-                fuente_id = ds.get("fuente_id")  # si lo guardas en config, se respeta
-                label_col = ds.get("label_column") or ds.get("column")
-                mode = (ds.get("mode") or "pair").lower()          # "pair" o "list"
-                cache_inline = bool(ds.get("cache_inline", True))
-                max_items = ds.get("max_items_inline", 300)
-
-                if cache_inline:
-                    items_pair = fetch_items_from_fdv_by_campo(
-                        campo_id=str(c.id_campo),
-                        label_column=label_col,
-                        fuente_id=fuente_id,
-                        limit=max_items,
-                    )
-
-                    if mode == "pair":
-                        # [{"key": "...", "label": "..."}]
-                        cfg["items"] = items_pair
-                    else:
-                        # ["label1", "label2", ...]
-                        cfg["items"] = [it["label"] for it in items_pair if it.get("label")]
-
-                # reinyecta dataset normalizado (por si hiciste cambios)
-                cfg["dataset"] = ds
-
-            # finalmente
-            d["config"] = cfg
-            out.append(d)
-
-        # --- grupos (igual que antes, pero sin tocar id_pagina_version como texto)
-        index = {d["id_campo"]: d for d in out}
-        seq_by_campo = {d["id_campo"]: d.get("sequence", 10**9) for d in out}
-        child_ids = set()
-
-        for d in out:
-            if (d.get("clase") or "").lower() != "group":
-                continue
-
-            try:
-                g = Grupo.objects.get(id_campo_group_id=d["id_campo"])
-            except Grupo.DoesNotExist:
-                d["children"] = []
-                continue
-
-            miembros_ids = list(
-                CampoGrupo.objects
-                .filter(id_grupo=g)
-                .values_list("id_campo_id", flat=True)
-            )
-            hijos = [index[cid] for cid in map(str, miembros_ids) if cid in index]
-            hijos.sort(key=lambda h: seq_by_campo.get(h["id_campo"], 10**9))
-            d["children"] = hijos
-            child_ids.update([h["id_campo"] for h in hijos])
+        # El árbol completo de un formulario viene precargado en el contexto
+        # (ver FormularioSerializer.get_paginas); para una página suelta se
+        # carga aquí con el mismo cargador de consultas constantes.
+        campos_por_pagina = self.context.get("campos_por_pagina")
+        if campos_por_pagina is None:
+            campos_por_pagina = cargar_campos_por_pagina([obj])
+        return campos_por_pagina.get(obj.pk, [])
+
+class CamposDinamicosMixin:
+    """
+    Permite proyectar un serializer:
+      - fields: iterable con los nombres a devolver (None = todos)
+      - expand: iterable con los campos costosos (Meta.expandibles) a incluir;
+                los expandibles se omiten si no se piden explícitamente.
+    """
 
-        if child_ids:
-            out = [d for d in out if d["id_campo"] not in child_ids]
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        expand = kwargs.pop("expand", None)
+        super().__init__(*args, **kwargs)
 
-        return out
+        if expand is not None:
+            for nombre in set(getattr(self.Meta, "expandibles", ())) - set(expand):
+                self.fields.pop(nombre, None)
+        if fields is not None:
+            for nombre in set(self.fields) - set(fields):
+                self.fields.pop(nombre, None)
 
-class FormularioSerializer(serializers.ModelSerializer):
+class FormularioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     categoria_nombre = serializers.SerializerMethodField()
     paginas = serializers.SerializerMethodField()
 
     class Meta:
         model = Formulario
-        fields = "__all__"
+        # eliminado_en solo lo escriben destroy/bulk y lo consume purgar_eliminados
+        exclude = ("eliminado_en",)
+        read_only_fields = ("revision_contenido", "current_index_version")
+        expandibles = ("paginas",)
 
     def get_categoria_nombre(self, obj):
         return obj.categoria.nombre if obj.categoria else None
 
     def get_paginas(self, obj):
-        # 1) Última versión por fecha de creación
-        link = (
-            Formulario_Index_Version.objects
-            .filter(id_formulario=obj)
-            .select_related("id_index_version")
-            .order_by("-id_index_version__fecha_creacion")
-            .first()
-        )
-        if not link:
+        # 1) Versión vigente: anotada por la vista, o el puntero current_index_version
+        #    (el historial por fecha solo si el puntero aún no está poblado)
+        if hasattr(obj, "version_actual_id"):
+            last_version_id = obj.version_actual_id
+        elif obj.current_index_version_id:
+            last_version_id = obj.current_index_version_id
+        else:
+            link = (
+                Formulario_Index_Version.objects
+                .filter(id_formulario=obj)
+                .order_by("-id_index_version__fecha_creacion")
+                .first()
+            )
+            last_version_id = link.id_index_version_id if link else None
+        if not last_version_id:
             return []
 
-        last_version = link.id_index_version  # instancia de FormularioIndexVersion
+        # 2) Árbol de páginas cacheado por versión (+ revisión de contenido);
+        #    detrás de la caché, el snapshot materializado de la versión
+        return schema_cache.obtener_paginas(
+            last_version_id,
+            obj.revision_contenido,
+            lambda: snapshots.paginas_vigentes(obj, last_version_id),
+        )
+
+class FormularioSnapshotSerializer(serializers.ModelSerializer):
+    """Metadatos de un snapshot (sin el contenido)."""
+    fecha_version = serializers.DateTimeField(source="id_index_version.fecha_creacion", read_only=True)
+    vigente = serializers.SerializerMethodField()
 
-        # 2) Todas las páginas enlazadas a esa versión
-        page_ids = (
-            Pagina_Index_Version.objects
-            .filter(id_index_version=last_version)
-            .values_list("id_pagina", flat=True)
+    class Meta:
+        model = FormularioSnapshot
+        fields = (
+            "id_index_version", "fecha_version", "vigente", "revision_contenido",
+            "sha256", "tamano", "tamano_gzip", "fecha_creacion",
         )
 
-        qs = Pagina.objects.filter(id_pagina__in=list(page_ids)).order_by("secuencia")
-        return PaginaConCamposSerializer(qs, many=True, context=self.context).data
+    def get_vigente(self, obj):
+        return str(obj.id_index_version_id) == str(self.context.get("version_vigente"))
+
+class FormularioBorradorSerializer(serializers.ModelSerializer):
+    """Borrador de un formulario (operaciones de changeset pendientes de publicar)."""
+    total_operaciones = serializers.SerializerMethodField()
+    desactualizado = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FormularioBorrador
+        fields = (
+            "id_formulario", "version_base", "desactualizado", "total_operaciones",
+            "operaciones", "fecha_creacion", "fecha_modificacion",
+        )
+
+    def get_total_operaciones(self, obj) -> int:
+        return len(obj.operaciones or [])
+
+    def get_desactualizado(self, obj) -> bool:
+        # hubo publicaciones en vivo desde que se abrió el borrador
+        return obj.version_base_id != obj.id_formulario.current_index_version_id
 
 class UsuarioDetalleSerializer(serializers.ModelSerializer):
     # usuario = UsuarioCreateSerializer(many=True, read_only=True)
@@ -489,7 +457,7 @@ class CampoUpdateSerializer(serializers.ModelSerializer):
         2. Procesa el config (merge o replace según query param)
         3. Guarda los cambios en el campo
         4. Identifica todas las páginas que contienen este campo
-        5. Crea una nueva versión para cada página afectada
+        5. Crea una nueva versión por página afectada y UNA por formulario
         
         Args:
             instance: La instancia de Campo a actualizar
@@ -556,14 +524,15 @@ class CampoUpdateSerializer(serializers.ModelSerializer):
             
             # La función versionar_paginas_por_campo se encarga de:
             # - Encontrar todas las páginas que tienen este campo
-            # - Crear una nueva PaginaVersion para cada una
-            # - Copiar todos los campos de la versión anterior
-            versiones_creadas = versionar_paginas_por_campo(instance, usuario)
+            # - Crear una nueva PaginaVersion para cada una (moviendo sus campos)
+            # - Publicar UNA versión nueva por formulario afectado
+            reporte = versionar_paginas_por_campo(instance, usuario)
             
-            # Log opcional (puedes comentar esto en producción)
-            if versiones_creadas:
-                print(f"✓ Campo '{instance.nombre_campo}' actualizado")
-                print(f"✓ Se versionaron {len(versiones_creadas)} página(s) afectada(s)")
+            for r in reporte:
+                logger.info(
+                    "Campo %s actualizado: formulario %s, versión %s -> %s (%d página(s))",
+                    instance.pk, r["formulario_id"], r["version_anterior"], r["nueva_version_id"], len(r["paginas"]),
+                )
         
         return instance
 
@@ -594,6 +563,91 @@ class FormularioUpdateSerializer(serializers.ModelSerializer):
             )
         return attrs
 
+class CambiosFormularioSerializer(serializers.Serializer):
+    """Lote de operaciones para /api/formularios/{id}/cambios/ (ver changeset.py)."""
+    operaciones = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    version_base = serializers.UUIDField(required=False, help_text="current_index_version en la que se basa el lote (409 si cambió)")
+
+    def validate_operaciones(self, value):
+        from .changeset import max_operaciones
+        if len(value) > max_operaciones():
+            raise serializers.ValidationError(f"Máximo {max_operaciones()} operaciones por lote.")
+        return value
+
+class FormularioImportSerializer(serializers.ModelSerializer):
+    """
+    Entrada de /api/formularios/import/: el mismo JSON que emite
+    FormularioSerializer (?expand=paginas). `categoria` se resuelve por id o,
+    si no existe en este entorno, por `categoria_nombre`.
+    """
+    categoria = serializers.UUIDField(required=False, allow_null=True)
+    categoria_nombre = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    paginas = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    class Meta:
+        model = Formulario
+        fields = (
+            "categoria",
+            "categoria_nombre",
+            "nombre",
+            "descripcion",
+            "permitir_fotos",
+            "permitir_gps",
+            "disponible_desde_fecha",
+            "disponible_hasta_fecha",
+            "periodicidad",
+            "estado",
+            "forma_envio",
+            "es_publico",
+            "auto_envio",
+            "paginas",
+        )
+
+    def validate(self, attrs):
+        d = attrs.get("disponible_desde_fecha")
+        h = attrs.get("disponible_hasta_fecha")
+        if d and h and d > h:
+            raise serializers.ValidationError(
+                {"disponible_hasta_fecha": "Debe ser >= disponible_desde_fecha"}
+            )
+        return attrs
+
+class CamposBulkSerializer(serializers.Serializer):
+    """Campos para /api/paginas/{id}/campos/bulk/; cada uno con el formato de CrearCampoEnPaginaSerializer."""
+    campos = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    version_base = serializers.UUIDField(required=False, help_text="current_index_version en la que se basa el alta (409 si cambió)")
+
+    def validate_campos(self, value):
+        from .changeset import max_operaciones
+        if len(value) > max_operaciones():
+            raise serializers.ValidationError(f"Máximo {max_operaciones()} campos por lote.")
+        return value
+
+class ReordenarSerializer(serializers.Serializer):
+    """
+    Orden completo para /api/paginas/{id}/reordenar/: `campos` (ids de la
+    página) y/o `paginas` (ids de las páginas de su formulario).
+    """
+    campos = serializers.ListField(child=serializers.UUIDField(format="hex_verbose"), required=False, allow_empty=False)
+    paginas = serializers.ListField(child=serializers.UUIDField(format="hex_verbose"), required=False, allow_empty=False)
+    version_base = serializers.UUIDField(required=False, help_text="current_index_version en la que se basa el orden (409 si cambió)")
+
+    def validate(self, attrs):
+        if not attrs.get("campos") and not attrs.get("paginas"):
+            raise serializers.ValidationError("Enviar `campos` y/o `paginas`.")
+        return attrs
+
+class FormulariosBulkSerializer(serializers.Serializer):
+    """Ids para /api/formularios/bulk/suspender/ y /bulk/eliminar/."""
+    ids = serializers.ListField(child=serializers.UUIDField(format="hex_verbose"), allow_empty=False)
+
+    def validate_ids(self, value):
+        from .changeset import max_operaciones
+        value = list(dict.fromkeys(value))
+        if len(value) > max_operaciones():
+            raise serializers.ValidationError(f"Máximo {max_operaciones()} formularios por lote.")
+        return value
+
 class UsuarioAsignarFormulariosSerializer(serializers.Serializer):
     formularios = serializers.ListField(
         child=serializers.UUIDField(format="hex_verbose"),
@@ -4,6 +4,7 @@ from io import BytesIO
 import json
 import uuid
 from django.db import transaction, connection
+from django.db.models import Count, F
 
 from django.apps import apps
 from typing import Dict, Any
@@ -18,10 +19,12 @@ from typing import List, Dict, Any, Optional
 import pandas as pd
 
 from formularios.azure_storage import AzureBlobStorageService
+from formularios import schema_cache, snapshots, versioning
 
 from .models import (
     Formulario,
     Formulario_Index_Version,
+    FormularioEntry,
     FormularioIndexVersion,
     FuenteDatos,
     FuenteDatosValor,
@@ -73,6 +76,9 @@ def activar_version(formulario, nueva_version) -> None:
         id_index_version=nueva_version,                 
         defaults={"id_formulario": formulario},
     )
+    Formulario.objects.filter(pk=formulario.pk).update(current_index_version=nueva_version)
+    schema_cache.invalidar_al_confirmar(getattr(nueva_version, "pk", nueva_version))
+    snapshots.materializar_al_confirmar(formulario.pk)
 
     try:
         FormularioIndex = apps.get_model("formularios", "FormularioIndex")
@@ -118,12 +124,6 @@ _CLASE_A_TIPO = {
 def _resolver_tipo_por_clase(clase: str) -> str:
     return _CLASE_A_TIPO.get((clase or "").strip().lower(), "texto")
 
-def _ultima_pagina_version(pagina: Pagina) -> PaginaVersion | None:
-    return (PaginaVersion.objects
-            .filter(id_pagina=pagina)
-            .order_by("-fecha_creacion")
-            .first())
-
 @transaction.atomic
 def crear_campo_y_versionar_pagina(pagina: Pagina, data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -175,23 +175,17 @@ def crear_campo_y_versionar_pagina(pagina: Pagina, data: Dict[str, Any]) -> Dict
     if not f_link:
         raise ValidationError("No se pudo resolver el formulario para la versión actual de la página.")
     formulario = f_link.id_formulario
+    versioning.bloquear([formulario.pk])
+    pagina.refresh_from_db(fields=["current_pagina_version"])
 
-    # 4) Crear NUEVA FormularioIndexVersion (publicación v+1)
-    fiv_nueva = FormularioIndexVersion.objects.create()
-    Formulario_Index_Version.objects.get_or_create(
-        id_index_version=fiv_nueva,
-        defaults={"id_formulario": formulario},
-    )
+    # 4) Publicar v+1: nueva FormularioIndexVersion + punteros de TODAS las páginas
+    fiv_nueva = versioning.publicar_version(formulario, fiv_actual)
 
     # 5) Obtener la última versión de la página para calcular sequence
-    prev_pv = _ultima_pagina_version(pagina)
+    prev_pv = versioning.pagina_version_vigente(pagina)
     
     # 6) Crear la NUEVA PaginaVersion
-    nueva_pv = PaginaVersion.objects.create(
-        id_pagina_version=uuid.uuid4().hex,
-        fecha_creacion=timezone.now(),
-        id_pagina=pagina,
-    )
+    nueva_pv = versioning.crear_pagina_version(pagina)
 
     # 7) MOVER (no copiar) los campos de la versión anterior a la nueva
     # Esto es CRÍTICO: como id_campo es PK, debemos mover en lugar de copiar
@@ -223,16 +217,6 @@ def crear_campo_y_versionar_pagina(pagina: Pagina, data: Dict[str, Any]) -> Dict
         sequence=sequence,
     )
 
-    # 10) Actualizar punteros de TODAS las páginas del formulario a la nueva versión
-    paginas_del_form = (Pagina_Index_Version.objects
-                        .filter(id_index_version=fiv_actual)
-                        .values_list("id_pagina", flat=True))
-    for pid in paginas_del_form:
-        Pagina_Index_Version.objects.update_or_create(
-            id_pagina_id=pid,
-            defaults={"id_index_version": fiv_nueva},
-        )
-
     return {
         "campo_id": str(campo.id_campo),
         "formulario_id": str(formulario.id),
@@ -244,99 +228,33 @@ def crear_campo_y_versionar_pagina(pagina: Pagina, data: Dict[str, Any]) -> Dict
 
 
 @transaction.atomic
-def versionar_paginas_por_campo(campo: Campo, usuario=None) -> List[PaginaVersion]:
+def versionar_paginas_por_campo(campo: Campo, usuario=None) -> List[Dict[str, Any]]:
     """
-    Crea una nueva versión para TODAS las páginas que contienen un campo específico.
+    Versiona TODAS las páginas que contienen un campo específico.
     
     Se usa cuando se actualiza un campo existente (etiqueta, ayuda, config, etc.)
     para reflejar el cambio en todas las páginas que usan ese campo.
     
-    IMPORTANTE: Como id_campo es PRIMARY KEY en PaginaCampo, debemos MOVER
-    los campos entre versiones en lugar de copiarlos.
+    Las páginas se agrupan por formulario: cada página recibe su PaginaVersion
+    nueva (los PaginaCampo se MUEVEN en un solo UPDATE) y cada formulario
+    afectado publica UNA sola versión nueva (ver versioning.versionar_paginas).
     
     Args:
         campo: El campo que fue modificado
         usuario: Usuario que realizó la modificación (opcional)
     
     Returns:
-        Lista de PaginaVersion creadas
+        Reporte por formulario: formulario_id, version_anterior,
+        nueva_version_id, paginas y paginas_version
     """
-    versiones_creadas = []
-    
-    # 1) Encontrar todas las versiones de página que contienen este campo
-    versiones_con_campo = (PaginaCampo.objects
-                          .filter(id_campo=campo)
-                          .select_related('id_pagina_version__id_pagina')
-                          .values_list('id_pagina_version__id_pagina', flat=True)
-                          .distinct())
-    
-    # 2) Para cada página que contiene este campo, crear una nueva versión
-    for pagina_id in versiones_con_campo:
-        try:
-            pagina = Pagina.objects.get(id_pagina=pagina_id)
-            
-            # Obtener la versión actual de la página
-            version_actual = (PaginaVersion.objects
-                            .filter(id_pagina=pagina)
-                            .order_by('-fecha_creacion')
-                            .first())
-            
-            if not version_actual:
-                continue
-            
-            # Crear nueva versión de la página
-            nueva_version = PaginaVersion.objects.create(
-                id_pagina_version=uuid.uuid4().hex,
-                id_pagina=pagina,
-                fecha_creacion=timezone.now(),
-            )
-            
-            # MOVER todos los campos de la versión actual a la nueva versión
-            # Esto incluye el campo modificado y todos los demás campos
-            PaginaCampo.objects.filter(
-                id_pagina_version=version_actual
-            ).update(
-                id_pagina_version=nueva_version
-            )
-            
-            # Actualizar el puntero de versión del formulario
-            piv_actual = (Pagina_Index_Version.objects
-                         .filter(id_pagina=pagina)
-                         .select_related("id_index_version")
-                         .first())
-            
-            if piv_actual:
-                fiv_actual = piv_actual.id_index_version
-                f_link = Formulario_Index_Version.objects.filter(
-                    id_index_version=fiv_actual
-                ).first()
-                
-                if f_link:
-                    formulario = f_link.id_formulario
-                    fiv_nueva = FormularioIndexVersion.objects.create()
-                    
-                    Formulario_Index_Version.objects.get_or_create(
-                        id_index_version=fiv_nueva,
-                        defaults={"id_formulario": formulario},
-                    )
-                    
-                    # Actualizar punteros de TODAS las páginas del formulario
-                    paginas_del_form = (Pagina_Index_Version.objects
-                                      .filter(id_index_version=fiv_actual)
-                                      .values_list("id_pagina", flat=True))
-                    
-                    for pid in paginas_del_form:
-                        Pagina_Index_Version.objects.update_or_create(
-                            id_pagina_id=pid,
-                            defaults={"id_index_version": fiv_nueva},
-                        )
-            
-            versiones_creadas.append(nueva_version)
-            
-        except Pagina.DoesNotExist:
-            continue
-    
-    return versiones_creadas
+    # 1) Páginas cuya versión vigente contiene este campo
+    pagina_ids = (PaginaCampo.objects
+                  .filter(id_campo=campo)
+                  .values_list("id_pagina_version__id_pagina", flat=True)
+                  .distinct())
+
+    # 2) Versionar en lote
+    return versioning.versionar_paginas(pagina_ids)
     
 TIPO_POR_CLASE = {
     "number": "number",
@@ -367,33 +285,24 @@ def _pagina_version_actual_o_nueva(id_pagina: str, crear_nueva: bool = False) ->
         PaginaVersion (nueva o existente según crear_nueva)
     """
     from .models import Pagina as PaginaModel
+    if crear_nueva:
+        # lock del formulario ANTES de leer la versión vigente de la página
+        versioning.bloquear(formularios_de_paginas([id_pagina]))
     pagina_obj = PaginaModel.objects.get(pk=id_pagina)
     
     # Buscar la versión actual
-    pv_actual = (PaginaVersion.objects
-                 .filter(id_pagina=pagina_obj)
-                 .order_by("-fecha_creacion")
-                 .first())
+    pv_actual = versioning.pagina_version_vigente(pagina_obj)
     
     # Si no existe ninguna versión, crear la primera
     if not pv_actual:
-        pv = PaginaVersion.objects.create(
-            id_pagina_version=uuid.uuid4().hex,
-            fecha_creacion=timezone.now(),
-            id_pagina=pagina_obj,
-        )
-        return pv
+        return versioning.crear_pagina_version(pagina_obj)
     
     # Si no se solicita crear nueva, devolver la actual
     if not crear_nueva:
         return pv_actual
     
     # CREAR NUEVA VERSIÓN y mover campos
-    pv_nueva = PaginaVersion.objects.create(
-        id_pagina_version=uuid.uuid4().hex,
-        fecha_creacion=timezone.now(),
-        id_pagina=pagina_obj,
-    )
+    pv_nueva = versioning.crear_pagina_version(pagina_obj)
     
     # MOVER todos los campos de la versión actual a la nueva
     PaginaCampo.objects.filter(
@@ -421,45 +330,7 @@ def _actualizar_punteros_formulario(pagina: "Pagina", nueva_version: PaginaVersi
         pagina: Objeto Pagina
         nueva_version: La nueva PaginaVersion creada
     """
-    # Obtener el puntero actual de la página
-    piv_actual = (Pagina_Index_Version.objects
-                 .filter(id_pagina=pagina)
-                 .select_related("id_index_version")
-                 .first())
-    
-    if not piv_actual:
-        return
-    
-    fiv_actual = piv_actual.id_index_version
-    
-    # Encontrar el formulario
-    f_link = Formulario_Index_Version.objects.filter(
-        id_index_version=fiv_actual
-    ).first()
-    
-    if not f_link:
-        return
-    
-    formulario = f_link.id_formulario
-    
-    # Crear nueva versión del formulario
-    fiv_nueva = FormularioIndexVersion.objects.create()
-    
-    Formulario_Index_Version.objects.get_or_create(
-        id_index_version=fiv_nueva,
-        defaults={"id_formulario": formulario},
-    )
-    
-    # Actualizar punteros de TODAS las páginas del formulario
-    paginas_del_form = (Pagina_Index_Version.objects
-                       .filter(id_index_version=fiv_actual)
-                       .values_list("id_pagina", flat=True))
-    
-    for pid in paginas_del_form:
-        Pagina_Index_Version.objects.update_or_create(
-            id_pagina_id=pid,
-            defaults={"id_index_version": fiv_nueva},
-        )
+    versioning.publicar_desde_pagina(pagina)
 
 
 def _siguiente_sequence(id_pagina_version: str) -> int:
@@ -470,7 +341,7 @@ def _siguiente_sequence(id_pagina_version: str) -> int:
     return int(mx) + 1
 
 @transaction.atomic
-def crear_campo_en_pagina(id_pagina: str, payload: dict) -> dict:
+def crear_campo_en_pagina(id_pagina: str, payload: dict, tablas: Optional[Dict[str, pd.DataFrame]] = None) -> dict:
     """
     Crea un Campo en la página (versiona página si no existe PV),
     NO guarda enlaces de grupo en config; el enlace a grupo se hace en la vista
@@ -478,6 +349,7 @@ def crear_campo_en_pagina(id_pagina: str, payload: dict) -> dict:
 
     - Valida clase contra formularios_clase_campo
     - Para clase 'dataset', materializa opciones en FuenteDatosValor y normaliza config.dataset
+      (`tablas`: fuentes ya leídas con leer_fuentes; las que falten se descargan aquí)
     - Para clase 'group', crea/actualiza la fila en formularios_grupo con id_campo_group = este Campo
     """
     # -------- 1) Validaciones y determinación de tipo ----------
@@ -530,7 +402,7 @@ def crear_campo_en_pagina(id_pagina: str, payload: dict) -> dict:
             raise ValidationError("config.dataset.fuente_id es requerido para campos dataset")
 
         # materializar catálogo y normalizar columnas finales (case-insensitive) dentro de cfg_dict
-        _materializar_dataset_para_campo(cfg_dict, campo)
+        _materializar_dataset_para_campo(cfg_dict, campo, tablas)
         # asegurar que 'version' no quede guardado
         if "dataset" in cfg_dict and isinstance(cfg_dict["dataset"], dict):
             cfg_dict["dataset"].pop("version", None)
@@ -610,9 +482,64 @@ def hash_password(plain: str) -> str:
 def verify_password(hash_phc: str, plain: str) -> bool:
     return verify_secret(hash_phc.encode("utf-8"), plain.encode("utf-8"), Type.ID)
 
+def eliminar_campos(campo_ids) -> Dict[str, int]:
+    """
+    Borra SOLO los campos indicados; PaginaCampo, Grupo, CampoGrupo y
+    FuenteDatosValor caen en cascada filtrados por esos ids (nunca un
+    anti-join sobre toda formularios_campo). Devuelve filas por modelo.
+    Es un único delete(), que Django ya ejecuta en su propia transacción.
+    """
+    ids = list(campo_ids)
+    if not ids:
+        return {}
+    _, por_modelo = Campo.objects.filter(pk__in=ids).delete()
+    return por_modelo
+
+
+@transaction.atomic
+def _clonar_catalogos(mapa: Dict[str, str]) -> int:
+    """
+    Copia los FuenteDatosValor de cada campo viejo al nuevo ({viejo: nuevo}).
+    En PostgreSQL es un solo INSERT ... SELECT contra la tabla de remapeo
+    (VALUES); en otros motores se lee y se inserta en lote.
+    """
+    if not mapa:
+        return 0
+    if connection.vendor != "postgresql":
+        filas = [
+            FuenteDatosValor(campo_id=mapa[str(v.campo_id)], fuente_id=v.fuente_id, columna=v.columna,
+                             key_text=v.key_text, label_text=v.label_text, valor_raw=v.valor_raw, extras=v.extras)
+            for v in FuenteDatosValor.objects.filter(campo_id__in=list(mapa)).iterator()
+        ]
+        FuenteDatosValor.objects.bulk_create(filas, batch_size=2000)
+        return len(filas)
+
+    qn = connection.ops.quote_name
+    meta = FuenteDatosValor._meta
+    copiar = [qn(f.column) for f in meta.concrete_fields if f.name not in ("id", "campo", "creado_en")]
+    remapeo = ", ".join(["(%s::uuid, %s::uuid)"] * len(mapa))
+    params = [x for viejo, nuevo in mapa.items() for x in (viejo, nuevo)]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO {qn(meta.db_table)} ({qn(meta.pk.column)}, {qn(meta.get_field('campo').column)}, "
+            f"{qn(meta.get_field('creado_en').column)}, {', '.join(copiar)}) "
+            f"SELECT gen_random_uuid(), m.nuevo, now(), {', '.join('v.' + c for c in copiar)} "
+            f"FROM {qn(meta.db_table)} v JOIN (VALUES {remapeo}) AS m(viejo, nuevo) "
+            f"ON v.{qn(meta.get_field('campo').column)} = m.viejo",
+            params,
+        )
+        return cur.rowcount
+
+
 @transaction.atomic
 def duplicar_formulario(formulario: Formulario, nuevo_nombre: str | None = None) -> Formulario:
-    clon = Formulario.objects.create(
+    """
+    Clona la versión vigente del formulario por conjuntos: una lectura por
+    tabla de origen y un bulk_create por tabla de destino (páginas, versiones,
+    campos, grupos, membresías y enlaces), más un INSERT ... SELECT para los
+    catálogos dataset. La cantidad de sentencias no depende de los campos.
+    """
+    clon = Formulario(
         categoria=formulario.categoria,
         nombre=nuevo_nombre or f"{formulario.nombre}_Copia",
         descripcion=formulario.descripcion,
@@ -625,80 +552,98 @@ def duplicar_formulario(formulario: Formulario, nuevo_nombre: str | None = None)
         es_publico=formulario.es_publico,
         auto_envio=formulario.auto_envio,
     )
-
-    # versión nueva para el clon + historial
-    idx_clon = FormularioIndexVersion.objects.create()
-    Formulario_Index_Version.objects.create(id_index_version=idx_clon, id_formulario=clon)
-
-    # última versión del original (por fecha)
-    link_orig = (Formulario_Index_Version.objects
-                 .filter(id_formulario=formulario)
-                 .select_related("id_index_version")
-                 .order_by("-id_index_version__fecha_creacion")
-                 .first())
-    paginas_origen = Pagina.objects.none()
-    if link_orig:
-        page_ids = (Pagina_Index_Version.objects
-                    .filter(id_index_version=link_orig.id_index_version)
-                    .values_list("id_pagina", flat=True))
-        paginas_origen = Pagina.objects.filter(id_pagina__in=list(page_ids)).order_by("secuencia")
-
-    # clonar páginas
+    # bulk_create no dispara la señal que agrega la página "General"
+    Formulario.objects.bulk_create([clon])
+    idx_clon = versioning.registrar_version(clon)
+
+    # 1) Origen: páginas de la versión vigente, sus PaginaCampo y grupos
+    version_orig = versioning.version_vigente(formulario)
+    if version_orig is None:
+        return clon
+    paginas_origen = list(Pagina.objects
+                          .filter(puntero_version__id_index_version=version_orig)
+                          .order_by("secuencia"))
+    pv_origen = {}
     for p in paginas_origen:
-        p_nueva = Pagina.objects.create(
-            secuencia=p.secuencia,
-            nombre=p.nombre,
-            descripcion=p.descripcion,
-        )
-        Pagina_Index_Version.objects.create(id_pagina=p_nueva, id_index_version=idx_clon)
-
-        pv_orig = (PaginaVersion.objects
-                   .filter(id_pagina=p)
-                   .order_by("-fecha_creacion")
-                   .first())
-
-        pv_nueva = PaginaVersion.objects.create(
-            id_pagina_version=uuid.uuid4().hex,
-            id_pagina=p_nueva,
-            fecha_creacion=timezone.now(),
+        pv = p.current_pagina_version_id or getattr(versioning.pagina_version_vigente(p), "pk", None)
+        if pv:
+            pv_origen[pv] = str(p.pk)
+    links = list(PaginaCampo.objects
+                 .filter(id_pagina_version_id__in=list(pv_origen))
+                 .select_related("id_campo")
+                 .order_by("sequence"))
+    grupos = list(Grupo.objects.filter(id_campo_group_id__in=[l.id_campo_id for l in links]))
+    miembros = list(models.CampoGrupo.objects
+                    .filter(id_grupo__in=grupos)
+                    .values_list("id_grupo_id", "id_campo_id"))
+
+    # 2) Tablas de remapeo viejo → nuevo
+    mapa_paginas = {str(p.pk): uuid.uuid4() for p in paginas_origen}
+    mapa_campos = {str(l.id_campo_id): uuid.uuid4() for l in links}
+    mapa_grupos = {str(g.pk): uuid.uuid4() for g in grupos}
+
+    # 3) Páginas + punteros a la versión del clon + PaginaVersion vigentes
+    paginas = [
+        Pagina(id_pagina=mapa_paginas[str(p.pk)], secuencia=p.secuencia, nombre=p.nombre, descripcion=p.descripcion)
+        for p in paginas_origen
+    ]
+    Pagina.objects.bulk_create(paginas)
+    Pagina_Index_Version.objects.bulk_create([
+        Pagina_Index_Version(id_pagina=p, id_index_version=idx_clon) for p in paginas
+    ])
+    nuevas_pv = versioning.crear_paginas_version(paginas)
+
+    # 4) Campos (el config de los grupos apunta al Grupo nuevo), grupos y membresías
+    campos = []
+    for l in links:
+        c = l.id_campo
+        config = c.config
+        if c.clase == "group" and config:
+            try:
+                cfg = json.loads(config)
+            except (TypeError, ValueError):
+                cfg = None
+            if isinstance(cfg, dict) and str(cfg.get("id_group")) in mapa_grupos:
+                cfg["id_group"] = str(mapa_grupos[str(cfg["id_group"])])
+                config = json.dumps(cfg, ensure_ascii=False)
+        campos.append(Campo(
+            id_campo=mapa_campos[str(c.pk)],
+            tipo=c.tipo,
+            clase=c.clase,
+            nombre_campo=c.nombre_campo,
+            etiqueta=c.etiqueta,
+            ayuda=c.ayuda,
+            config=config,
+            requerido=c.requerido,
+        ))
+    Campo.objects.bulk_create(campos)
+    Grupo.objects.bulk_create([
+        Grupo(id_grupo=mapa_grupos[str(g.pk)], id_campo_group_id=mapa_campos[str(g.id_campo_group_id)], nombre=g.nombre)
+        for g in grupos
+    ])
+    models.CampoGrupo.objects.bulk_create([
+        models.CampoGrupo(id_grupo_id=mapa_grupos[str(gid)], id_campo_id=mapa_campos[str(cid)])
+        for gid, cid in miembros if str(cid) in mapa_campos
+    ])
+    PaginaCampo.objects.bulk_create([
+        PaginaCampo(
+            id_campo_id=mapa_campos[str(l.id_campo_id)],
+            id_pagina_version=nuevas_pv[str(mapa_paginas[pv_origen[l.id_pagina_version_id]])],
+            sequence=l.sequence,
         )
+        for l in links
+    ])
 
-        if pv_orig:
-            links = (PaginaCampo.objects
-                     .filter(id_pagina_version=pv_orig)
-                     .order_by("sequence"))
-
-            for l in links:
-                c = l.id_campo
-                c_nuevo = Campo.objects.create(
-                    id_campo=uuid.uuid4(),
-                    tipo=c.tipo,
-                    clase=c.clase,
-                    nombre_campo=c.nombre_campo,
-                    etiqueta=c.etiqueta,
-                    ayuda=c.ayuda,
-                    config=c.config,
-                    requerido=c.requerido,
-                )
-                PaginaCampo.objects.create(
-                    id_pagina_version=pv_nueva,
-                    id_campo=c_nuevo,
-                    sequence=l.sequence,
-                )
-
+    # 5) Catálogos de los campos dataset
+    _clonar_catalogos({
+        str(l.id_campo_id): str(mapa_campos[str(l.id_campo_id)]) for l in links if l.id_campo.clase == "dataset"
+    })
     return clon
 
 def versionar_pagina_sin_clonar(pagina) -> PaginaVersion:
-    prev = (PaginaVersion.objects
-            .filter(id_pagina=pagina)
-            .order_by('-fecha_creacion')
-            .first())
-
-    nueva_pv = PaginaVersion.objects.create(
-        id_pagina_version=uuid.uuid4().hex,
-        id_pagina=pagina,
-        fecha_creacion=timezone.now(),
-    )
+    prev = versioning.pagina_version_vigente(pagina)
+
+    nueva_pv = versioning.crear_pagina_version(pagina)
 
     if prev:
         links = (PaginaCampo.objects
@@ -714,27 +659,82 @@ def versionar_pagina_sin_clonar(pagina) -> PaginaVersion:
         ])
     return nueva_pv
 
-@transaction.atomic
-def _materializar_dataset_para_campo(cfg: dict, campo):
+# Columnas de FuenteDatosValor que definen una fila del catálogo
+_COLUMNAS_CATALOGO = ("fuente_id", "columna", "key_text", "label_text", "valor_raw", "extras")
+
+
+def _sincronizar_catalogo(campo, filas: List[FuenteDatosValor], por_clave: bool) -> Dict[str, int]:
     """
-    Lee el blob de FuenteDatos y llena FuenteDatosValor para ESTE campo.
-    **Sin versiones**: borra lo existente y re-materializa.
-    Retorna rows_insertadas (int).
+    Deja los FuenteDatosValor de `campo` iguales a `filas` tocando solo la
+    diferencia: borra las que desaparecieron, inserta las nuevas y actualiza
+    las que cambiaron. Con `por_clave` (modo pair) la identidad es key_text y
+    el alta/cambio es un upsert sobre (campo, key_text); en modo single (sin
+    key) la identidad es label_text y los cambios van por bulk_update.
     """
-    ds = (cfg or {}).get("dataset") or {}
-    fuente_id = ds.get("fuente_id")
-    mode = (ds.get("mode") or "pair").lower()  # "pair" o "single"
-    alias = ds.get("column") or ds.get("label_column") or "dataset"
+    identidad = "key_text" if por_clave else "label_text"
+
+    # 1) Catálogo actual: identidad → (id, valores); duplicados previos se borran
+    actuales: Dict[Any, tuple] = {}
+    sobrantes = []
+    for row in (FuenteDatosValor.objects
+                .filter(campo=campo)
+                .values_list("id", *_COLUMNAS_CATALOGO)
+                .iterator(chunk_size=5000)):
+        valores = dict(zip(_COLUMNAS_CATALOGO, row[1:]))
+        clave = valores[identidad]
+        if clave is None or clave in actuales:
+            sobrantes.append(row[0])
+        else:
+            actuales[clave] = (row[0], valores)
+
+    # 2) Diferencia (la primera fila gana si el archivo repite la identidad)
+    nuevas, cambiadas, vistas = [], [], set()
+    for f in filas:
+        clave = getattr(f, identidad)
+        if clave in vistas:
+            continue
+        vistas.add(clave)
+        previa = actuales.get(clave)
+        if previa is None:
+            nuevas.append(f)
+        elif any(getattr(f, c) != previa[1][c] for c in _COLUMNAS_CATALOGO):
+            if not por_clave:
+                f.id = previa[0]    # bulk_update va por PK; el upsert, por (campo, key_text)
+            cambiadas.append(f)
+    eliminar = sobrantes + [pk for clave, (pk, _) in actuales.items() if clave not in vistas]
+
+    # 3) Escrituras acotadas a la diferencia
+    for i in range(0, len(eliminar), 5000):
+        FuenteDatosValor.objects.filter(pk__in=eliminar[i:i + 5000]).delete()
+    actualizar = ["fuente", "columna", "key_text", "label_text", "valor_raw", "extras"]
+    if por_clave:
+        FuenteDatosValor.objects.bulk_create(
+            nuevas + cambiadas, batch_size=5000,
+            update_conflicts=True, unique_fields=["campo", "key_text"],
+            update_fields=[c for c in actualizar if c != "key_text"],
+        )
+    else:
+        FuenteDatosValor.objects.bulk_create(nuevas, batch_size=5000)
+        FuenteDatosValor.objects.bulk_update(cambiadas, actualizar, batch_size=1000)
 
-    if not fuente_id:
-        raise ValidationError("dataset.fuente_id es requerido")
+    return {
+        "insertados": len(nuevas),
+        "actualizados": len(cambiadas),
+        "eliminados": len(eliminar),
+        "total": len(vistas),
+    }
 
-    f = FuenteDatos.objects.get(pk=fuente_id)
 
-    storage = AzureBlobStorageService()
-    content = storage.download_file(f.blob_name)
+def leer_fuente(f: FuenteDatos, contenido: Optional[bytes] = None) -> pd.DataFrame:
+    """
+    Descarga (si no se pasa `contenido`) y parsea el archivo de la fuente una
+    sola vez: todo como texto, sin NaN, encabezados y celdas con trim. Falla si
+    hay columnas que solo difieren por mayúsculas/minúsculas.
+    """
+    if contenido is None:
+        contenido = AzureBlobStorageService().download_file(f.blob_name)
     ext = (f.archivo_nombre or f.blob_name).split(".")[-1].lower()
-    file_obj = BytesIO(content)
+    file_obj = BytesIO(contenido)
 
     # Lee Excel/CSV como texto
     if ext in ("xlsx", "xls"):
@@ -745,7 +745,7 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
     df = df.fillna("")
     df.columns = [str(c).strip() for c in df.columns]
 
-    # Índice case-insensitive de columnas + chequeo de colisiones (p.ej. 'ID' y 'id')
+    # Chequeo de colisiones case-insensitive (p.ej. 'ID' y 'id')
     lower_idx = {}
     for c in df.columns:
         k = c.lower()
@@ -756,6 +756,51 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
             )
         lower_idx[k] = c
 
+    # Trim de todas las columnas
+    for c in df.columns:
+        df[c] = df[c].astype(str).map(lambda x: x.strip())
+    return df
+
+
+def leer_fuentes(fuente_ids) -> Dict[str, pd.DataFrame]:
+    """
+    {fuente_id: leer_fuente(f)} de las fuentes existentes entre `fuente_ids`,
+    una descarga por fuente. Es el `tablas` de _materializar_dataset_para_campo
+    y se arma ANTES de bloquear el formulario: así la descarga y el parseo del
+    blob no ocurren mientras se sostiene el lock.
+    """
+    return {str(f.pk): leer_fuente(f) for f in FuenteDatos.objects.filter(pk__in=set(fuente_ids))}
+
+
+@transaction.atomic
+def _materializar_dataset_para_campo(cfg: dict, campo, tablas: Optional[Dict[str, pd.DataFrame]] = None):
+    """
+    Lee el blob de FuenteDatos y llena FuenteDatosValor para ESTE campo.
+    **Sin versiones**: el catálogo queda igual al archivo, escribiendo solo
+    las filas nuevas, cambiadas o desaparecidas (ver _sincronizar_catalogo).
+
+    `tablas` ({fuente_id: DataFrame de leer_fuente}) permite compartir una
+    sola descarga y parseo entre varios campos de la misma fuente; lo que no
+    esté se lee y se agrega. La resolución de columnas es siempre por campo.
+    Retorna {"insertados", "actualizados", "eliminados", "total"}.
+    """
+    ds = (cfg or {}).get("dataset") or {}
+    fuente_id = ds.get("fuente_id")
+    mode = (ds.get("mode") or "pair").lower()  # "pair" o "single"
+    alias = ds.get("column") or ds.get("label_column") or "dataset"
+
+    if not fuente_id:
+        raise ValidationError("dataset.fuente_id es requerido")
+
+    f = FuenteDatos.objects.get(pk=fuente_id)
+
+    if tablas is None:
+        tablas = {}
+    if str(f.pk) not in tablas:
+        tablas[str(f.pk)] = leer_fuente(f)
+    df = tablas[str(f.pk)]
+    lower_idx = {c.lower(): c for c in df.columns}
+
     def resolve_col(name: str | None, default: str | None = None) -> str:
         """
         Devuelve el nombre EXACTO presente en el DF, resolviendo case-insensitive.
@@ -772,21 +817,6 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
             )
         return real
 
-    # cols = set(map(str, df.columns))
-    # if mode == "single":
-    #     col = ds.get("column")
-    #     if not col or col not in cols:
-    #         raise ValidationError(
-    #             f"Columna '{col}' no existe en la fuente. Disponibles: {sorted(cols)}"
-    #         )
-    # else:  # pair
-    #     kcol, lcol = ds.get("key_column"), ds.get("label_column")
-    #     missing = [x for x in (kcol, lcol) if not x or x not in cols]
-    #     if missing:
-    #         raise ValidationError(
-    #             f"Columnas faltantes en la fuente: {missing}. Disponibles: {sorted(cols)}"
-    #         )
-
     # --- (2) Resolver columnas según el modo (case-insensitive) ---
     if mode == "single":
         col_real = resolve_col(ds.get("column"))
@@ -805,14 +835,7 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
     else:
         raise ValidationError("dataset.mode debe ser 'single' o 'pair'")
 
-    # Trim de todas las columnas
-    for c in df.columns:
-        df[c] = df[c].astype(str).map(lambda x: x.strip())
-
-    # Limpia valores previos del campo
-    FuenteDatosValor.objects.filter(campo=campo).delete()
-
-    # Construye filas
+    # Construye filas (el DataFrame es compartido: no se modifica)
     rows = []
     if mode == "single":
         col = ds["column"]
@@ -853,8 +876,7 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
             .sort_values(by=[lcol, kcol])
         )
 
-        for _, r in tmp.iterrows():
-            k, l = r[kcol], r[lcol]
+        for k, l in zip(tmp[kcol], tmp[lcol]):
             rows.append(
                 FuenteDatosValor(
                     campo=campo,
@@ -867,15 +889,14 @@ def _materializar_dataset_para_campo(cfg: dict, campo):
                 )
             )
 
-    if rows:
-        # ajusta batch_size si manejas catálogos muy grandes
-        FuenteDatosValor.objects.bulk_create(rows, batch_size=5000)
+    # Escribe solo la diferencia contra lo ya materializado
+    resultado = _sincronizar_catalogo(campo, rows, por_clave=(mode == "pair"))
 
     # Limpia cualquier rastro viejo de versión en el config
     ds.pop("version", None)
     cfg["dataset"] = ds
 
-    return len(rows)
+    return resultado
 
 def fetch_items_from_fdv_by_campo(
     campo_id: str,
@@ -916,18 +937,13 @@ def crear_nueva_version_pagina(pagina: Pagina, usuario=None, razon: str = None)
     - Se mantiene el constraint de PRIMARY KEY de id_campo
     - El historial se mantiene porque PaginaVersion sigue existiendo
     """
-    # 1) Obtener la última versión de la página
-    ultima_version = (PaginaVersion.objects
-                     .filter(id_pagina=pagina)
-                     .order_by("-fecha_creacion")
-                     .first())
+    # 1) Obtener la última versión de la página (bajo el lock del formulario)
+    versioning.bloquear(formularios_de_paginas([pagina.pk]))
+    pagina.refresh_from_db(fields=["current_pagina_version"])
+    ultima_version = versioning.pagina_version_vigente(pagina)
     
     # 2) Crear la nueva versión
-    nueva_version = PaginaVersion.objects.create(
-        id_pagina_version=uuid.uuid4().hex,
-        id_pagina=pagina,
-        fecha_creacion=timezone.now(),
-    )
+    nueva_version = versioning.crear_pagina_version(pagina)
     
     # 3) MOVER (no copiar) los campos de la versión anterior a la nueva
     # Como id_campo es PRIMARY KEY, un campo solo puede estar en UNA versión
@@ -940,35 +956,101 @@ def crear_nueva_version_pagina(pagina: Pagina, usuario=None, razon: str = None)
             id_pagina_version=nueva_version
         )
     
-    # 4) Actualizar el puntero de versión del formulario
-    piv_actual = (Pagina_Index_Version.objects
-                 .filter(id_pagina=pagina)
-                 .select_related("id_index_version")
-                 .first())
+    # 4) Publicar v+1 del formulario (punteros de todas sus páginas)
+    versioning.publicar_desde_pagina(pagina)
     
-    if piv_actual:
-        fiv_actual = piv_actual.id_index_version
-        f_link = Formulario_Index_Version.objects.filter(
-            id_index_version=fiv_actual
-        ).first()
-        
-        if f_link:
-            formulario = f_link.id_formulario
-            fiv_nueva = FormularioIndexVersion.objects.create()
-            
-            Formulario_Index_Version.objects.get_or_create(
-                id_index_version=fiv_nueva,
-                defaults={"id_formulario": formulario},
-            )
-            
-            paginas_del_form = (Pagina_Index_Version.objects
-                              .filter(id_index_version=fiv_actual)
-                              .values_list("id_pagina", flat=True))
-            
-            for pid in paginas_del_form:
-                Pagina_Index_Version.objects.update_or_create(
-                    id_pagina_id=pid,
-                    defaults={"id_index_version": fiv_nueva},
-                )
-    
-    return nueva_version
\ No newline at end of file
+    return nueva_version
+
+def formularios_de_paginas(pagina_ids) -> List[Any]:
+    """IDs de los formularios cuya versión actual apunta a alguna de las páginas."""
+    return list(Formulario_Index_Version.objects
+                .filter(id_index_version__paginas_puntero__id_pagina_id__in=list(pagina_ids))
+                .values_list("id_formulario_id", flat=True)
+                .distinct())
+
+
+def formularios_de_campos(campo_ids) -> List[Any]:
+    """IDs de los formularios que contienen alguno de los campos."""
+    pagina_ids = (PaginaVersion.objects
+                  .filter(campos__id_campo_id__in=list(campo_ids))
+                  .values_list("id_pagina_id", flat=True))
+    return formularios_de_paginas(pagina_ids)
+
+
+def marcar_contenido_modificado(formulario_ids) -> int:
+    """
+    Incrementa Formulario.revision_contenido para los formularios dados.
+    Se usa cuando el esquema renderizado cambia SIN publicar una versión
+    nueva, para que ningún worker siga sirviendo la entrada cacheada.
+    """
+    formulario_ids = list(formulario_ids)
+    if not formulario_ids:
+        return 0
+    actualizados = (Formulario.objects
+                    .filter(pk__in=formulario_ids)
+                    .update(revision_contenido=F("revision_contenido") + 1))
+    for fid in formulario_ids:
+        snapshots.materializar_al_confirmar(fid)
+    return actualizados
+
+def _uuids(formulario_ids) -> List[str]:
+    return list(dict.fromkeys(str(uuid.UUID(str(fid))) for fid in formulario_ids))
+
+
+def suspender_formularios(formulario_ids) -> Dict[str, str]:
+    """
+    Suspende varios formularios con un SELECT y un UPDATE.
+    Devuelve {id: "suspendido" | "ya_suspendido" | "no_encontrado"}.
+    """
+    ids = _uuids(formulario_ids)
+    estados = {str(pk): (estado or "") for pk, estado in
+               Formulario.objects.filter(pk__in=ids).values_list("pk", "estado")}
+    suspender = [fid for fid, estado in estados.items() if estado.lower() != "suspendida"]
+    if suspender:
+        Formulario.objects.filter(pk__in=suspender).update(estado="Suspendida")
+    return {
+        fid: ("no_encontrado" if fid not in estados else
+              "suspendido" if fid in suspender else "ya_suspendido")
+        for fid in ids
+    }
+
+
+def eliminar_formularios(formulario_ids) -> Dict[str, Dict[str, Any]]:
+    """
+    Borrado lógico de varios formularios: un SELECT de existencia, UN conteo
+    de respuestas agrupado por formulario y un UPDATE. Los que tienen
+    respuestas no se tocan (igual que el DELETE individual).
+    Devuelve {id: {"resultado": "eliminado" | "con_respuestas" | "no_encontrado", ...}}.
+    """
+    ids = _uuids(formulario_ids)
+    existentes = {str(pk) for pk in Formulario.objects.filter(pk__in=ids).values_list("pk", flat=True)}
+    respuestas = {
+        str(r["form_id"]): r["n"] for r in
+        FormularioEntry.objects.filter(form_id__in=list(existentes)).values("form_id").annotate(n=Count("id")).order_by()
+    } if existentes else {}
+    eliminar = [fid for fid in existentes if fid not in respuestas]
+    if eliminar:
+        Formulario.objects.filter(pk__in=eliminar).update(eliminado_en=timezone.now())
+
+    out = {}
+    for fid in ids:
+        if fid not in existentes:
+            out[fid] = {"resultado": "no_encontrado"}
+        elif fid in respuestas:
+            out[fid] = {"resultado": "con_respuestas", "entries_count": respuestas[fid]}
+        else:
+            out[fid] = {"resultado": "eliminado"}
+    return out
+
+
+def huella_formulario(form: Formulario) -> str:
+    """
+    Huella (32 hex) de todo lo que se sirve de un formulario: versión vigente,
+    revisión de contenido, columnas propias y nombre de la categoría.
+    Espera `version_actual_id` anotado (ver form_tree.subquery_version_actual).
+    """
+    partes = [str(getattr(form, "version_actual_id", "") or ""), str(form.revision_contenido)]
+    for f in Formulario._meta.concrete_fields:
+        partes.append(str(f.value_from_object(form)))
+    partes.append(form.categoria.nombre if form.categoria else "")
+    return sha256("|".join(partes).encode("utf-8")).hexdigest()[:32]
@@ -11,12 +11,10 @@ from .services import activar_version
 @receiver(post_save, sender=Formulario)
 def crear_y_activar_version_inicial(sender, instance: Formulario, created, **kwargs):
     if created:
-        # 1) crear versión y registrar historial
-        v1 = FormularioIndexVersion.objects.create()
-        Formulario_Index_Version.objects.get_or_create(
-            id_index_version=v1,
-            defaults={"id_formulario": instance},
-        )
+        # 1) crear versión, registrar historial y dejarla como vigente
+        #    (el snapshot se materializa cuando ya existe la página inicial)
+        from .versioning import registrar_version
+        v1 = registrar_version(instance, snapshot=False)
 
         def _despues_commit():
             # 2) crear página inicial
@@ -31,14 +29,13 @@ def crear_y_activar_version_inicial(sender, instance: Formulario, created, **kwa
                 defaults={"id_index_version": v1},
             )
 
-            # 4) primera pagina_version (vacía)
-            from django.utils import timezone
-            from .services import _uuid32
-            PaginaVersion.objects.create(
-                id_pagina_version=_uuid32(),
-                id_pagina=nueva,
-                fecha_creacion=timezone.now(),
-            )
+            # 4) primera pagina_version (vacía) + puntero de la página
+            from .versioning import crear_pagina_version
+            crear_pagina_version(nueva)
+
+            # 5) snapshot del esquema inicial
+            from . import snapshots
+            snapshots.materializar_al_confirmar(instance.pk)
         transaction.on_commit(_despues_commit)
 
 # @receiver(post_save, sender=FormularioIndexVersion)
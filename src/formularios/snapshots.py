@@ -0,0 +1,115 @@
+# snapshots.py
+"""
+Snapshots inmutables del esquema renderizado por FormularioIndexVersion.
+
+Al publicar una versión (ver versioning.registrar_version) se
+programa su materialización para después del COMMIT: el árbol de páginas →
+campos se renderiza UNA vez y se guarda como JSON (y su gzip) en
+FormularioSnapshot. Las lecturas sirven ese blob con una sola consulta por PK.
+
+Si el contenido de la versión cambia sin versión nueva (revision_contenido),
+el snapshot queda desfasado y se re-materializa en la siguiente lectura.
+"""
+import gzip
+from hashlib import sha256
+from typing import Any, List, Optional
+
+from django.db import IntegrityError, transaction
+
+from .form_tree import cargar_campos_por_pagina, formato_esquema, paginas_de_version
+from .models import Formulario, FormularioSnapshot
+from .renderers import dumps, loads
+
+
+def renderizar_paginas(version_id) -> List[Any]:
+    """Árbol de páginas → campos de una versión (consultas constantes)."""
+    from .serializers import PaginaConCamposSerializer
+
+    paginas = list(paginas_de_version(version_id))
+    context = {"campos_por_pagina": cargar_campos_por_pagina(paginas)}
+    return PaginaConCamposSerializer(paginas, many=True, context=context).data
+
+
+def _documento(formulario_id, version_id, revision: int, paginas) -> bytes:
+    doc = {
+        "id_formulario": str(formulario_id),
+        "id_index_version": str(version_id),
+        "revision_contenido": revision,
+        "paginas": paginas,
+    }
+    return dumps(doc)
+
+
+def materializar(formulario_id, version_id, revision: int) -> FormularioSnapshot:
+    """Renderiza la versión y guarda (o reemplaza) su snapshot."""
+    contenido = _documento(formulario_id, version_id, revision, renderizar_paginas(version_id))
+    comprimido = gzip.compress(contenido, compresslevel=6, mtime=0)
+    defaults = {
+        "id_formulario_id": formulario_id,
+        "revision_contenido": revision,
+        "formato": formato_esquema(),
+        "contenido": contenido,
+        "contenido_gzip": comprimido,
+        "sha256": sha256(contenido).hexdigest(),
+        "tamano": len(contenido),
+        "tamano_gzip": len(comprimido),
+    }
+    try:
+        # savepoint: dos lecturas concurrentes pueden materializar a la vez
+        with transaction.atomic():
+            snap, _ = FormularioSnapshot.objects.update_or_create(
+                id_index_version_id=version_id, defaults=defaults,
+            )
+    except IntegrityError:
+        snap = FormularioSnapshot.objects.get(id_index_version_id=version_id)
+    return snap
+
+
+def obtener(formulario: Formulario, version_id, vigente: bool) -> Optional[FormularioSnapshot]:
+    """
+    Snapshot de `version_id`. Para la versión vigente se materializa si falta o
+    si su revisión (o el formato del árbol) quedó atrás; para versiones
+    históricas solo se devuelve lo que ya exista (sus páginas ya no apuntan a
+    esa versión).
+    """
+    snap = FormularioSnapshot.objects.filter(
+        id_index_version_id=version_id, id_formulario=formulario,
+    ).first()
+    if not vigente:
+        return snap
+    if (snap is None
+            or snap.revision_contenido != formulario.revision_contenido
+            or snap.formato != formato_esquema()):
+        snap = materializar(formulario.pk, version_id, formulario.revision_contenido)
+    return snap
+
+
+def paginas_vigentes(formulario: Formulario, version_id) -> List[Any]:
+    """Árbol de páginas de la versión vigente desde su snapshot (nivel persistente de schema_cache)."""
+    snap = obtener(formulario, version_id, vigente=True)
+    return loads(snap.contenido)["paginas"]
+
+
+def _materializar_si_vigente(formulario_id) -> None:
+    form = (Formulario.objects
+            .filter(pk=formulario_id)
+            .only("id", "current_index_version", "revision_contenido")
+            .first())
+    if form is None or not form.current_index_version_id:
+        return
+    ya = FormularioSnapshot.objects.filter(
+        id_index_version_id=form.current_index_version_id,
+        revision_contenido=form.revision_contenido,
+        formato=formato_esquema(),
+    ).exists()
+    if not ya:
+        materializar(form.pk, form.current_index_version_id, form.revision_contenido)
+
+
+def materializar_al_confirmar(formulario_id) -> None:
+    """
+    Programa el snapshot de la versión vigente para después del COMMIT.
+    Si la transacción publicó varias versiones, solo se renderiza la última.
+    """
+    # robust: un error al renderizar no debe convertir en 500 una escritura ya confirmada
+    transaction.on_commit(lambda: _materializar_si_vigente(formulario_id), robust=True)
@@ -1,3 +1,1032 @@
+import datetime
+import decimal
+import io
+import json
+import math
+import uuid
+from unittest import mock
+
+import pandas as pd
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from formularios import changeset, services, versioning
+from formularios.models import (
+    Campo,
+    CampoGrupo,
+    Categoria,
+    ClaseCampo,
+    Formulario,
+    Formulario_Index_Version,
+    FormularioBorrador,
+    FormularioEntry,
+    FormularioIndexVersion,
+    FormularioSnapshot,
+    FuenteDatos,
+    FuenteDatosValor,
+    Grupo,
+    Pagina,
+    Pagina_Index_Version,
+    PaginaCampo,
+    PaginaVersion,
+    UserFormulario,
+    Usuario,
+)
+from formularios.renderers import OrjsonRenderer
+
+
+class FormularioTestCase(TestCase):
+    """
+    Formulario con dos páginas (General, Datos) y tres campos, armado con los
+    mismos caminos que la API. Los callbacks on_commit (página inicial,
+    snapshots, caché) se ejecutan como en producción.
+    """
+
+    def setUp(self):
+        ClaseCampo.objects.bulk_create([ClaseCampo(clase=c) for c in ("text", "number", "group")])
+        self.form = self.crear_formulario("Encuesta")
+        self.general = Pagina.objects.get(puntero_version__id_index_version=self.vigente())
+        self.aplicar([
+            {"op": "agregar_pagina", "nombre": "Datos", "ref": "datos"},
+            {"op": "agregar_campo", "pagina": str(self.general.pk), "clase": "text", "nombre_campo": "a", "etiqueta": "A"},
+            {"op": "agregar_campo", "pagina": str(self.general.pk), "clase": "text", "nombre_campo": "b", "etiqueta": "B"},
+            {"op": "agregar_campo", "pagina": "datos", "clase": "number", "nombre_campo": "c", "etiqueta": "C"},
+        ])
+        self.datos = Pagina.objects.get(nombre="Datos")
+        self.client = APIClient()
+
+    def crear_formulario(self, nombre):
+        """Alta como la de la API: la señal crea v1 y la página General al confirmar."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return Formulario.objects.create(
+                nombre=nombre,
+                disponible_desde_fecha=datetime.date(2025, 1, 1),
+                disponible_hasta_fecha=datetime.date(2025, 12, 31),
+                estado="Activo",
+                forma_envio="En Linea",
+            )
+
+    def aplicar(self, operaciones, formulario=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return changeset.aplicar(Formulario.objects.get(pk=(formulario or self.form).pk), operaciones, **kwargs)
+
+    def vigente(self):
+        return Formulario.objects.get(pk=self.form.pk).current_index_version
+
+    def versiones(self):
+        return Formulario_Index_Version.objects.filter(id_formulario=self.form).count()
+
+    def arbol(self):
+        """[(página, [nombre_campo, ...]), ...] de la versión vigente, en orden."""
+        r = self.client.get(f"/api/formularios/{self.form.pk}/")
+        self.assertEqual(r.status_code, 200, r.content)
+        return [(p["nombre"], [c["nombre_campo"] for c in p["campos"]]) for p in r.json()["paginas"]]
+
+
+class PublicarVersionTests(FormularioTestCase):
+    def test_mueve_punteros_de_todas_las_paginas(self):
+        anterior = self.vigente()
+        antes = self.arbol()
+        with self.captureOnCommitCallbacks(execute=True):
+            nueva = versioning.publicar_version(Formulario.objects.get(pk=self.form.pk), anterior)
+
+        self.assertNotEqual(nueva.pk, anterior.pk)
+        self.assertEqual(self.vigente().pk, nueva.pk)
+        self.assertTrue(Formulario_Index_Version.objects.filter(id_formulario=self.form, id_index_version=nueva).exists())
+        self.assertFalse(Pagina_Index_Version.objects.filter(id_index_version=anterior).exists())
+        self.assertEqual(
+            set(Pagina_Index_Version.objects.filter(id_index_version=nueva).values_list("id_pagina_id", flat=True)),
+            {self.general.pk, self.datos.pk},
+        )
+        self.assertEqual(self.arbol(), antes)
+
+    def test_anterior_desactualizada_parte_de_la_vigente(self):
+        anterior = self.vigente()
+        desactualizado = Formulario.objects.get(pk=self.form.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            intermedia = versioning.publicar_version(Formulario.objects.get(pk=self.form.pk), anterior)
+            # el llamador aún cree que `anterior` es la vigente
+            ultima = versioning.publicar_version(desactualizado, anterior)
+
+        self.assertEqual(self.vigente().pk, ultima.pk)
+        self.assertFalse(Pagina_Index_Version.objects.filter(id_index_version=intermedia).exists())
+        self.assertEqual(Pagina_Index_Version.objects.filter(id_index_version=ultima).count(), 2)
+
+
+class OrjsonRendererTests(TestCase):
+    """OrjsonRenderer debe producir exactamente los mismos bytes que JSONRenderer de DRF."""
+
+    def payload(self):
+        utc = datetime.timezone.utc
+        return {
+            "fecha_utc": datetime.datetime(2025, 1, 1, tzinfo=utc),
+            "fecha_micro": datetime.datetime(2025, 1, 1, 1, 2, 3, 4500, tzinfo=utc),
+            "fecha_naive": datetime.datetime(2025, 1, 1, 8, 30),
+            "fecha_offset": datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=-3))),
+            "dia": datetime.date(2025, 1, 2),
+            "hora": datetime.time(1, 2, 3, 5),
+            "duracion": datetime.timedelta(days=1, seconds=5),
+            "decimal": decimal.Decimal("1.10"),
+            "lazy": gettext_lazy("Formulario"),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "queryset": Categoria.objects.none(),
+            "texto": 'ñandú "citado" </script> \u2028 \u2029',
+            "bytes": b"abc",
+            "tupla": (1, 2),
+            "vacios": [[], {}, None, True, False],
+            "numeros": [0, -1, 2 ** 40, 0.1, 1e16, 1e-7, -0.0, 123456789.123],
+            "grande": 2 ** 70,
+            7: "clave entera",
+        }
+
+    def assertMismaSalida(self, data, accepted_media_type=None, renderer_context=None):
+        esperado = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        obtenido = OrjsonRenderer().render(data, accepted_media_type, renderer_context)
+        self.assertEqual(obtenido, esperado)
+
+    def test_misma_salida_compacta(self):
+        self.assertMismaSalida(self.payload())
+
+    def test_misma_salida_sin_enteros_grandes(self):
+        data = self.payload()
+        del data["grande"]  # sin el fallback: todo lo serializa orjson
+        self.assertMismaSalida(data)
+
+    def test_misma_salida_con_indent(self):
+        data = self.payload()
+        for indent in (2, 4):
+            with self.subTest(indent=indent):
+                self.assertMismaSalida(data, f"application/json; indent={indent}")
+                self.assertMismaSalida(data, renderer_context={"indent": indent})
+
+    def test_no_finitos_igual_que_drf(self):
+        for valor in (math.nan, math.inf, -math.inf):
+            with self.subTest(valor=valor):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render({"x": [None, valor]})
+                with self.assertRaises(ValueError):
+                    OrjsonRenderer().render({"x": [None, valor]})
+
+    def test_none_vacio(self):
+        self.assertEqual(OrjsonRenderer().render(None), b"")
+
+    def test_tipo_desconocido_mismo_error(self):
+        with self.assertRaises(TypeError):
+            JSONRenderer().render({"x": object()})
+        with self.assertRaises(TypeError):
+            OrjsonRenderer().render({"x": object()})
+
+
+class ChangesetTests(FormularioTestCase):
+    def test_lote_crea_una_sola_version(self):
+        self.assertEqual(self.arbol(), [("General", ["a", "b"]), ("Datos", ["c"])])
+        antes = self.versiones()
+        anterior = self.vigente()
+        b = PaginaCampo.objects.get(id_campo__nombre_campo="b").id_campo_id
+
+        out = self.aplicar([
+            {"op": "agregar_campo", "pagina": str(self.datos.pk), "clase": "text", "nombre_campo": "d", "etiqueta": "D", "ref": "d"},
+            {"op": "actualizar_campo", "campo": "d", "etiqueta": "D2"},
+            {"op": "eliminar_campo", "campo": str(b)},
+            {"op": "agregar_pagina", "nombre": "Extra"},
+        ])
+
+        self.assertEqual(self.versiones(), antes + 1)
+        self.assertEqual(out["nueva_version_id"], str(self.vigente().pk))
+        self.assertNotEqual(self.vigente().pk, anterior.pk)
+        self.assertEqual(self.arbol(), [("General", ["a"]), ("Datos", ["c", "d"]), ("Extra", [])])
+        self.assertEqual(Campo.objects.get(nombre_campo="d").etiqueta, "D2")
+        self.assertFalse(Campo.objects.filter(pk=b).exists())
+
+    def test_operacion_invalida_no_escribe_nada(self):
+        antes = self.versiones()
+        arbol = self.arbol()
+        n_campos = Campo.objects.count()
+
+        with self.assertRaises(changeset.CambioInvalido) as ctx:
+            self.aplicar([
+                {"op": "agregar_campo", "pagina": str(self.general.pk), "clase": "text", "nombre_campo": "x", "etiqueta": "X"},
+                {"op": "eliminar_campo", "campo": str(uuid.uuid4())},
+            ])
+        self.assertEqual(ctx.exception.indice, 1)
+
+        for op in ({"op": "desconocida"},
+                   {"op": "agregar_campo", "pagina": str(uuid.uuid4()), "clase": "text", "nombre_campo": "x"},
+                   {"op": "agregar_campo", "pagina": str(self.general.pk), "clase": "no-existe", "nombre_campo": "x"}):
+            with self.subTest(op=op["op"]):
+                with self.assertRaises(changeset.CambioInvalido):
+                    self.aplicar([op])
+
+        self.assertEqual(self.versiones(), antes)
+        self.assertEqual(Campo.objects.count(), n_campos)
+        self.assertEqual(self.arbol(), arbol)
+
+    def test_endpoint_responde_400_con_el_indice(self):
+        antes = self.versiones()
+        r = self.client.post(f"/api/formularios/{self.form.pk}/cambios/", {"operaciones": [
+            {"op": "agregar_pagina", "nombre": "Nueva"},
+            {"op": "eliminar_campo", "campo": str(uuid.uuid4())},
+        ]}, format="json")
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()["operacion"], 1)
+        self.assertEqual(self.versiones(), antes)
+
+    def test_reordenar_completo(self):
+        a, b = (str(PaginaCampo.objects.get(id_campo__nombre_campo=n).id_campo_id) for n in ("a", "b"))
+        general = str(self.general.pk)
+        antes = self.versiones()
+
+        with self.assertRaises(changeset.CambioInvalido):
+            self.aplicar([{"op": "reordenar", "pagina": general, "campos": [b], "completo": True}])
+        with self.assertRaises(changeset.CambioInvalido):
+            self.aplicar([{"op": "reordenar", "pagina": general, "campos": [b, a, b], "completo": True}])
+        with self.assertRaises(changeset.CambioInvalido):
+            self.aplicar([{"op": "reordenar", "paginas": [str(self.datos.pk)], "completo": True}])
+        self.assertEqual(self.versiones(), antes)
+
+        self.aplicar([
+            {"op": "reordenar", "pagina": general, "campos": [b, a], "completo": True},
+            {"op": "reordenar", "paginas": [str(self.datos.pk), general], "completo": True},
+        ])
+        self.assertEqual(self.versiones(), antes + 1)
+        self.assertEqual(self.arbol(), [("Datos", ["c"]), ("General", ["b", "a"])])
+        self.assertEqual(
+            list(PaginaCampo.objects.filter(id_campo_id__in=[a, b]).order_by("sequence")
+                 .values_list("id_campo__nombre_campo", "sequence")),
+            [("b", 1), ("a", 2)],
+        )
+
+    def test_reordenar_parcial_deja_el_resto_al_final(self):
+        self.aplicar([{"op": "agregar_campo", "pagina": str(self.general.pk), "clase": "text",
+                       "nombre_campo": "z", "etiqueta": "Z"}])
+        z = str(PaginaCampo.objects.get(id_campo__nombre_campo="z").id_campo_id)
+        self.aplicar([{"op": "reordenar", "pagina": str(self.general.pk), "campos": [z]}])
+        self.assertEqual(self.arbol()[0], ("General", ["z", "a", "b"]))
+
+
+class EtagTests(FormularioTestCase):
+    def test_304_si_no_cambio(self):
+        url = f"/api/formularios/{self.form.pk}/"
+        r = self.client.get(url)
+        etag = r["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r["ETag"], etag)
+        self.assertFalse(r.content)
+        # If-None-Match usa comparación débil
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"otro", W/{etag}').status_code, 304)
+
+    def test_200_con_etag_nuevo_tras_editar(self):
+        url = f"/api/formularios/{self.form.pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.aplicar([{"op": "agregar_pagina", "nombre": "Nueva"}])
+
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=r["ETag"]).status_code, 304)
+
+    def test_cambio_de_columnas_sin_version_nueva(self):
+        url = f"/api/formularios/{self.form.pk}/"
+        etag = self.client.get(url)["ETag"]
+        r = self.client.patch(url, {"descripcion": "otra"}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ConcurrenciaTests(FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url_campos = f"/api/paginas/{self.general.pk}/campos/"
+        self.url_cambios = f"/api/formularios/{self.form.pk}/cambios/"
+        self.campo = {"clase": "text", "nombre_campo": "n", "etiqueta": "N"}
+
+    def etag(self):
+        return self.client.get(f"/api/formularios/{self.form.pk}/")["ETag"]
+
+    def test_if_match_con_el_etag_servido(self):
+        etag = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(self.url_campos, self.campo, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(r.status_code, 201, r.content)
+
+        # el mismo ETag ya no es el vigente
+        antes = self.versiones()
+        r = self.client.post(self.url_campos, self.campo, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(r.status_code, 412)
+        self.assertEqual(r.json()["etag"], self.etag())
+        self.assertEqual(r.json()["version_actual"], str(self.vigente().pk))
+        self.assertEqual(self.versiones(), antes)
+
+    def test_if_match_compara_fuerte(self):
+        etag = self.etag()
+        for valor in (f"W/{etag}", f'"{self.vigente().pk}"'):
+            with self.subTest(if_match=valor):
+                r = self.client.post(self.url_campos, self.campo, format="json", HTTP_IF_MATCH=valor)
+                self.assertEqual(r.status_code, 412)
+        r = self.client.patch(f"/api/paginas/{self.general.pk}/", {"nombre": "G2"}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(r.status_code, 200, r.content)
+
+    def test_version_base_desactualizada_409(self):
+        base = str(self.vigente().pk)
+        cambios = {"operaciones": [{"op": "agregar_pagina", "nombre": "X"}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(self.url_cambios, {**cambios, "version_base": base}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+
+        antes = self.versiones()
+        r = self.client.post(self.url_cambios, {**cambios, "version_base": base}, format="json")
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r.json()["version_actual"], str(self.vigente().pk))
+        self.assertEqual(self.versiones(), antes)
+        r = self.client.patch(f"/api/paginas/{self.general.pk}/", {"nombre": "G2", "version_base": base}, format="json")
+        self.assertEqual(r.status_code, 409)
+
+    def test_la_fuente_se_descarga_antes_del_lock(self):
+        ClaseCampo.objects.create(clase="dataset")
+        fuente = FuenteDatos.objects.create(nombre="paises", archivo_nombre="paises.csv", blob_name="paises.csv",
+                                            blob_url="https://blob/paises.csv", tipo_archivo="csv")
+        dataset = {"dataset": {"fuente_id": str(fuente.pk), "mode": "pair", "key_column": "id", "label_column": "nombre"}}
+        eventos = []
+
+        def leer(f, contenido=None):
+            eventos.append("descarga")
+            return pd.DataFrame({"id": ["ar", "cl"], "nombre": ["Argentina", "Chile"]})
+
+        def bloquear(ids, original=versioning.bloquear):
+            eventos.append("lock")
+            return original(ids)
+
+        pedidos = {
+            "campo": (self.url_campos, {**self.campo, "clase": "dataset", "config": dataset}),
+            "cambios": (self.url_cambios, {"operaciones": [
+                {"op": "agregar_campo", "pagina": str(self.general.pk), **self.campo, "clase": "dataset", "config": dataset},
+            ]}),
+        }
+        for nombre, (url, cuerpo) in pedidos.items():
+            with self.subTest(nombre), mock.patch("formularios.services.leer_fuente", side_effect=leer), \
+                    mock.patch("formularios.versioning.bloquear", side_effect=bloquear), \
+                    self.captureOnCommitCallbacks(execute=True):
+                eventos.clear()
+                r = self.client.post(url, cuerpo, format="json")
+                self.assertIn(r.status_code, (200, 201), r.content)
+                self.assertEqual(eventos[:2], ["descarga", "lock"])
+                self.assertEqual(eventos.count("descarga"), 1)
+
+
+class ConTablaEntriesMixin:
+    """FormularioEntry es managed=False (la tabla la mantiene otro sistema): se crea para la clase."""
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(FormularioEntry)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(FormularioEntry)
+
+
+class PurgarVersionesTests(ConTablaEntriesMixin, FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        # historial: v1 (alta), v2 (setUp), sin_snapshot, con_respuestas, con_snapshot, vigente
+        for nombre in ("sin_snapshot", "con_respuestas", "con_snapshot", "vigente"):
+            setattr(self, nombre, self.aplicar([{"op": "agregar_pagina", "nombre": nombre}])["nueva_version_id"])
+        FormularioSnapshot.objects.filter(pk__in=[self.sin_snapshot, self.con_respuestas]).delete()
+        ahora = timezone.now()
+        FormularioEntry.objects.create(
+            id=uuid.uuid4(), form_id=self.form.pk, index_version_id=self.con_respuestas,
+            form_name="Encuesta", status="Enviado", created_at=ahora, updated_at=ahora,
+        )
+        FormularioIndexVersion.objects.update(fecha_creacion=ahora - datetime.timedelta(days=365))
+        PaginaVersion.objects.update(fecha_creacion=ahora - datetime.timedelta(days=365))
+        self.arbol_vigente = self.arbol()
+
+    def purgar(self, **opts):
+        out = io.StringIO()
+        call_command("purgar_versiones", stdout=out, **opts)
+        return out.getvalue()
+
+    def existen(self, *ids):
+        return set(map(str, FormularioIndexVersion.objects.filter(pk__in=ids).values_list("pk", flat=True)))
+
+    def test_dry_run_no_borra(self):
+        versiones = FormularioIndexVersion.objects.count()
+        pvs = PaginaVersion.objects.count()
+        salida = self.purgar(dry_run=True)
+        # v1, v2, sin_snapshot y con_snapshot
+        self.assertIn("Se borrarían: 4 filas de formularios_formularioindexversion", salida)
+        self.assertIn("Se borrarían: 3 snapshots", salida)
+        self.assertEqual(FormularioIndexVersion.objects.count(), versiones)
+        self.assertEqual(PaginaVersion.objects.count(), pvs)
+
+    def test_por_defecto_purga_versiones_vencidas_con_snapshot(self):
+        salida = self.purgar(dias=90)
+        self.assertIn("Borradas: 4 filas de formularios_formularioindexversion", salida)
+        self.assertIn("Conservadas por snapshot aún en retención: 0 versiones", salida)
+        self.assertEqual(self.existen(self.sin_snapshot, self.con_snapshot), set())
+        self.assertFalse(FormularioSnapshot.objects.filter(pk=self.con_snapshot).exists())
+        self.assertEqual(self.existen(self.vigente, self.con_respuestas), {self.vigente, self.con_respuestas})
+        self.assertTrue(FormularioSnapshot.objects.filter(pk=self.vigente).exists())
+        self.assertEqual(self.arbol(), self.arbol_vigente)
+
+    def test_conserva_vigente_respuestas_y_snapshots_en_retencion(self):
+        con_snapshot = set(map(str, FormularioSnapshot.objects.values_list("pk", flat=True)))
+        salida = self.purgar(batch_size=1, dias_snapshots=730)
+        self.assertIn("Conservadas por snapshot aún en retención: 3 versiones", salida)
+
+        self.assertEqual(self.existen(self.sin_snapshot), set())
+        self.assertEqual(self.existen(self.vigente, self.con_respuestas, self.con_snapshot),
+                         {self.vigente, self.con_respuestas, self.con_snapshot})
+        # historial y base de /diff intactos
+        self.assertEqual(set(map(str, FormularioSnapshot.objects.values_list("pk", flat=True))), con_snapshot)
+        r = self.client.get(f"/api/formularios/{self.form.pk}/diff/", {"from": self.con_snapshot})
+        self.assertEqual(r.status_code, 200, r.content)
+        # solo quedan las PaginaVersion vigentes
+        self.assertEqual(PaginaVersion.objects.count(), Pagina.objects.count())
+        self.assertEqual(self.arbol(), self.arbol_vigente)
+
+    def test_respeta_la_retencion(self):
+        FormularioIndexVersion.objects.filter(pk=self.sin_snapshot).update(fecha_creacion=timezone.now())
+        self.purgar(dias=90)
+        self.assertEqual(self.existen(self.sin_snapshot), {self.sin_snapshot})
+
+    def test_dias_snapshots_nunca_es_menor_que_dias(self):
+        FormularioIndexVersion.objects.filter(pk=self.con_snapshot).update(fecha_creacion=timezone.now())
+        self.purgar(dias=90, dias_snapshots=0)
+        self.assertEqual(self.existen(self.con_snapshot), {self.con_snapshot})
+
+
+class StorageFalso:
+    """Sustituto de AzureBlobStorageService: registra los borrados y falla en `fallan`."""
+
+    def __init__(self, fallan=()):
+        self.fallan = set(fallan)
+        self.borrados = []
+
+    def delete_file(self, blob_name):
+        if blob_name in self.fallan:
+            return False
+        self.borrados.append(blob_name)
+        return True
+
+
+class PurgarEliminadosTests(ConTablaEntriesMixin, FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.otro = self.crear_formulario("Vigente")
+        general_otro = Pagina.objects.get(puntero_version__id_index_version=self.otro.current_index_version)
+        self.aplicar([{"op": "agregar_campo", "pagina": str(general_otro.pk), "clase": "text",
+                       "nombre_campo": "o", "etiqueta": "O"}], formulario=self.otro)
+        self.arbol_otro = self.client.get(f"/api/formularios/{self.otro.pk}/").json()["paginas"]
+        self.campos_form = list(PaginaCampo.objects
+                                .filter(id_pagina_version__id_pagina__in=[self.general, self.datos])
+                                .values_list("id_campo_id", flat=True))
+        self.campo_otro = Campo.objects.get(nombre_campo="o")
+
+        self.fuentes = {}
+        for nombre in ("ok", "falla", "vigente"):
+            self.fuentes[nombre] = FuenteDatos.objects.create(
+                nombre=nombre, archivo_nombre=f"{nombre}.csv", blob_name=f"{nombre}.csv",
+                blob_url=f"https://blob/{nombre}.csv", tipo_archivo="csv",
+            )
+        for nombre in ("falla", "vigente"):
+            FuenteDatosValor.objects.create(campo=self.campo_otro, fuente=self.fuentes[nombre],
+                                            columna="nombre", key_text=nombre, label_text=nombre)
+
+    def purgar(self, storage, **opts):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch("formularios.management.commands.purgar_eliminados.AzureBlobStorageService",
+                        return_value=storage):
+            call_command("purgar_eliminados", stdout=out, stderr=err, **opts)
+        return out.getvalue()
+
+    def test_delete_solo_marca(self):
+        self.assertEqual(self.client.delete(f"/api/formularios/{self.form.pk}/").status_code, 204)
+        self.assertEqual(self.client.get(f"/api/formularios/{self.form.pk}/").status_code, 404)
+        self.assertIsNotNone(Formulario.todos.get(pk=self.form.pk).eliminado_en)
+        self.assertEqual(Campo.objects.filter(pk__in=self.campos_form).count(), len(self.campos_form))
+
+    def test_purga_el_formulario_eliminado_y_nada_mas(self):
+        self.client.delete(f"/api/formularios/{self.form.pk}/")
+        fivs = list(Formulario_Index_Version.objects.filter(id_formulario=self.form)
+                    .values_list("id_index_version_id", flat=True))
+
+        self.purgar(StorageFalso(), dry_run=True)
+        self.assertTrue(Formulario.todos.filter(pk=self.form.pk).exists())
+
+        self.purgar(StorageFalso(), batch_size=1)
+        self.assertFalse(Formulario.todos.filter(pk=self.form.pk).exists())
+        self.assertFalse(Campo.objects.filter(pk__in=self.campos_form).exists())
+        self.assertFalse(Pagina.objects.filter(pk__in=[self.general.pk, self.datos.pk]).exists())
+        self.assertFalse(FormularioIndexVersion.objects.filter(pk__in=fivs).exists())
+        self.assertFalse(FormularioSnapshot.objects.filter(id_formulario_id=self.form.pk).exists())
+        # el otro formulario queda intacto
+        self.assertEqual(self.client.get(f"/api/formularios/{self.otro.pk}/").json()["paginas"], self.arbol_otro)
+        self.assertTrue(Campo.objects.filter(pk=self.campo_otro.pk).exists())
+
+    def test_no_purga_si_llegaron_respuestas_despues_del_delete(self):
+        vigente = self.vigente().pk
+        self.client.delete(f"/api/formularios/{self.form.pk}/")
+        ahora = timezone.now()
+        FormularioEntry.objects.create(
+            id=uuid.uuid4(), form_id=self.form.pk, index_version_id=vigente,
+            form_name="Encuesta", status="Enviado", created_at=ahora, updated_at=ahora,
+        )
+
+        self.assertIn("Formularios con respuestas (no se purgan): 1", self.purgar(StorageFalso(), dry_run=True))
+        salida = self.purgar(StorageFalso())
+        self.assertIn("Formularios purgados: 0 (con respuestas, sin purgar: 1)", salida)
+        self.assertTrue(Formulario.todos.filter(pk=self.form.pk).exists())
+        self.assertTrue(FormularioIndexVersion.objects.filter(pk=vigente).exists())
+        self.assertEqual(Campo.objects.filter(pk__in=self.campos_form).count(), len(self.campos_form))
+
+    def test_fuentes_reintentan_el_blob(self):
+        url = "/api/fuentes-datos/{}/"
+        self.assertEqual(self.client.delete(url.format(self.fuentes["falla"].pk)).status_code, 409)
+        self.assertEqual(self.client.delete(url.format(self.fuentes["ok"].pk)).status_code, 204)
+        # marcada con catálogos aún enlazados (p.ej. una carrera con el DELETE): la purga los borra
+        FuenteDatos.objects.filter(pk=self.fuentes["falla"].pk).update(eliminado_en=timezone.now())
+        storage = StorageFalso(fallan={"falla.csv"})
+
+        salida = self.purgar(storage)
+        self.assertIn("Fuentes purgadas: 1, con error: 1", salida)
+        self.assertEqual(storage.borrados, ["ok.csv"])
+        self.assertFalse(FuenteDatos.todos.filter(pk=self.fuentes["ok"].pk).exists())
+        falla = FuenteDatos.todos.get(pk=self.fuentes["falla"].pk)
+        self.assertEqual(falla.purga_intentos, 1)
+        self.assertIn("falla.csv", falla.purga_error)
+        self.assertTrue(FuenteDatos.objects.filter(pk=self.fuentes["vigente"].pk).exists())
+        self.assertEqual(list(FuenteDatosValor.objects.filter(campo=self.campo_otro)
+                              .values_list("label_text", flat=True)), ["vigente"])
+
+        # agotados los reintentos ya no se toca
+        salida = self.purgar(storage, max_intentos=1)
+        self.assertIn("sin más reintentos: 1", salida)
+        self.assertEqual(FuenteDatos.todos.get(pk=falla.pk).purga_intentos, 1)
+
+        self.purgar(StorageFalso())
+        self.assertFalse(FuenteDatos.todos.filter(pk=falla.pk).exists())
+
+
+class ListadoFormulariosTests(FormularioTestCase):
+    def test_cursor_no_repite_ni_saltea_nombres_iguales(self):
+        for _ in range(4):
+            self.crear_formulario("Encuesta")
+        self.crear_formulario("Zeta")
+        esperados = list(Formulario.objects.order_by("nombre", "id").values_list("id", flat=True))
+
+        vistos, url = [], "/api/formularios/?page_size=2"
+        while url:
+            j = self.client.get(url).json()
+            vistos += [f["id"] for f in j["results"]]
+            url = j["next"]
+        self.assertEqual(vistos, [str(pk) for pk in esperados])
+
+        atras, url = [], j["previous"]
+        while url:
+            j = self.client.get(url).json()
+            atras = [f["id"] for f in j["results"]] + atras
+            url = j["previous"]
+        self.assertEqual(atras, [str(pk) for pk in esperados[:len(atras)]])
+        self.assertEqual(len(atras), 4)
+
+    def test_eliminado_en_no_se_escribe_ni_se_expone(self):
+        r = self.client.post("/api/formularios/", {
+            "nombre": "Nuevo",
+            "disponible_desde_fecha": "2025-01-01",
+            "disponible_hasta_fecha": "2025-12-31",
+            "estado": "Activo",
+            "forma_envio": "En Linea",
+            "eliminado_en": "2025-06-01T00:00:00Z",
+        }, format="json")
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertNotIn("eliminado_en", r.json())
+        self.assertTrue(Formulario.objects.filter(pk=r.json()["id"]).exists())
+        self.assertNotIn("eliminado_en", self.client.get(f"/api/formularios/{self.form.pk}/").json())
+
+
+class ItemsDatasetTests(TestCase):
+    def setUp(self):
+        self.fuente, self.otra = (
+            FuenteDatos.objects.create(nombre=n, archivo_nombre=f"{n}.csv", blob_name=f"{n}.csv",
+                                       blob_url=f"https://blob/{n}.csv", tipo_archivo="csv")
+            for n in ("paises", "vieja")
+        )
+        self.campo = Campo.objects.create(
+            tipo="texto", clase="dataset", nombre_campo="pais", etiqueta="País",
+            config=json.dumps({"dataset": {"fuente_id": str(self.fuente.pk), "mode": "pair",
+                                           "key_column": "id", "label_column": "nombre"}}),
+        )
+        for key, label in (("ar", "Argentina"), ("bo", "Bolivia"), ("cl", "Chile")):
+            FuenteDatosValor.objects.create(campo=self.campo, fuente=self.fuente, columna="nombre",
+                                            key_text=key, label_text=label)
+        # catálogo anterior sin rematerializar: otra columna y otra fuente
+        FuenteDatosValor.objects.create(campo=self.campo, fuente=self.fuente, columna="codigo",
+                                        key_text="x", label_text="AAA")
+        FuenteDatosValor.objects.create(campo=self.campo, fuente=self.otra, columna="nombre",
+                                        key_text="y", label_text="Aruba")
+        self.client = APIClient()
+
+    def test_solo_sirve_la_fuente_y_columna_configuradas(self):
+        labels, url = [], f"/api/campos/{self.campo.pk}/items/?limit=2"
+        while url:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200, r.content)
+            labels += [x["label"] for x in r.json()["results"]]
+            url = r.json()["next"]
+        self.assertEqual(labels, ["Argentina", "Bolivia", "Chile"])
+
+        r = self.client.get(f"/api/campos/{self.campo.pk}/items/", {"q": "a"})
+        self.assertEqual([x["label"] for x in r.json()["results"]], ["Argentina"])
+
+
+class DashboardTests(ConTablaEntriesMixin, FormularioTestCase):
+    def test_asignaciones_sin_formularios_eliminados(self):
+        otro = self.crear_formulario("Otro")
+        ana, beto = (Usuario.objects.create(nombre_usuario=u, nombre=u, correo=f"{u}@x.org") for u in ("ana", "beto"))
+        UserFormulario.objects.bulk_create([
+            UserFormulario(id_formulario=self.form, id_usuario=ana),
+            UserFormulario(id_formulario=otro, id_usuario=ana),
+            UserFormulario(id_formulario=otro, id_usuario=beto),
+        ])
+        self.client.delete(f"/api/formularios/{otro.pk}/")
+
+        self.client.force_authenticate(ana)
+        r = self.client.get("/api/dashboard/resumen/")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["asignaciones"], {"total": 1, "usuarios_con_formularios": 1})
+
+
+def _sin_ids(paginas):
+    """Árbol sin los ids que cambian al importar (páginas, campos, grupos, items_ref)."""
+    def campo(c):
+        out = {k: v for k, v in c.items() if k not in ("id_campo", "children", "config")}
+        out["config"] = {k: v for k, v in (c.get("config") or {}).items() if k not in ("id_group", "items_ref")}
+        out["children"] = [campo(h) for h in c.get("children") or []]
+        return out
+    return [{"nombre": p["nombre"], "secuencia": p["secuencia"], "campos": [campo(c) for c in p["campos"]]}
+            for p in paginas]
+
+
+class FormularioConDatasetTestCase(FormularioTestCase):
+    """El formulario base más un grupo con un hijo y un campo dataset (fuente simulada) en Datos."""
+
+    def setUp(self):
+        super().setUp()
+        ClaseCampo.objects.create(clase="dataset")
+        self.fuente = FuenteDatos.objects.create(nombre="paises", archivo_nombre="paises.csv", blob_name="paises.csv",
+                                                 blob_url="https://blob/paises.csv", tipo_archivo="csv")
+        self.leer = mock.patch("formularios.services.leer_fuente", return_value=pd.DataFrame(
+            {"id": ["ar", "cl"], "nombre": ["Argentina", "Chile"]}))
+        self.leer.start()
+        self.addCleanup(self.leer.stop)
+        self.aplicar([
+            {"op": "agregar_campo", "pagina": str(self.datos.pk), "clase": "group", "nombre_campo": "g",
+             "etiqueta": "G", "ref": "g"},
+            {"op": "agregar_campo", "pagina": str(self.datos.pk), "clase": "text", "nombre_campo": "h",
+             "etiqueta": "H", "grupo": "g"},
+            {"op": "agregar_campo", "pagina": str(self.datos.pk), "clase": "dataset", "nombre_campo": "pais",
+             "etiqueta": "País", "config": {"dataset": {"fuente_id": str(self.fuente.pk), "mode": "pair",
+                                                        "key_column": "id", "label_column": "nombre"}}},
+        ])
+        self.origen = self.client.get(f"/api/formularios/{self.form.pk}/").json()
+
+
+class ImportarTests(FormularioConDatasetTestCase):
+    def importar(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/formularios/import/", data, format="json")
+
+    def test_ida_y_vuelta(self):
+        paginas = Pagina.objects.count()
+        r = self.importar(self.origen)
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(r.json()["campos"], 6)
+        self.assertEqual(Pagina.objects.count(), paginas + 2)  # sin página "General" extra
+
+        nuevo = self.client.get(f"/api/formularios/{r.json()['id']}/").json()
+        self.assertEqual(_sin_ids(nuevo["paginas"]), _sin_ids(self.origen["paginas"]))
+        grupo = next(c for c in nuevo["paginas"][1]["campos"] if c["clase"] == "group")
+        self.assertEqual([h["nombre_campo"] for h in grupo["children"]], ["h"])
+        self.assertNotEqual(grupo["config"]["id_group"],
+                            next(c for c in self.origen["paginas"][1]["campos"] if c["clase"] == "group")["config"]["id_group"])
+
+    def test_fuente_de_otro_entorno_se_resuelve_por_nombre(self):
+        for pagina in self.origen["paginas"]:
+            for c in pagina["campos"]:
+                if c["clase"] == "dataset":
+                    self.assertEqual(c["config"]["dataset"]["fuente_nombre"], "paises")
+                    c["config"]["dataset"]["fuente_id"] = str(uuid.uuid4())
+        r = self.importar(self.origen)
+        self.assertEqual(r.status_code, 201, r.content)
+        nuevo = self.client.get(f"/api/formularios/{r.json()['id']}/").json()
+        pais = next(c for c in nuevo["paginas"][1]["campos"] if c["clase"] == "dataset")
+        self.assertEqual(pais["config"]["dataset"]["fuente_id"], str(self.fuente.pk))
+        self.assertEqual(pais["config"]["items_total"], 2)
+        # el nombre solo viaja en el árbol, no se guarda en el config
+        self.assertNotIn("fuente_nombre", json.loads(Campo.objects.get(pk=pais["id_campo"]).config)["dataset"])
+
+    def test_error_indica_la_ruta_del_json_de_entrada(self):
+        # la primera página del JSON es la de secuencia mayor
+        self.origen["paginas"].reverse()
+        self.origen["paginas"][0]["campos"][0]["clase"] = "nope"
+        formularios = Formulario.objects.count()
+        r = self.importar(self.origen)
+        self.assertEqual(r.status_code, 400, r.content)
+        self.assertEqual(r.json()["ruta"], "paginas[0].campos[0]")
+        self.assertEqual(Formulario.objects.count(), formularios)
+
+
+class DuplicarTests(FormularioConDatasetTestCase):
+    def test_duplica_la_version_vigente_con_nuevos_ids(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(f"/api/formularios/{self.form.pk}/duplicar/", {"nombre": "Copia"}, format="json")
+        self.assertEqual(r.status_code, 201, r.content)
+        copia = self.client.get(f"/api/formularios/{r.json()['id']}/").json()
+        # mismas páginas, campos, secuencias e hijos de grupo
+        self.assertEqual(_sin_ids(copia["paginas"]), _sin_ids(self.origen["paginas"]))
+
+        campos = {c["nombre_campo"]: c for p in copia["paginas"] for c in p["campos"]}
+        originales = {c["nombre_campo"]: c for p in self.origen["paginas"] for c in p["campos"]}
+        self.assertTrue(set(c["id_campo"] for c in campos.values()).isdisjoint(c["id_campo"] for c in originales.values()))
+
+        # Grupo y CampoGrupo apuntan a los campos nuevos; config.id_group al Grupo nuevo
+        g, h = campos["g"], campos["g"]["children"][0]
+        grupo = Grupo.objects.get(id_campo_group_id=g["id_campo"])
+        self.assertEqual(g["config"]["id_group"], str(grupo.pk))
+        self.assertNotEqual(g["config"]["id_group"], originales["g"]["config"]["id_group"])
+        self.assertEqual(list(CampoGrupo.objects.filter(id_grupo=grupo).values_list("id_campo_id", flat=True)),
+                         [uuid.UUID(h["id_campo"])])
+
+        # catálogo copiado; el original intacto
+        def catalogo(campo_id):
+            return sorted(FuenteDatosValor.objects.filter(campo_id=campo_id)
+                          .values_list("fuente_id", "columna", "key_text", "label_text"))
+        self.assertEqual(catalogo(campos["pais"]["id_campo"]), catalogo(originales["pais"]["id_campo"]))
+        self.assertEqual(len(catalogo(originales["pais"]["id_campo"])), 2)
+
+
+class BorradorTests(FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f"/api/formularios/{self.form.pk}/borrador/"
+        self.url_publicar = self.url + "publicar/"
+        self.campo_a = Campo.objects.get(nombre_campo="a")
+
+    def agregar(self, *operaciones):
+        return self.client.post(self.url, {"operaciones": list(operaciones)}, format="json")
+
+    def publicar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url_publicar)
+
+    def test_agregar_no_crea_version(self):
+        vigente, versiones, arbol = self.vigente(), self.versiones(), self.arbol()
+        r = self.agregar({"op": "agregar_pagina", "nombre": "Nueva", "ref": "p"})
+        self.assertEqual(r.status_code, 200, r.content)
+        r = self.agregar({"op": "agregar_campo", "pagina": "p", "clase": "text", "nombre_campo": "x", "etiqueta": "X"})
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["total_operaciones"], 2)
+        self.assertEqual(r.json()["resumen"]["campos_nuevos"], 1)
+        self.assertFalse(r.json()["desactualizado"])
+
+        self.assertEqual(self.vigente(), vigente)
+        self.assertEqual(self.versiones(), versiones)
+        self.assertEqual(self.arbol(), arbol)
+
+    def test_sobrevive_a_una_publicacion_en_vivo(self):
+        self.agregar({"op": "actualizar_campo", "campo": str(self.campo_a.pk), "etiqueta": "A2"})
+        self.aplicar([{"op": "agregar_pagina", "nombre": "En vivo"}])
+
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["desactualizado"])
+        self.assertEqual(r.json()["total_operaciones"], 1)
+        self.assertEqual(self.publicar().status_code, 200)
+        self.assertEqual(Campo.objects.get(pk=self.campo_a.pk).etiqueta, "A2")
+
+    def test_publicar_crea_una_version_y_elimina_el_borrador(self):
+        self.agregar({"op": "agregar_pagina", "nombre": "Nueva", "ref": "p"},
+                     {"op": "agregar_campo", "pagina": "p", "clase": "text", "nombre_campo": "x", "etiqueta": "X"},
+                     {"op": "actualizar_campo", "campo": str(self.campo_a.pk), "etiqueta": "A2"})
+        versiones = self.versiones()
+
+        r = self.publicar()
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(self.versiones(), versiones + 1)
+        self.assertEqual(str(self.vigente().pk), r.json()["nueva_version_id"])
+        self.assertTrue(FormularioSnapshot.objects.filter(pk=r.json()["nueva_version_id"]).exists())
+        self.assertFalse(FormularioBorrador.objects.filter(pk=self.form.pk).exists())
+        self.assertEqual(self.arbol(), [("General", ["a", "b"]), ("Datos", ["c"]), ("Nueva", ["x"])])
+        self.assertEqual(self.client.post(self.url_publicar).status_code, 404)
+
+    def test_operacion_que_ya_no_aplica_devuelve_400_y_conserva_el_borrador(self):
+        self.agregar({"op": "agregar_pagina", "nombre": "Nueva"},
+                     {"op": "actualizar_campo", "campo": str(self.campo_a.pk), "etiqueta": "A2"})
+        self.aplicar([{"op": "eliminar_campo", "campo": str(self.campo_a.pk)}])
+        versiones, arbol = self.versiones(), self.arbol()
+
+        r = self.publicar()
+        self.assertEqual(r.status_code, 400, r.content)
+        self.assertEqual(r.json()["operacion"], 1)
+        self.assertEqual(self.versiones(), versiones)
+        self.assertEqual(self.arbol(), arbol)
+        self.assertEqual(len(FormularioBorrador.objects.get(pk=self.form.pk).operaciones), 2)
+
+
+class SincronizarCatalogoTests(TestCase):
+    """Rematerializar un catálogo escribe solo la diferencia con el archivo (services._sincronizar_catalogo)."""
+
+    def setUp(self):
+        self.fuente = FuenteDatos.objects.create(nombre="paises", archivo_nombre="paises.csv", blob_name="paises.csv",
+                                                 blob_url="https://blob/paises.csv", tipo_archivo="csv")
+        self.campo = Campo.objects.create(tipo="texto", clase="dataset", nombre_campo="pais", etiqueta="País")
+
+    def materializar(self, ds, **columnas):
+        cfg = {"dataset": {"fuente_id": str(self.fuente.pk), **ds}}
+        tablas = {str(self.fuente.pk): pd.DataFrame(columnas)}
+        return services._materializar_dataset_para_campo(cfg, self.campo, tablas)
+
+    def catalogo(self, clave):
+        return dict(FuenteDatosValor.objects.filter(campo=self.campo).values_list(clave, "id"))
+
+    def test_modo_pair(self):
+        ds = {"mode": "pair", "key_column": "id", "label_column": "nombre"}
+        r = self.materializar(ds, id=["ar", "bo", "cl"], nombre=["Argentina", "Bolivia", "Chile"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"], r["total"]), (3, 0, 0, 3))
+        ids = self.catalogo("key_text")
+
+        r = self.materializar(ds, id=["ar", "bo", "cl"], nombre=["Argentina", "Bolivia", "Chile"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"]), (0, 0, 0))
+
+        # cambia una etiqueta, desaparece "cl" y aparece "uy"
+        r = self.materializar(ds, id=["ar", "bo", "uy"], nombre=["República Argentina", "Bolivia", "Uruguay"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"], r["total"]), (1, 1, 1, 3))
+        despues = self.catalogo("key_text")
+        self.assertEqual(set(despues), {"ar", "bo", "uy"})
+        self.assertEqual(despues["ar"], ids["ar"])     # actualizada en sitio
+        self.assertEqual(despues["bo"], ids["bo"])
+        self.assertEqual(FuenteDatosValor.objects.get(pk=ids["ar"]).label_text, "República Argentina")
+
+    def test_modo_single(self):
+        ds = {"mode": "single", "column": "nombre"}
+        r = self.materializar(ds, nombre=["Argentina", "Bolivia", "Chile"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"], r["total"]), (3, 0, 0, 3))
+        ids = self.catalogo("label_text")
+
+        r = self.materializar(ds, nombre=["Argentina", "Bolivia", "Chile"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"]), (0, 0, 0))
+
+        # sin clave, la identidad es la etiqueta: "Chile" se va y "Uruguay" llega
+        r = self.materializar(ds, nombre=["Argentina", "Bolivia", "Uruguay"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"], r["total"]), (1, 0, 1, 3))
+        despues = self.catalogo("label_text")
+        self.assertEqual(set(despues), {"Argentina", "Bolivia", "Uruguay"})
+        self.assertEqual(despues["Argentina"], ids["Argentina"])
+
+        # mismas etiquetas con otra columna de origen: se actualizan en sitio
+        r = self.materializar({"mode": "single", "column": "Pais"}, Pais=["Argentina", "Bolivia", "Uruguay"])
+        self.assertEqual((r["insertados"], r["actualizados"], r["eliminados"]), (0, 3, 0))
+        self.assertEqual(self.catalogo("label_text"), despues)
+        self.assertEqual(set(FuenteDatosValor.objects.filter(campo=self.campo).values_list("columna", flat=True)), {"Pais"})
+
+
+class CamposBulkTests(FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f"/api/paginas/{self.general.pk}/campos/bulk/"
+
+    def post(self, campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {"campos": campos}, format="json")
+
+    def test_grupo_con_hijos_en_una_version(self):
+        versiones = self.versiones()
+        r = self.post([
+            {"clase": "group", "nombre_campo": "parcela", "etiqueta": "Parcela", "ref": "g"},
+            {"clase": "number", "nombre_campo": "area", "etiqueta": "Área", "grupo": "g"},
+            {"clase": "text", "nombre_campo": "cultivo", "etiqueta": "Cultivo", "grupo": "g"},
+        ])
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(self.versiones(), versiones + 1)
+        self.assertEqual(r.json()["nueva_version_id"], str(self.vigente().pk))
+
+        # a continuación de a (1) y b (2), en el orden del pedido
+        secuencias = dict(PaginaCampo.objects
+                          .filter(id_pagina_version=Pagina.objects.get(pk=self.general.pk).current_pagina_version_id)
+                          .values_list("id_campo__nombre_campo", "sequence"))
+        self.assertEqual(secuencias, {"a": 1, "b": 2, "parcela": 3, "area": 4, "cultivo": 5})
+
+        grupo = Grupo.objects.get(id_campo_group__nombre_campo="parcela")
+        self.assertEqual(set(CampoGrupo.objects.filter(id_grupo=grupo).values_list("id_campo__nombre_campo", flat=True)),
+                         {"area", "cultivo"})
+        general = self.client.get(f"/api/formularios/{self.form.pk}/").json()["paginas"][0]
+        parcela = next(c for c in general["campos"] if c["nombre_campo"] == "parcela")
+        self.assertEqual([h["nombre_campo"] for h in parcela["children"]], ["area", "cultivo"])
+
+    def test_item_invalido_400_sin_escribir(self):
+        versiones, campos = self.versiones(), Campo.objects.count()
+        r = self.post([
+            {"clase": "text", "nombre_campo": "ok", "etiqueta": "Ok"},
+            {"clase": "nope", "nombre_campo": "mal", "etiqueta": "Mal"},
+        ])
+        self.assertEqual(r.status_code, 400, r.content)
+        self.assertEqual(r.json()["campo"], 1)
+        self.assertEqual(self.versiones(), versiones)
+        self.assertEqual(Campo.objects.count(), campos)
+
+
+class FormulariosBulkTests(ConTablaEntriesMixin, FormularioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.otros = [self.crear_formulario(f"Otro {i}") for i in range(2)]
+        ahora = timezone.now()
+        for _ in range(2):
+            FormularioEntry.objects.create(
+                id=uuid.uuid4(), form_id=self.form.pk, index_version_id=self.vigente().pk,
+                form_name="Encuesta", status="Enviado", created_at=ahora, updated_at=ahora,
+            )
+        self.falta = str(uuid.uuid4())
+        # el primero repetido al final: un solo resultado por id, en el orden pedido
+        self.ids = [str(self.form.pk), str(self.otros[0].pk), str(self.otros[1].pk), self.falta, str(self.form.pk)]
+
+    def post(self, accion, ids):
+        r = self.client.post(f"/api/formularios/bulk/{accion}/", {"ids": ids}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_suspender(self):
+        Formulario.objects.filter(pk=self.otros[1].pk).update(estado="Suspendida")
+        out = self.post("suspender", self.ids)
+        self.assertEqual(out["resultados"], [
+            {"id": self.ids[0], "resultado": "suspendido"},
+            {"id": self.ids[1], "resultado": "suspendido"},
+            {"id": self.ids[2], "resultado": "ya_suspendido"},
+            {"id": self.falta, "resultado": "no_encontrado"},
+        ])
+        self.assertEqual(out["totales"], {"suspendido": 2, "ya_suspendido": 1, "no_encontrado": 1})
+        self.assertEqual(set(Formulario.objects.filter(pk__in=self.ids[:3]).values_list("estado", flat=True)),
+                         {"Suspendida"})
+
+    def test_eliminar(self):
+        out = self.post("eliminar", self.ids)
+        self.assertEqual(out["resultados"], [
+            {"id": self.ids[0], "resultado": "con_respuestas", "entries_count": 2},
+            {"id": self.ids[1], "resultado": "eliminado"},
+            {"id": self.ids[2], "resultado": "eliminado"},
+            {"id": self.falta, "resultado": "no_encontrado"},
+        ])
+        self.assertEqual(out["totales"], {"con_respuestas": 1, "eliminado": 2, "no_encontrado": 1})
+        self.assertEqual(list(Formulario.objects.filter(pk__in=self.ids).values_list("pk", flat=True)), [self.form.pk])
+        self.assertEqual(Formulario.todos.filter(pk__in=self.ids[1:3], eliminado_en__isnull=False).count(), 2)
+
+
+class VersionarPaginasTests(FormularioTestCase):
+    def test_una_version_por_formulario(self):
+        otro = self.crear_formulario("Otro")
+        pagina_otro = Pagina.objects.get(puntero_version__id_index_version=otro.current_index_version)
+        anteriores = {str(self.form.pk): str(self.vigente().pk), str(otro.pk): str(otro.current_index_version_id)}
+        versiones = self.versiones()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte = versioning.versionar_paginas([self.general.pk, self.datos.pk, pagina_otro.pk])
+
+        por_formulario = {r["formulario_id"]: r for r in reporte}
+        self.assertEqual(set(por_formulario), set(anteriores))
+        r = por_formulario[str(self.form.pk)]
+        self.assertEqual(r["version_anterior"], anteriores[str(self.form.pk)])
+        self.assertEqual(r["nueva_version_id"], str(self.vigente().pk))
+        self.assertEqual(r["paginas"], sorted([str(self.general.pk), str(self.datos.pk)]))
+        self.assertEqual(self.versiones(), versiones + 1)
+        # los campos se movieron a las PaginaVersion nuevas
+        self.assertEqual(sorted(map(str, Pagina.objects.filter(pk__in=[self.general.pk, self.datos.pk])
+                                    .values_list("current_pagina_version_id", flat=True))),
+                         r["paginas_version"])
+        self.assertEqual(PaginaCampo.objects.filter(id_pagina_version_id__in=r["paginas_version"]).count(), 3)
+        self.assertEqual(self.arbol(), [("General", ["a", "b"]), ("Datos", ["c"])])
 
-# Create your tests here.
+    def test_patch_de_campo_versiona_y_registra(self):
+        campo = Campo.objects.get(nombre_campo="c")
+        anterior, versiones = str(self.vigente().pk), self.versiones()
+        with self.assertLogs("formularios.serializers", level="INFO") as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            r = self.client.patch(f"/api/campos/{campo.pk}/", {"etiqueta": "C2"}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(self.versiones(), versiones + 1)
+        self.assertEqual(logs.output, [
+            f"INFO:formularios.serializers:Campo {campo.pk} actualizado: formulario {self.form.pk}, "
+            f"versión {anterior} -> {self.vigente().pk} (1 página(s))",
+        ])
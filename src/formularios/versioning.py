@@ -0,0 +1,312 @@
+# versioning.py
+"""
+Motor de versionado de formularios.
+
+Publicar una versión nueva es siempre el mismo patrón, con un número FIJO de
+sentencias sin importar cuántas páginas tenga el formulario:
+
+  1) INSERT FormularioIndexVersion
+  2) INSERT Formulario_Index_Version (historial)
+  3) UPDATE Pagina_Index_Version: TODAS las páginas de la versión anterior
+     pasan a la nueva en una sola sentencia
+  4) UPDATE Formulario.current_index_version
+  5) Tras el COMMIT: invalidar la caché de la versión anterior y materializar
+     el snapshot de la nueva
+
+Los servicios (services.py) y las vistas deben versionar SOLO por aquí.
+
+Concurrencia: quien publica toma un lock de fila sobre el formulario
+(SELECT ... FOR UPDATE, hasta el COMMIT) y re-lee la versión vigente bajo ese
+lock. Dos ediciones del MISMO formulario se serializan; las de formularios
+distintos no se bloquean entre sí. Las vistas además comparan la versión en
+la que se basó el cliente (If-Match / version_base) con verificar_version.
+"""
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from . import schema_cache, snapshots
+from .models import (
+    Formulario,
+    Formulario_Index_Version,
+    FormularioIndexVersion,
+    Pagina,
+    Pagina_Index_Version,
+    PaginaCampo,
+    PaginaVersion,
+)
+
+
+class VersionDesactualizada(Exception):
+    """La versión en la que se basó la escritura ya no es la vigente."""
+
+    def __init__(self, formulario_id, esperada, actual):
+        super().__init__(f"El formulario {formulario_id} está en la versión {actual}, no en {esperada}.")
+        self.formulario_id = formulario_id
+        self.esperada = esperada
+        self.actual = actual
+
+
+def bloquear(formulario_ids: Iterable[Any]) -> Dict[Any, Formulario]:
+    """
+    Lock de fila (FOR UPDATE) sobre los formularios, en orden de PK para no
+    generar deadlocks entre ediciones que tocan varios. Dura hasta el COMMIT.
+    """
+    ids = sorted({str(fid) for fid in formulario_ids if fid})
+    if not ids:
+        return {}
+    return {f.pk: f for f in Formulario.objects.select_for_update().filter(pk__in=ids).order_by("pk")}
+
+
+def verificar_version(formulario_id, esperada) -> Formulario:
+    """
+    Bloquea el formulario y confirma que `esperada` (id de FormularioIndexVersion)
+    siga siendo la vigente; si no, lanza VersionDesactualizada.
+    """
+    formulario = bloquear([formulario_id]).get(uuid.UUID(str(formulario_id)))
+    if formulario is None:
+        raise Formulario.DoesNotExist(formulario_id)
+    if esperada is not None and formulario.current_index_version_id != uuid.UUID(str(esperada)):
+        raise VersionDesactualizada(formulario.pk, esperada, formulario.current_index_version_id)
+    return formulario
+
+
+def version_vigente(formulario: Formulario) -> Optional[FormularioIndexVersion]:
+    """
+    FormularioIndexVersion vigente del formulario.
+    Usa el puntero current_index_version; si aún no está poblado, cae al
+    historial ordenado por fecha.
+    """
+    if formulario.current_index_version_id:
+        return formulario.current_index_version
+    link = (Formulario_Index_Version.objects
+            .filter(id_formulario=formulario)
+            .select_related("id_index_version")
+            .order_by("-id_index_version__fecha_creacion")
+            .first())
+    return link.id_index_version if link else None
+
+
+def pagina_version_vigente(pagina: Pagina) -> Optional[PaginaVersion]:
+    # Puntero directo (salto por PK); el orden por fecha solo cubre filas sin backfill
+    if pagina.current_pagina_version_id:
+        return pagina.current_pagina_version
+    return (PaginaVersion.objects
+            .filter(id_pagina=pagina)
+            .order_by("-fecha_creacion")
+            .first())
+
+
+def formulario_de_version(version: FormularioIndexVersion) -> Optional[Formulario]:
+    link = (Formulario_Index_Version.objects
+            .filter(id_index_version=version)
+            .select_related("id_formulario")
+            .first())
+    return link.id_formulario if link else None
+
+
+def registrar_version(formulario: Formulario, snapshot: bool = True) -> FormularioIndexVersion:
+    """
+    Crea una FormularioIndexVersion, la registra en el historial y la deja como
+    vigente (current_index_version). NO mueve punteros de páginas (ver
+    publicar_version). El snapshot del esquema se materializa tras el COMMIT.
+    """
+    fiv = FormularioIndexVersion.objects.create()
+    Formulario_Index_Version.objects.create(id_index_version=fiv, id_formulario=formulario)
+    Formulario.objects.filter(pk=formulario.pk).update(current_index_version=fiv)
+    formulario.current_index_version = fiv
+    if snapshot:
+        snapshots.materializar_al_confirmar(formulario.pk)
+    return fiv
+
+
+def crear_pagina_version(pagina: Pagina) -> PaginaVersion:
+    """Crea una PaginaVersion vacía y la deja como vigente (current_pagina_version)."""
+    pv = PaginaVersion.objects.create(
+        id_pagina_version=uuid.uuid4().hex,
+        fecha_creacion=timezone.now(),
+        id_pagina=pagina,
+    )
+    Pagina.objects.filter(pk=pagina.pk).update(current_pagina_version=pv)
+    pagina.current_pagina_version = pv
+    return pv
+
+
+def crear_paginas_version(paginas: List[Pagina]) -> Dict[str, PaginaVersion]:
+    """
+    crear_pagina_version para varias páginas: un INSERT de PaginaVersion y un
+    UPDATE de punteros para todas. Devuelve {str(id_pagina): PaginaVersion}.
+    """
+    ahora = timezone.now()
+    nuevas = {
+        str(p.pk): PaginaVersion(id_pagina_version=uuid.uuid4().hex, fecha_creacion=ahora, id_pagina=p)
+        for p in paginas
+    }
+    if not nuevas:
+        return nuevas
+    PaginaVersion.objects.bulk_create(nuevas.values())
+    for p in paginas:
+        p.current_pagina_version = nuevas[str(p.pk)]
+    Pagina.objects.bulk_update(paginas, ["current_pagina_version"])
+    return nuevas
+
+
+def mover_campos(mover: Dict[str, str]) -> int:
+    """
+    MUEVE los PaginaCampo de cada PaginaVersion vieja a su nueva
+    ({vieja: nueva}) en un solo UPDATE con CASE.
+    """
+    if not mover:
+        return 0
+    return (PaginaCampo.objects
+            .filter(id_pagina_version_id__in=list(mover))
+            .update(id_pagina_version=Case(
+                *[When(id_pagina_version_id=vieja, then=Value(nueva)) for vieja, nueva in mover.items()],
+                output_field=CharField(),
+            )))
+
+
+def reescribir_secuencias(model, columna: str, valores: Dict[Any, int]) -> int:
+    """
+    Escribe {pk: posición} en `columna` con UNA sentencia, sin importar cuántas
+    filas: en PostgreSQL un UPDATE ... FROM (VALUES ...) (con los tipos de las
+    columnas, para que use el índice de la PK); en otros motores un CASE.
+    """
+    if not valores:
+        return 0
+    if connection.vendor != "postgresql":
+        return (model.objects
+                .filter(pk__in=list(valores))
+                .update(**{columna: Case(
+                    *[When(pk=pk, then=Value(pos)) for pk, pos in valores.items()],
+                    output_field=model._meta.get_field(columna),
+                )}))
+
+    pk = model._meta.pk
+    campo = model._meta.get_field(columna)
+    tipo_pk, tipo_col = pk.db_type(connection), campo.db_type(connection).split(" ")[0]
+    filas = ", ".join([f"(%s::{tipo_pk}, %s::{tipo_col})"] * len(valores))
+    params = []
+    for k, pos in valores.items():
+        params += [pk.get_db_prep_value(pk.to_python(k), connection), pos]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cur:
+        cur.execute(
+            f"UPDATE {qn(model._meta.db_table)} AS t SET {qn(campo.column)} = v.pos "
+            f"FROM (VALUES {filas}) AS v(pk, pos) WHERE t.{qn(pk.column)} = v.pk",
+            params,
+        )
+        return cur.rowcount
+
+
+@transaction.atomic
+def publicar_version(formulario: Formulario,
+                     anterior: Optional[FormularioIndexVersion] = None) -> FormularioIndexVersion:
+    """
+    Publica v+1 del formulario: nueva versión + historial + TODAS las páginas
+    de la versión vigente re-apuntadas con un solo UPDATE.
+
+    La vigente se re-lee bajo el lock del formulario: si otra transacción
+    publicó entre la lectura del llamador y este punto, se parte de la suya
+    (no de `anterior`) y sus páginas no quedan huérfanas.
+    """
+    bloqueado = bloquear([formulario.pk]).get(formulario.pk)
+    vigente_id = bloqueado.current_index_version_id if bloqueado is not None else None
+    if vigente_id and (anterior is None or anterior.pk != vigente_id):
+        anterior = FormularioIndexVersion.objects.get(pk=vigente_id)
+    elif anterior is None:
+        anterior = version_vigente(formulario)
+
+    nueva = registrar_version(formulario)
+    if anterior is not None:
+        (Pagina_Index_Version.objects
+         .filter(id_index_version=anterior)
+         .update(id_index_version=nueva))
+        schema_cache.invalidar_al_confirmar(anterior.pk)
+    return nueva
+
+
+def publicar_desde_pagina(pagina: Pagina) -> Optional[FormularioIndexVersion]:
+    """
+    Publica v+1 del formulario al que pertenece `pagina` (vía su puntero).
+    Devuelve None si la página no está enlazada a ningún formulario.
+    """
+    piv = (Pagina_Index_Version.objects
+           .filter(id_pagina=pagina)
+           .select_related("id_index_version")
+           .first())
+    if not piv:
+        return None
+    formulario = formulario_de_version(piv.id_index_version)
+    if formulario is None:
+        return None
+    return publicar_version(formulario, piv.id_index_version)
+
+
+@transaction.atomic
+def versionar_paginas(pagina_ids: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Nueva PaginaVersion para cada página (moviendo sus PaginaCampo) y UNA
+    versión nueva por formulario afectado, sin importar cuántas de sus
+    páginas cambien. El trabajo queda acotado por formularios, no por páginas.
+
+    Devuelve un reporte por formulario. Las páginas sin formulario se
+    versionan igual pero no aparecen en el reporte.
+    """
+    pagina_ids = list(pagina_ids)
+    if not pagina_ids:
+        return []
+    # lock de los formularios ANTES de leer las versiones vigentes de las páginas
+    bloquear(Formulario_Index_Version.objects
+             .filter(id_index_version__paginas_puntero__id_pagina_id__in=pagina_ids)
+             .values_list("id_formulario_id", flat=True))
+    paginas = list(Pagina.objects.filter(pk__in=pagina_ids))
+    if not paginas:
+        return []
+
+    # 1) Versión de formulario a la que apunta cada página y su formulario (una consulta)
+    enlaces = {
+        str(pid): (fiv_id, fid) for pid, fiv_id, fid in Pagina_Index_Version.objects
+        .filter(id_pagina__in=paginas)
+        .values_list("id_pagina_id", "id_index_version_id", "id_index_version__row_historial__id_formulario_id")
+    }
+
+    # 2) PaginaVersion vigente de cada página; el orden por fecha solo cubre filas sin backfill
+    anteriores = {}
+    for p in paginas:
+        if p.current_pagina_version_id:
+            anteriores[str(p.pk)] = p.current_pagina_version_id
+        else:
+            pv = pagina_version_vigente(p)
+            anteriores[str(p.pk)] = pv.pk if pv else None
+
+    # 3) PaginaVersion nuevas en lote + mover todos los PaginaCampo en un UPDATE
+    nuevas = crear_paginas_version(paginas)
+    mover_campos({anteriores[pid]: pv.pk for pid, pv in nuevas.items() if anteriores[pid]})
+
+    # 4) Una versión nueva por formulario
+    por_formulario: Dict[Any, Dict[str, Any]] = {}
+    for pid in nuevas:
+        fiv_id, fid = enlaces.get(pid, (None, None))
+        if fid is None:
+            continue
+        grupo = por_formulario.setdefault(fid, {"anterior": fiv_id, "paginas": []})
+        grupo["paginas"].append(pid)
+
+    formularios = Formulario.objects.in_bulk(list(por_formulario))
+    versiones = FormularioIndexVersion.objects.in_bulk([g["anterior"] for g in por_formulario.values()])
+    reporte = []
+    for fid, grupo in por_formulario.items():
+        anterior = versiones[grupo["anterior"]]
+        nueva = publicar_version(formularios[fid], anterior)
+        reporte.append({
+            "formulario_id": str(fid),
+            "version_anterior": str(anterior.pk),
+            "nueva_version_id": str(nueva.pk),
+            "paginas": sorted(grupo["paginas"]),
+            "paginas_version": sorted(nuevas[pid].pk for pid in grupo["paginas"]),
+        })
+    return reporte
@@ -1,4 +1,6 @@
 import json
+import logging
+from typing import Any, Dict
 from formularios.exports import content_bytes_para_un_form, excel_bytes_para_un_form, zip_bytes_todos_los_forms
 from .services import _materializar_dataset_para_campo, _uuid32, _uuid32_no_dashes, crear_campo_en_pagina
 from rest_framework import status, filters, viewsets
@@ -10,18 +12,25 @@ from .models import Campo, CampoGrupo, Categoria, Formulario, Formulario_Index_V
 from .serializers import AsignacionBulkSerializer, CampoSerializer, CampoUpdateSerializer, CategoriaSerializer, CrearCampoEnPaginaSerializer, FormularioListSerializer, FormularioLiteSerializer, FormularioSerializer, FormularioUpdateSerializer, PaginaConCamposSerializer, PaginaSerializer, PaginaUpdateSerializer, UserFormularioSerializer, UsuarioCreateSerializer, UsuarioDetalleSerializer, GrupoSerializer, UsuarioLiteSerializer, UsuarioUpdateSerializer
 from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 import uuid
 from django.db.models import Q, Count
 from .azure_storage import AzureBlobStorageService
-from .models import FuenteDatos
-from .serializers import FuenteDatosSerializer, FuenteDatosCreateSerializer
+from .models import FormularioSnapshot, FuenteDatos
+from .serializers import CambiosFormularioSerializer, CamposBulkSerializer, FormularioBorradorSerializer, FormularioImportSerializer, FormulariosBulkSerializer, FuenteDatosSerializer, FuenteDatosCreateSerializer, FormularioSnapshotSerializer, ReordenarSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
-from . import services
+from rest_framework.utils.urls import replace_query_param
+from . import borradores, changeset, dataset_items, form_diff, form_import, form_sync, schema_cache, services, snapshots, versioning
+from .form_tree import _cfg_dict, subquery_version_actual
+from .pagination import FormularioCursorPagination, SnapshotCursorPagination
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse, OpenApiExample, OpenApiParameter, inline_serializer
 
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import serializers, viewsets
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError as DjangoValidationError
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -65,14 +74,10 @@ class FuenteDatosViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_409_CONFLICT,
             )
 
-        # 1) Guardamos el blob_name y borramos el registro (cascade limpia los valores)
-        blob_name = fuente.blob_name
-        response = super().destroy(request, *args, **kwargs)
-
-        # 2) Al confirmar la transacción, eliminamos el blob en Azure
-        transaction.on_commit(lambda: AzureBlobStorageService().delete_file(blob_name))
-
-        return response
+        # 1) Borrado lógico: deja de listarse al instante; el blob y la fila los
+        #    elimina `manage.py purgar_eliminados` (con reintentos)
+        FuenteDatos.objects.filter(pk=fuente.pk).update(eliminado_en=timezone.now())
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
     @transaction.atomic
     def create(self, request, *args, **kwargs):
@@ -201,6 +206,8 @@ class FuenteDatosViewSet(viewsets.ModelViewSet):
             fuente.columnas = columnas
             fuente.preview_data = preview
             fuente.save()
+            archivo.seek(0)
+            content = archivo.read()
         else:
             # 2) Aunque no suban archivo, refrescar columnas/preview desde el blob actual
             from io import BytesIO
@@ -212,33 +219,53 @@ class FuenteDatosViewSet(viewsets.ModelViewSet):
             fuente.preview_data = preview
             fuente.save(update_fields=["columnas", "preview_data"])
 
-        # 3) Rematerializar catálogos (FDV) de todos los campos que usan esta fuente
+        # 3) Rematerializar catálogos (FDV) de todos los campos que usan esta fuente;
+        #    el archivo se parsea UNA vez (sin volver a descargarlo) y se comparte entre campos
         campos = (Campo.objects
                   .filter(dataset_vals__fuente=fuente)
                   .distinct())
+        error_lectura = None
+        try:
+            tablas = {str(fuente.pk): services.leer_fuente(fuente, contenido=content)}
+        except Exception as e:
+            # sin tabla no hay nada que rematerializar; los catálogos quedan como estaban
+            error_lectura = str(e.messages[0] if hasattr(e, "messages") else e)
+            logger.warning("Rematerializar falló al leer la fuente %s: %s", fuente.pk, error_lectura)
+            campos = Campo.objects.none()
         total_campos = 0
-        total_valores = 0
+        totales = {"insertados": 0, "actualizados": 0, "eliminados": 0}
+        campos_cambiados = []
         for c in campos:
             try:
                 cfg = c.config
                 if isinstance(cfg, str):
                     import json
                     cfg = json.loads(cfg or "{}")
-                inserted = _materializar_dataset_para_campo(cfg or {}, c)
+                resultado = _materializar_dataset_para_campo(cfg or {}, c, tablas)
                 # guardar config normalizada (la función puede ajustar columnas/alias)
                 c.config = json.dumps(cfg or {}, ensure_ascii=False)
                 c.save(update_fields=["config"])
                 total_campos += 1
-                total_valores += int(inserted or 0)
-            except Exception as e:
+                for k in totales:
+                    totales[k] += resultado[k]
+                if resultado["insertados"] or resultado["actualizados"] or resultado["eliminados"]:
+                    campos_cambiados.append(c.id_campo)
+            except Exception:
                 # si algo falla en un campo particular, sigue con los demás
-                print(f"Rematerializar falló para campo {c.id_campo}: {e}")
+                logger.exception("Rematerializar falló para campo %s", c.id_campo)
+
+        # los catálogos embebidos en el esquema cambiaron sin versión nueva
+        # (solo los formularios cuyos catálogos realmente cambiaron)
+        services.marcar_contenido_modificado(services.formularios_de_campos(campos_cambiados))
 
         data = FuenteDatosSerializer(fuente).data
         data.update({
             "rematerializacion": {
                 "campos_afectados": total_campos,
-                "valores_insertados": total_valores
+                "valores_insertados": totales["insertados"],
+                "valores_actualizados": totales["actualizados"],
+                "valores_eliminados": totales["eliminados"],
+                **({"error": error_lectura} if error_lectura else {}),
             }
         })
         return Response(data, status=status.HTTP_200_OK)
@@ -268,12 +295,75 @@ class CategoriaViewSet(viewsets.ModelViewSet):
             )
         return super().destroy(request, *args, **kwargs)
 
+
+_IF_MATCH = OpenApiParameter(
+    name="If-Match",
+    description="ETag recibido en GET /api/formularios/{id}/; 412 si el formulario cambió desde entonces. "
+                "Alternativa: version_base (current_index_version) en el cuerpo (409).",
+    required=False,
+    type=str,
+    location=OpenApiParameter.HEADER,
+)
+
+
+def _mismo_uuid(valor, esperado) -> bool:
+    try:
+        return uuid.UUID(str(valor).strip().strip('"')) == uuid.UUID(str(esperado))
+    except ValueError:
+        return False
+
+
+def _etags_actuales(formulario_ids):
+    """ETag que serviría hoy el detalle de cada formulario (ver _etag_formulario)."""
+    qs = (Formulario.objects.filter(pk__in=formulario_ids)
+          .select_related("categoria")
+          .annotate(version_actual_id=subquery_version_actual()))
+    return {f.pk: _etag_formulario(f) for f in qs}
+
+
+def _verificar_version_base(request, formulario_ids):
+    """
+    Concurrencia optimista de las ediciones de diseño. Bloquea los formularios
+    (FOR UPDATE, hasta el COMMIT) y compara su estado actual con el que mandó
+    el cliente. Se llama dentro de un transaction.atomic() explícito, justo
+    antes de escribir y después de cualquier descarga de fuentes:
+      - If-Match: el ETag servido por GET /formularios/{id}/ → 412 si cambió
+        (comparación fuerte, RFC 9110 §13.1.1)
+      - version_base (cuerpo o query): current_index_version → 409 si no coincide
+    Sin ninguno de los dos solo bloquea. Devuelve la Response de error o None.
+    """
+    formularios = versioning.bloquear(formulario_ids)
+    if_match = request.headers.get("If-Match")
+    base = request.query_params.get("version_base")
+    if base is None and isinstance(request.data, dict):
+        base = request.data.get("version_base")
+
+    etags = parse_etags(if_match) if if_match else []
+    actuales = _etags_actuales(formularios) if etags and "*" not in etags else {}
+    for form in formularios.values():
+        actual = form.current_index_version_id
+        if form.pk in actuales and actuales[form.pk] not in etags:
+            return Response(
+                {"detail": "El formulario cambió desde el ETag indicado en If-Match.",
+                 "etag": actuales[form.pk],
+                 "version_actual": str(actual)},
+                status=status.HTTP_412_PRECONDITION_FAILED,
+            )
+        if not if_match and base and not _mismo_uuid(base, actual):
+            return Response(
+                {"detail": "El formulario cambió desde version_base; recargue y vuelva a aplicar los cambios.",
+                 "version_actual": str(actual)},
+                status=status.HTTP_409_CONFLICT,
+            )
+    return None
+
+
 @extend_schema_view(
     list=extend_schema(tags=["Páginas"]),
     retrieve=extend_schema(tags=["Páginas"]),
     create=extend_schema(exclude=True),
-    partial_update=extend_schema(tags=["Páginas"]),
-    destroy=extend_schema(tags=["Páginas"]),
+    partial_update=extend_schema(tags=["Páginas"], parameters=[_IF_MATCH]),
+    destroy=extend_schema(tags=["Páginas"], parameters=[_IF_MATCH]),
 )
 class PaginaViewSet(viewsets.ModelViewSet):
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
@@ -293,6 +383,21 @@ class PaginaViewSet(viewsets.ModelViewSet):
             self.serializer_class = PaginaConCamposSerializer
         return super().retrieve(request, *args, **kwargs)
 
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        error = _verificar_version_base(request, services.formularios_de_paginas([self.get_object().pk]))
+        return error or super().update(request, *args, **kwargs)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        error = _verificar_version_base(request, services.formularios_de_paginas([self.get_object().pk]))
+        return error or super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        formulario_ids = services.formularios_de_paginas([instance.pk])
+        super().perform_destroy(instance)
+        services.marcar_contenido_modificado(formulario_ids)
+
     @extend_schema(tags=["Campos"], summary="Listar campos de la página")
     @action(detail=True, methods=["get"], url_path="campos")
     def campos(self, request, id_pagina=None):
@@ -315,6 +420,7 @@ class PaginaViewSet(viewsets.ModelViewSet):
                             "config": serializers.JSONField(),
                         },
                    ),
+                   parameters=[_IF_MATCH],
                    responses=CampoSerializer,
                 )
     @action(detail=True, methods=["post"], url_path="campos")
@@ -322,9 +428,18 @@ class PaginaViewSet(viewsets.ModelViewSet):
 
         ser = CrearCampoEnPaginaSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        # la fuente de un campo dataset se descarga y parsea ANTES del lock
+        tablas = changeset.leer_fuentes([{**ser.validated_data, "op": "agregar_campo"}])
+        with transaction.atomic():
+            return self._agregar_campo(request, id_pagina, ser.validated_data, tablas)
+
+    def _agregar_campo(self, request, id_pagina, datos, tablas):
+        error = _verificar_version_base(request, services.formularios_de_paginas([id_pagina]))
+        if error:
+            return error
 
         # 1) Crear el campo en la página
-        out = crear_campo_en_pagina(str(id_pagina), ser.validated_data)
+        out = crear_campo_en_pagina(str(id_pagina), datos, tablas)
 
         # 2) Buscar el campo recién creado
         campo = get_object_or_404(Campo, id_campo=out["id_campo"])
@@ -361,9 +476,112 @@ class PaginaViewSet(viewsets.ModelViewSet):
 
         return Response(out, status=status.HTTP_201_CREATED)
 
+    @extend_schema(tags=["Campos"], summary="Agregar varios campos a la página (una sola versión nueva)",
+                   request=CamposBulkSerializer,
+                   parameters=[_IF_MATCH],
+                   responses={
+                       201: OpenApiTypes.OBJECT,
+                       400: OpenApiResponse(description="Campo inválido; `campo` indica su índice y no se crea ninguno"),
+                   },
+                   examples=[OpenApiExample("Grupo con hijos", request_only=True, value={"campos": [
+                       {"clase": "group", "nombre_campo": "parcela", "etiqueta": "Parcela", "ref": "g"},
+                       {"clase": "number", "nombre_campo": "area", "etiqueta": "Área", "grupo": "g"},
+                       {"clase": "text", "nombre_campo": "cultivo", "etiqueta": "Cultivo", "grupo": "g"},
+                   ]})],
+                )
+    @action(detail=True, methods=["post"], url_path="campos/bulk")
+    def agregar_campos_bulk(self, request, id_pagina=None):
+        """
+        Valida TODOS los campos antes de escribir; después los inserta en lote
+        (Campo, Grupo, CampoGrupo y PaginaCampo con sequence precalculada) y
+        versiona la página y su formulario UNA sola vez (ver changeset.py).
+        """
+        pagina = self.get_object()
+        ser = CamposBulkSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        formulario_ids = services.formularios_de_paginas([pagina.pk])
+        if not formulario_ids:
+            return Response({"detail": "La página no pertenece a ningún formulario."}, status=status.HTTP_400_BAD_REQUEST)
+
+        operaciones = [{**c, "op": "agregar_campo", "pagina": str(pagina.pk)} for c in ser.validated_data["campos"]]
+        try:
+            tablas = changeset.leer_fuentes(operaciones)     # fuera del lock
+            with transaction.atomic():
+                error = _verificar_version_base(request, formulario_ids)
+                if error:
+                    return error
+                out = changeset.aplicar(Formulario.objects.get(pk=formulario_ids[0]), operaciones, tablas=tablas)
+        except changeset.CambioInvalido as e:
+            return Response({"detail": e.mensaje, "campo": e.indice}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"detail": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "formulario_id": out["formulario_id"],
+            "nueva_version_id": out["nueva_version_id"],
+            "campos": out["campos_creados"],
+        }, status=status.HTTP_201_CREATED)
+
+    @extend_schema(tags=["Campos"], summary="Reordenar los campos de la página y/o las páginas de su formulario",
+                   request=ReordenarSerializer,
+                   parameters=[_IF_MATCH],
+                   responses={
+                       200: OpenApiTypes.OBJECT,
+                       400: OpenApiResponse(description="La lista no es el orden completo (faltan, sobran o se repiten ids)"),
+                   },
+                   examples=[OpenApiExample("Campos", request_only=True, value={
+                       "campos": ["8a7c0b7e-5a53-4a35-9d0c-3c7b2a3a0f11", "1f0e6c1d-7f55-4b07-8b0b-2f3c4d5e6f70"],
+                   })],
+                )
+    @action(detail=True, methods=["post"], url_path="reordenar")
+    def reordenar(self, request, id_pagina=None):
+        """
+        Recibe el orden COMPLETO y reescribe PaginaCampo.sequence (y/o
+        Pagina.secuencia) en una sola sentencia; la página y su formulario se
+        versionan UNA vez, en lugar de un PATCH y una versión por campo.
+        """
+        pagina = self.get_object()
+        ser = ReordenarSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        formulario_ids = services.formularios_de_paginas([pagina.pk])
+        if not formulario_ids:
+            return Response({"detail": "La página no pertenece a ningún formulario."}, status=status.HTTP_400_BAD_REQUEST)
+
+        operaciones = []
+        if ser.validated_data.get("paginas"):
+            operaciones.append({"op": "reordenar", "completo": True,
+                                "paginas": [str(p) for p in ser.validated_data["paginas"]]})
+        if ser.validated_data.get("campos"):
+            operaciones.append({"op": "reordenar", "completo": True, "pagina": str(pagina.pk),
+                                "campos": [str(c) for c in ser.validated_data["campos"]]})
+        try:
+            with transaction.atomic():
+                error = _verificar_version_base(request, formulario_ids)
+                if error:
+                    return error
+                out = changeset.aplicar(Formulario.objects.get(pk=formulario_ids[0]), operaciones)
+        except changeset.CambioInvalido as e:
+            return Response({"detail": e.mensaje}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "formulario_id": out["formulario_id"],
+            "nueva_version_id": out["nueva_version_id"],
+            "paginas_versionadas": out["paginas_versionadas"],
+        })
+
 
         
 
+def _resultados_bulk(por_id: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """{"resultados": [{id, resultado, ...}], "totales": {resultado: n}} en el orden pedido."""
+    totales: Dict[str, int] = {}
+    for r in por_id.values():
+        totales[r["resultado"]] = totales.get(r["resultado"], 0) + 1
+    return {"resultados": [{"id": fid, **r} for fid, r in por_id.items()], "totales": totales}
+
+
 @extend_schema_view(
     list=extend_schema(tags=["Formularios"]),
     retrieve=extend_schema(tags=["Formularios"]),
@@ -373,6 +591,42 @@ class FormularioListViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Formulario.objects.all()
     serializer_class = FormularioListSerializer
 
+
+def _etag_formulario(form) -> str:
+    """
+    ETag fuerte del detalle de un formulario, sin serializar páginas.
+
+    Combina la versión actual (FormularioIndexVersion), la revisión de
+    contenido (cambios sin versión nueva, p.ej. rematerializar un dataset)
+    y las columnas propias del formulario + nombre de la categoría.
+    """
+    return quote_etag(services.huella_formulario(form))
+
+
+def _acepta_gzip(request) -> bool:
+    for parte in request.headers.get("Accept-Encoding", "").split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if nombre.strip().lower() in ("gzip", "*"):
+            q = params.strip().removeprefix("q=")
+            try:
+                return float(q) > 0 if q else True
+            except ValueError:
+                return True
+    return False
+
+
+def _etag_coincide(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if "*" in etags:
+        return True
+    # If-None-Match usa comparación débil (RFC 9110 §13.1.2)
+    limpio = etag.removeprefix("W/")
+    return any(e.removeprefix("W/") == limpio for e in etags)
+
+
 @extend_schema_view(
     list=extend_schema(tags=["Formularios"]),
     retrieve=extend_schema(tags=["Formularios"]),
@@ -386,6 +640,43 @@ class FormularioViewSet(viewsets.ModelViewSet):
     serializer_class = FormularioSerializer
     lookup_field = "id"
 
+    pagination_class = FormularioCursorPagination
+
+    def _parametro_lista(self, nombre):
+        raw = self.request.query_params.get(nombre)
+        if raw is None:
+            return None
+        return [x.strip() for x in raw.split(",") if x.strip()]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ("retrieve", "esquema", "versiones", "diff"):
+            # una sola consulta indexada: formulario + categoría + versión actual
+            qs = qs.select_related("categoria").annotate(version_actual_id=subquery_version_actual())
+        elif self.action == "list":
+            qs = qs.select_related("categoria")
+            if "paginas" in (self._parametro_lista("expand") or []):
+                qs = qs.annotate(version_actual_id=subquery_version_actual())
+        return qs
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list":
+            # proyección: ?fields=a,b,c  y  ?expand=paginas (por defecto sin páginas)
+            kwargs.setdefault("fields", self._parametro_lista("fields"))
+            kwargs.setdefault("expand", self._parametro_lista("expand") or [])
+        return super().get_serializer(*args, **kwargs)
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Listar formularios (paginado por cursor)",
+        parameters=[
+            OpenApiParameter(name="fields", description="Campos a devolver, separados por coma", required=False, type=str),
+            OpenApiParameter(name="expand", description="Relaciones costosas a incluir (paginas)", required=False, type=str, enum=["paginas"]),
+        ],
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == "list":
             return FormularioSerializer
@@ -422,70 +713,16 @@ class FormularioViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_409_CONFLICT
             )
         
-        # 2) Sin respuestas → elimina en cascada como ya lo hacías
-        try:
-            self._delete_formulario_cascade(formulario_id)
-            return Response(
-                {
-                    "detail": f"Formulario {formulario_id} eliminado exitosamente",
-                    "deleted_id": formulario_id
-                },
-                status=status.HTTP_204_NO_CONTENT
-            )
-        except Exception as e:
-            transaction.set_rollback(True)
-            return Response(
-                {"detail": f"Error eliminando formulario: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-    def _delete_formulario_cascade(self, formulario_id: str):
-        with transaction.atomic():
-            form = Formulario.objects.get(pk=formulario_id)
-
-            # 1) versiones del formulario (via historial)
-            fiv_ids = list(
-                Formulario_Index_Version.objects
-                .filter(id_formulario=form)
-                .values_list("id_index_version", flat=True)
-            )
-
-            # 2) páginas del formulario (via punteros a cada versión)
-            page_ids = list(
-                Pagina_Index_Version.objects
-                .filter(id_index_version_id__in=fiv_ids)
-                .values_list("id_pagina", flat=True)
-            )
-
-            # 3) pagina_version ids (con FK real a Pagina)
-            pv_ids = list(
-                PaginaVersion.objects
-                .filter(id_pagina_id__in=page_ids)
-                .values_list("id_pagina_version", flat=True)
-            )
-
-            # 4) borrar links campo<->pagina_version
-            if pv_ids:
-                PaginaCampo.objects.filter(id_pagina_version_id__in=pv_ids).delete()
-
-            # 5) borrar pagina_version
-            PaginaVersion.objects.filter(id_pagina_id__in=page_ids).delete()
-
-            # 6) (opcional) borrar campos huérfanos
-            Campo.objects.filter(enlaces_pagina__isnull=True).delete()
-
-            # 7) borrar punteros página<->versión y páginas
-            if page_ids:
-                Pagina_Index_Version.objects.filter(id_pagina_id__in=page_ids).delete()
-                Pagina.objects.filter(id_pagina__in=page_ids).delete()
-
-            # 8) borrar historial y versiones
-            if fiv_ids:
-                Formulario_Index_Version.objects.filter(id_index_version_id__in=fiv_ids).delete()
-                FormularioIndexVersion.objects.filter(pk__in=fiv_ids).delete()
-
-            # 9) por último, el formulario
-            form.delete()
+        # 2) Sin respuestas → borrado lógico (un UPDATE); versiones, páginas y
+        #    campos los elimina en lotes `manage.py purgar_eliminados`
+        Formulario.objects.filter(pk=formulario.pk).update(eliminado_en=timezone.now())
+        return Response(
+            {
+                "detail": f"Formulario {formulario_id} eliminado exitosamente",
+                "deleted_id": formulario_id
+            },
+            status=status.HTTP_204_NO_CONTENT
+        )
 
     @extend_schema(
         tags=["Páginas"], 
@@ -499,40 +736,31 @@ class FormularioViewSet(viewsets.ModelViewSet):
             },
         ),
         responses=PaginaSerializer,
+        parameters=[_IF_MATCH],
         examples=[OpenApiExample("Crear página", value={"nombre":"Datos de parcela","secuencia":1})],
     )
     @action(detail=True, methods=['post'], url_path='agregar-pagina')
     @transaction.atomic
     def agregar_pagina(self, request, *args, **kwargs):
         formulario = self.get_object()
+        error = _verificar_version_base(request, [formulario.pk])
+        if error:
+            return error
+        formulario.refresh_from_db(fields=["current_index_version"])
         bump = request.query_params.get("bump", "1") != "0"
 
-        # última versión del formulario por fecha
-        link = (Formulario_Index_Version.objects
-                .filter(id_formulario=formulario)
-                .select_related("id_index_version")
-                .order_by("-id_index_version__fecha_creacion")
-                .first())
-
-        if link:
-            ultima_version = link.id_index_version
-        else:
-            ultima_version = FormularioIndexVersion.objects.create()
-            Formulario_Index_Version.objects.create(id_index_version=ultima_version, id_formulario=formulario)
+        # versión vigente del formulario (puntero directo)
+        ultima_version = versioning.version_vigente(formulario)
+        if ultima_version is None:
+            ultima_version = versioning.registrar_version(formulario)
 
         version_destino = ultima_version
         if bump:
-            version_destino = FormularioIndexVersion.objects.create()
-            Formulario_Index_Version.objects.create(id_index_version=version_destino, id_formulario=formulario)
-            # mover punteros de TODAS las páginas del form a la nueva versión
-            page_ids = (Pagina_Index_Version.objects
-                        .filter(id_index_version=ultima_version)
-                        .values_list("id_pagina", flat=True))
-            for pid in page_ids:
-                Pagina_Index_Version.objects.update_or_create(
-                    id_pagina_id=pid,
-                    defaults={"id_index_version": version_destino},
-                )
+            # nueva versión + punteros de TODAS las páginas en un solo UPDATE
+            version_destino = versioning.publicar_version(formulario, ultima_version)
+        else:
+            # la página se agrega a la versión actual: el esquema cambia sin versión nueva
+            services.marcar_contenido_modificado([formulario.pk])
 
         # secuencia = max + 1 entre páginas del formulario (en la versión destino)
         last_seq = (Pagina.objects
@@ -554,11 +782,7 @@ class FormularioViewSet(viewsets.ModelViewSet):
             defaults={"id_index_version": version_destino},
         )
 
-        PaginaVersion.objects.create(
-            id_pagina_version=_uuid32(),
-            id_pagina=nueva_pagina,
-            fecha_creacion=timezone.now(),
-        )
+        versioning.crear_pagina_version(nueva_pagina)
 
         return Response({"ok": True, "id_pagina": str(nueva_pagina.id_pagina)}, status=201)
 
@@ -572,7 +796,19 @@ class FormularioViewSet(viewsets.ModelViewSet):
         form.save(update_fields=["estado"])
         return Response({"ok": True, "id": str(form.id), "estado": form.estado}, status=200)
 
-    @extend_schema(tags=["Formularios"], summary="No permite abrir formularios suspendidos")
+    @extend_schema(
+        tags=["Formularios"],
+        summary="No permite abrir formularios suspendidos",
+        parameters=[
+            OpenApiParameter(
+                name="If-None-Match",
+                description="ETag recibido anteriormente; responde 304 si el formulario no cambió",
+                required=False,
+                type=str,
+                location=OpenApiParameter.HEADER,
+            ),
+        ],
+    )
     def retrieve(self, request, *args, **kwargs):
         obj = self.get_object()
         if (obj.estado or "").lower() == "suspendida":
@@ -580,7 +816,344 @@ class FormularioViewSet(viewsets.ModelViewSet):
                 {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
                 status=423  # Locked
             )
-        return super().retrieve(request, *args, **kwargs)
+
+        etag = _etag_formulario(obj)
+        if _etag_coincide(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        serializer = self.get_serializer(obj)
+        return Response(serializer.data, headers={"ETag": etag})
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Esquema materializado (snapshot) de una versión",
+        parameters=[
+            OpenApiParameter(name="version", description="FormularioIndexVersion; por defecto la vigente", required=False, type=OpenApiTypes.UUID),
+            OpenApiParameter(
+                name="If-None-Match",
+                description="ETag recibido anteriormente; responde 304 si el snapshot no cambió",
+                required=False,
+                type=str,
+                location=OpenApiParameter.HEADER,
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 304: OpenApiResponse(description="Sin cambios"), 404: OpenApiResponse(description="Sin snapshot para esa versión")},
+    )
+    @action(detail=True, methods=["get"], url_path="esquema")
+    def esquema(self, request, *args, **kwargs):
+        """
+        Sirve el JSON precalculado de la versión tal cual está guardado
+        (gzip si el cliente lo acepta), sin renderizar páginas ni campos.
+        """
+        obj = self.get_object()
+        if (obj.estado or "").lower() == "suspendida":
+            return Response(
+                {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
+                status=423  # Locked
+            )
+
+        vigente_id = obj.version_actual_id
+        version_id = request.query_params.get("version") or vigente_id
+        if not version_id:
+            return Response({"detail": "El formulario no tiene versiones."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            version_id = uuid.UUID(str(version_id))
+        except ValueError:
+            return Response({"detail": "version inválida: debe ser UUID."}, status=status.HTTP_400_BAD_REQUEST)
+
+        snap = snapshots.obtener(obj, version_id, vigente=(version_id == vigente_id))
+        if snap is None:
+            return Response({"detail": "No hay snapshot para esa versión."}, status=status.HTTP_404_NOT_FOUND)
+
+        gz = _acepta_gzip(request)
+        # ETag distinto por codificación: son representaciones distintas
+        etag = quote_etag(snap.sha256[:32] + ("-gz" if gz else ""))
+        if _etag_coincide(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        resp = HttpResponse(bytes(snap.contenido_gzip if gz else snap.contenido), content_type="application/json")
+        if gz:
+            resp["Content-Encoding"] = "gzip"
+        resp["ETag"] = etag
+        resp["Vary"] = "Accept-Encoding"
+        return resp
+
+    @extend_schema(tags=["Formularios"], summary="Historial de versiones con snapshot", responses=FormularioSnapshotSerializer(many=True))
+    @action(detail=True, methods=["get"], url_path="versiones")
+    def versiones(self, request, *args, **kwargs):
+        obj = self.get_object()
+        qs = (FormularioSnapshot.objects
+              .filter(id_formulario=obj)
+              .select_related("id_index_version")
+              .defer("contenido", "contenido_gzip"))
+        paginator = SnapshotCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        data = FormularioSnapshotSerializer(page, many=True, context={"version_vigente": obj.version_actual_id}).data
+        return paginator.get_paginated_response(data)
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Delta entre dos versiones del formulario",
+        parameters=[
+            OpenApiParameter(name="from", description="FormularioIndexVersion que ya tiene el cliente", required=True, type=OpenApiTypes.UUID),
+            OpenApiParameter(name="to", description="FormularioIndexVersion destino; por defecto la vigente", required=False, type=OpenApiTypes.UUID),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 404: OpenApiResponse(description="Sin snapshot para alguna de las versiones")},
+    )
+    @action(detail=True, methods=["get"], url_path="diff")
+    def diff(self, request, *args, **kwargs):
+        obj = self.get_object()
+        if (obj.estado or "").lower() == "suspendida":
+            return Response(
+                {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
+                status=423  # Locked
+            )
+
+        vigente_id = obj.version_actual_id
+        try:
+            desde = uuid.UUID(str(request.query_params.get("from")))
+            hasta = uuid.UUID(str(request.query_params.get("to") or vigente_id))
+        except ValueError:
+            return Response({"detail": "'from' y 'to' deben ser UUID de FormularioIndexVersion."}, status=status.HTTP_400_BAD_REQUEST)
+
+        snap_desde = snapshots.obtener(obj, desde, vigente=(desde == vigente_id))
+        snap_hasta = snapshots.obtener(obj, hasta, vigente=(hasta == vigente_id))
+        if snap_desde is None or snap_hasta is None:
+            return Response({"detail": "No hay snapshot para alguna de las versiones."}, status=status.HTTP_404_NOT_FOUND)
+
+        cambios = form_diff.diff_snapshots(snap_desde, snap_hasta)
+        return Response({
+            "from": str(desde),
+            "to": str(hasta),
+            "revision_contenido": snap_hasta.revision_contenido,
+            **cambios,
+        })
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Importar un formulario completo (páginas, campos, grupos y datasets)",
+        request=FormularioImportSerializer,
+        responses={
+            201: OpenApiTypes.OBJECT,
+            400: OpenApiResponse(description="Definición inválida; `ruta` ubica el elemento en el JSON y no se crea nada"),
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="import")
+    def importar(self, request, *args, **kwargs):
+        """
+        Crea el formulario a partir del JSON de FormularioSerializer (?expand=paginas)
+        en una transacción, con inserciones en lote (ver form_import.py).
+        """
+        ser = FormularioImportSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        datos = dict(ser.validated_data)
+        paginas = datos.pop("paginas")
+        try:
+            out = form_import.importar(datos, paginas)
+        except form_import.ImportacionInvalida as e:
+            return Response({"detail": e.mensaje, "ruta": e.ruta}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"detail": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(out, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Suspender varios formularios",
+        request=FormulariosBulkSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+        examples=[OpenApiExample("Cierre de temporada", request_only=True, value={"ids": [
+            "8a7c0b7e-5a53-4a35-9d0c-3c7b2a3a0f11", "1f0e6c1d-7f55-4b07-8b0b-2f3c4d5e6f70",
+        ]})],
+    )
+    @action(detail=False, methods=["post"], url_path="bulk/suspender")
+    def suspender_bulk(self, request, *args, **kwargs):
+        """Un UPDATE para todos; `resultados` trae el desenlace de cada id."""
+        ser = FormulariosBulkSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        out = services.suspender_formularios(ser.validated_data["ids"])
+        return Response(_resultados_bulk({fid: {"resultado": r} for fid, r in out.items()}))
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Eliminar varios formularios (borrado lógico)",
+        request=FormulariosBulkSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["post"], url_path="bulk/eliminar")
+    def eliminar_bulk(self, request, *args, **kwargs):
+        """
+        Un conteo de respuestas agrupado y un UPDATE para todos. Los que tienen
+        respuestas quedan con `con_respuestas` (se pueden suspender).
+        """
+        ser = FormulariosBulkSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        return Response(_resultados_bulk(services.eliminar_formularios(ser.validated_data["ids"])))
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Aplicar un lote de cambios y publicar una sola versión nueva",
+        request=CambiosFormularioSerializer,
+        parameters=[_IF_MATCH],
+        responses={
+            200: OpenApiTypes.OBJECT,
+            400: OpenApiResponse(description="Operación inválida; `operacion` indica su índice y no se aplica nada"),
+            409: OpenApiResponse(description="version_base ya no es la vigente"),
+            412: OpenApiResponse(description="If-Match ya no es la vigente"),
+            423: OpenApiResponse(description="Formulario suspendido"),
+        },
+        examples=[
+            OpenApiExample(
+                "Sesión de edición",
+                request_only=True,
+                value={"operaciones": [
+                    {"op": "agregar_pagina", "nombre": "Datos", "ref": "p1"},
+                    {"op": "agregar_campo", "pagina": "p1", "clase": "text", "nombre_campo": "nombre", "etiqueta": "Nombre", "ref": "c1"},
+                    {"op": "actualizar_campo", "campo": "<id_campo>", "etiqueta": "Edad (años)"},
+                    {"op": "reordenar", "pagina": "p1", "campos": ["c1"]},
+                    {"op": "eliminar_campo", "campo": "<id_campo>"},
+                ]},
+            ),
+        ],
+    )
+    @action(detail=True, methods=["post"], url_path="cambios")
+    def cambios(self, request, *args, **kwargs):
+        obj = self.get_object()
+        if (obj.estado or "").lower() == "suspendida":
+            return Response(
+                {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
+                status=423  # Locked
+            )
+        ser = CambiosFormularioSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        operaciones = ser.validated_data["operaciones"]
+
+        try:
+            tablas = changeset.leer_fuentes(operaciones)     # fuera del lock
+            with transaction.atomic():
+                error = _verificar_version_base(request, [obj.pk])
+                if error:
+                    return error
+                obj.refresh_from_db(fields=["current_index_version"])
+                out = changeset.aplicar(obj, operaciones, tablas=tablas)
+        except changeset.CambioInvalido as e:
+            return Response({"detail": e.mensaje, "operacion": e.indice}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"detail": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(out, status=status.HTTP_200_OK)
+
+    @extend_schema(methods=["GET"], tags=["Formularios"], summary="Borrador del formulario",
+                   responses={200: FormularioBorradorSerializer, 404: OpenApiResponse(description="Sin borrador")})
+    @extend_schema(methods=["POST"], tags=["Formularios"],
+                   summary="Agregar operaciones al borrador (no publica versión)",
+                   request=CambiosFormularioSerializer,
+                   responses={
+                       200: OpenApiTypes.OBJECT,
+                       400: OpenApiResponse(description="Operación inválida; `operacion` es su índice dentro del borrador completo"),
+                       423: OpenApiResponse(description="Formulario suspendido"),
+                   })
+    @extend_schema(methods=["DELETE"], tags=["Formularios"], summary="Descartar el borrador",
+                   responses={204: None, 404: OpenApiResponse(description="Sin borrador")})
+    @action(detail=True, methods=["get", "post", "delete"], url_path="borrador")
+    def borrador(self, request, *args, **kwargs):
+        """
+        Las operaciones (mismo formato que /cambios/) se acumulan sin crear
+        versiones: los dispositivos no ven nada hasta /borrador/publicar/.
+        """
+        obj = self.get_object()
+        if request.method == "GET":
+            b = borradores.obtener(obj)
+            if b is None:
+                return Response({"detail": "El formulario no tiene borrador."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(FormularioBorradorSerializer(b).data)
+        if request.method == "DELETE":
+            if not borradores.descartar(obj):
+                return Response({"detail": "El formulario no tiene borrador."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if (obj.estado or "").lower() == "suspendida":
+            return Response(
+                {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
+                status=423  # Locked
+            )
+        ser = CambiosFormularioSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        obj.refresh_from_db(fields=["current_index_version"])
+        try:
+            b, resumen = borradores.agregar(obj, ser.validated_data["operaciones"])
+        except changeset.CambioInvalido as e:
+            return Response({"detail": e.mensaje, "operacion": e.indice}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**FormularioBorradorSerializer(b).data, "resumen": resumen}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Publicar el borrador como una sola versión nueva",
+        request=None,
+        parameters=[_IF_MATCH],
+        responses={
+            200: OpenApiTypes.OBJECT,
+            400: OpenApiResponse(description="Alguna operación del borrador ya no es aplicable; no se publica nada"),
+            404: OpenApiResponse(description="Sin borrador"),
+            412: OpenApiResponse(description="If-Match ya no es la vigente"),
+            423: OpenApiResponse(description="Formulario suspendido"),
+        },
+    )
+    @action(detail=True, methods=["post"], url_path="borrador/publicar")
+    def publicar_borrador(self, request, *args, **kwargs):
+        """Versión nueva + snapshot + invalidación de caché en un solo paso (ver borradores.py)."""
+        obj = self.get_object()
+        if (obj.estado or "").lower() == "suspendida":
+            return Response(
+                {"detail": "Formulario suspendido. Solo puede editar el estado para reactivarlo."},
+                status=423  # Locked
+            )
+        try:
+            tablas = borradores.leer_fuentes(obj)     # fuera del lock
+            with transaction.atomic():
+                error = _verificar_version_base(request, [obj.pk])
+                if error:
+                    return error
+                obj.refresh_from_db(fields=["current_index_version"])
+                out = borradores.publicar(obj, tablas=tablas)
+        except borradores.SinBorrador:
+            return Response({"detail": "El formulario no tiene borrador."}, status=status.HTTP_404_NOT_FOUND)
+        except changeset.CambioInvalido as e:
+            return Response({"detail": e.mensaje, "operacion": e.indice}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"detail": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(out, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        tags=["Formularios"],
+        summary="Paquete de sincronización de los formularios asignados al usuario",
+        parameters=[
+            OpenApiParameter(name="since", description="Cursor devuelto por la sincronización anterior; omite los formularios sin cambios", required=False, type=str),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 401: OpenApiResponse(description="No autenticado")},
+    )
+    @action(detail=False, methods=["get"], url_path="sync")
+    def sync(self, request, *args, **kwargs):
+        if not request.user or not request.user.is_authenticated:
+            return Response({"detail": "Autenticación requerida."}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            previas = form_sync.decodificar_cursor(request.query_params.get("since", ""))
+        except form_sync.CursorInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1) Formularios asignados + huella actual (una consulta)
+        forms = list(form_sync.formularios_asignados(request.user))
+        huellas = {str(f.id): services.huella_formulario(f) for f in forms}
+        cambiados = [f for f in forms if previas.get(str(f.id)) != huellas[str(f.id)]]
+
+        # 2) Esquemas de los cambiados (schema_cache / snapshot) y catálogos en lote
+        data = FormularioSerializer(cambiados, many=True, context={"request": request}).data
+        catalogos = form_sync.catalogos(d["paginas"] for d in data)
+
+        return Response({
+            "cursor": form_sync.codificar_cursor(huellas),
+            "formularios": data,
+            "catalogos": catalogos,
+            "eliminados": sorted(set(previas) - set(huellas)),
+        })
 
     @extend_schema(tags=["Formularios"], summary="Actualizar campo de estado")
     def partial_update(self, request, *args, **kwargs):
@@ -618,8 +1191,8 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     list=extend_schema(tags=["Campos"]),
     retrieve=extend_schema(tags=["Campos"]),
     create=extend_schema(exclude=True),
-    partial_update=extend_schema(tags=["Campos"]),
-    destroy=extend_schema(tags=["Campos"]),
+    partial_update=extend_schema(tags=["Campos"], parameters=[_IF_MATCH]),
+    destroy=extend_schema(tags=["Campos"], parameters=[_IF_MATCH]),
 )
 class CampoViewSet(viewsets.ModelViewSet):
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
@@ -634,6 +1207,55 @@ class CampoViewSet(viewsets.ModelViewSet):
             return CampoUpdateSerializer
         return CampoSerializer
 
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        error = _verificar_version_base(request, services.formularios_de_campos([self.get_object().pk]))
+        return error or super().update(request, *args, **kwargs)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        error = _verificar_version_base(request, services.formularios_de_campos([self.get_object().pk]))
+        return error or super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        formulario_ids = services.formularios_de_campos([instance.pk])
+        super().perform_destroy(instance)
+        services.marcar_contenido_modificado(formulario_ids)
+
+    @extend_schema(
+        tags=["Campos"],
+        summary="Items de un campo dataset (paginados por cursor, búsqueda por prefijo)",
+        parameters=[
+            OpenApiParameter(name="q", description="Prefijo del label (sin distinguir mayúsculas)", required=False, type=str),
+            OpenApiParameter(name="cursor", description="Cursor devuelto por la página anterior", required=False, type=str),
+            OpenApiParameter(name="limit", description="Items por página (máx. 500)", required=False, type=int),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=True, methods=["get"], url_path="items")
+    def items(self, request, id_campo=None):
+        campo = self.get_object()
+        if (campo.clase or "").lower() != "dataset":
+            return Response({"detail": "El campo no es de clase dataset."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(max(int(request.query_params.get("limit", 50)), 1), 500)
+        except ValueError:
+            return Response({"detail": "limit debe ser entero."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            pagina = dataset_items.pagina_de_items(
+                campo.pk,
+                q=(request.query_params.get("q") or "").strip(),
+                cursor=request.query_params.get("cursor") or None,
+                limite=limite,
+                ds=_cfg_dict(campo.config).get("dataset"),
+            )
+        except dataset_items.CursorInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        url = request.build_absolute_uri()
+        pagina["next"] = replace_query_param(url, "cursor", pagina["cursor"]) if pagina["cursor"] else None
+        return Response(pagina)
+
 @extend_schema_view(
     list=extend_schema(tags=["Grupos"]),
     retrieve=extend_schema(tags=["Grupos"]),
@@ -659,10 +1281,8 @@ class GrupoViewSet(viewsets.ReadOnlyModelViewSet):
                 id32 = _uuid32_no_dashes(pagina)
             except Exception:
                 return qs.none()
-            pv = (PaginaVersion.objects
-                  .filter(id_pagina=id32)
-                  .order_by("-fecha_creacion")
-                  .first())
+            pagina_obj = Pagina.objects.filter(pk=id32).first()
+            pv = versioning.pagina_version_vigente(pagina_obj) if pagina_obj else None
             if not pv:
                 return qs.none()
             campo_group_ids = (PaginaCampo.objects
@@ -724,7 +1344,7 @@ class AsignacionViewSet(viewsets.ModelViewSet):
     serializer_class = UserFormularioSerializer
     queryset = (UserFormulario.objects
                 .select_related("id_usuario", "id_formulario", "id_formulario__categoria")
-                .all())
+                .filter(id_formulario__eliminado_en__isnull=True))
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = [
         "id_usuario__nombre_usuario",
@@ -72,9 +72,11 @@ def dashboard_resumen(request):
         )
 
         # --- Asignaciones ---
-        total_asignaciones = UserFormulario.objects.count()
+        # sin las de formularios con borrado lógico (igual que AsignacionViewSet)
+        asignaciones = UserFormulario.objects.filter(id_formulario__eliminado_en__isnull=True)
+        total_asignaciones = asignaciones.count()
         usuarios_asignados = (
-            UserFormulario.objects.values("id_usuario")
+            asignaciones.values("id_usuario")
             .annotate(c=Count("id_formulario"))
             .count()
         )